@@ -1,26 +1,384 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from typing import Optional
+from services.metrics import metrics
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "test_database")
+# strict (abort startup when a hot query needs a COLLSCAN) | warn | off
+VERIFY_QUERY_PLANS = os.environ.get("VERIFY_QUERY_PLANS", "strict")
+# Days archived generations are kept before MongoDB expires them (0 = forever)
+ARCHIVE_TTL_DAYS = int(os.environ.get("ARCHIVE_TTL_DAYS", "0"))
 
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+# Connection pool, wire compression and read/write concern
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = os.environ.get("MONGO_MAX_IDLE_TIME_MS")
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "zstd,zlib")
+MONGO_READ_CONCERN = os.environ.get("MONGO_READ_CONCERN")
+MONGO_WRITE_CONCERN = os.environ.get("MONGO_WRITE_CONCERN")
+MONGO_JOURNAL = os.environ.get("MONGO_JOURNAL")
+# Connections opened at startup so the first requests don't pay for the handshake
+MONGO_WARM_CONNECTIONS = int(os.environ.get("MONGO_WARM_CONNECTIONS", str(max(MONGO_MIN_POOL_SIZE, 1))))
+
+mongodb_command_seconds = metrics.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("command",)
+)
+mongodb_command_failures = metrics.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("command",)
+)
+mongodb_checkout_wait_seconds = metrics.histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection"
+)
+
+class CommandMonitor(monitoring.CommandListener):
+    """Records the latency of every MongoDB command by command name"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_seconds.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongodb_command_seconds.labels(event.command_name).observe(event.duration_micros / 1e6)
+        mongodb_command_failures.labels(event.command_name).inc()
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener recording how long operations wait to check
+    out a connection, so the pool can be sized from data.
+    PyMongo emits the started and checked-out events for one checkout on
+    the same executor thread, so the start time is kept thread-local.
+    Events for different checkouts arrive on different threads, so the
+    counters are updated under a lock.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recent_waits: deque = deque(maxlen=1000)
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.in_use = 0
+        self.open_connections = 0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _record_wait(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            wait = time.perf_counter() - started
+            with self._lock:
+                self._recent_waits.append(wait)
+            mongodb_checkout_wait_seconds.observe(wait)
+            self._local.started = None
+
+    def connection_checked_out(self, event):
+        self._record_wait()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+
+    def connection_check_out_failed(self, event):
+        self._record_wait()
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            counters = {
+                "open_connections": self.open_connections,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts
+            }
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            **counters,
+            "checkout_wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0
+            }
+        }
+
+pool_monitor = PoolMonitor()
+
+# Bound in connect_db() inside the app lifespan
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
 # Collections
-generations_collection = db["generations"]
-users_collection = db["users"]
-prompts_collection = db["prompts"]
+generations_collection = None
+users_collection = None
+prompts_collection = None
+archive_collection = None
+compression_dicts_collection = None
+job_workers_collection = None
+
+def _client_options() -> dict:
+    options = {
+        # tz_aware so stored BSON dates come back as UTC-aware datetimes
+        "tz_aware": True,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "event_listeners": [pool_monitor, CommandMonitor()]
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    if MONGO_READ_CONCERN:
+        options["readConcernLevel"] = MONGO_READ_CONCERN
+    if MONGO_WRITE_CONCERN:
+        options["w"] = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    if MONGO_JOURNAL:
+        options["journal"] = MONGO_JOURNAL.lower() == "true"
+    return options
+
+def bind_client(new_client):
+    """Point the module-level database and collections at a client"""
+    global client, db, generations_collection, users_collection, prompts_collection
+    global archive_collection, compression_dicts_collection, job_workers_collection
+    client = new_client
+    db = client[DB_NAME]
+    generations_collection = db["generations"]
+    users_collection = db["users"]
+    prompts_collection = db["prompts"]
+    archive_collection = db["generations_archive"]
+    compression_dicts_collection = db["compression_dicts"]
+    job_workers_collection = db["job_workers"]
+
+async def warm_pool():
+    """Open MONGO_WARM_CONNECTIONS connections with concurrent pings"""
+    started = time.perf_counter()
+    await asyncio.gather(*(db.command("ping") for _ in range(MONGO_WARM_CONNECTIONS)))
+    logger.info(
+        f"MongoDB pool warmed with {pool_monitor.open_connections} connections "
+        f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+async def connect_db():
+    """Create the MongoDB client (unless one is already bound) and warm its pool"""
+    if client is None:
+        bind_client(AsyncIOMotorClient(MONGO_URL, **_client_options()))
+    try:
+        await warm_pool()
+    except Exception as e:
+        logger.error(f"Failed to warm MongoDB connection pool: {e}")
+
+def close_db():
+    """Close the MongoDB client and its pooled connections"""
+    global client
+    if client is not None:
+        client.close()
+        client = None
+        logger.info("MongoDB client closed")
+
+class IndexVerificationError(RuntimeError):
+    """Raised when a hot query would fall back to a collection scan"""
+    pass
+
+# Declarative index definitions: name -> (collection name, keys, options).
+# init_db creates missing indexes and rebuilds ones whose definition changed.
+INDEXES = {
+    "job_id_unique": (
+        "generations", [("job_id", 1)], {"unique": True}
+    ),
+    # History: filter on user_id, keyset sort on (created_at, job_id)
+    "user_created_job": (
+        "generations", [("user_id", 1), ("created_at", -1), ("job_id", -1)], {}
+    ),
+    # Worker claim/refill and orphan recovery only ever look at unfinished jobs
+    "unfinished_status_updated": (
+        "generations", [("status", 1), ("updated_at", 1)],
+        {"partialFilterExpression": {"status": {"$in": ["pending", "running"]}}}
+    ),
+    # Retention scan for generations past RETENTION_DAYS
+    "created_at_1": (
+        "generations", [("created_at", 1)], {}
+    ),
+    "archive_job_id_unique": (
+        "generations_archive", [("job_id", 1)], {"unique": True}
+    ),
+    "archive_user_created_job": (
+        "generations_archive", [("user_id", 1), ("created_at", -1), ("job_id", -1)], {}
+    ),
+    "compression_dict_id_unique": (
+        "compression_dicts", [("dict_id", 1)], {"unique": True}
+    ),
+    "prompts_user_id": (
+        "prompts", [("user_id", 1)], {}
+    ),
+    "cache_key_unique": (
+        "prompts", [("cache_key", 1)], {"unique": True, "sparse": True}
+    ),
+    "cache_expires_ttl": (
+        "prompts", [("expires_at", 1)], {"expireAfterSeconds": 0}
+    ),
+    # Live job queue workers; heartbeats of dead processes expire after a day
+    "worker_heartbeat_ttl": (
+        "job_workers", [("heartbeat_at", 1)], {"expireAfterSeconds": 86400}
+    ),
+}
+
+if ARCHIVE_TTL_DAYS > 0:
+    INDEXES["archive_expiry_ttl"] = (
+        "generations_archive", [("archived_at", 1)], {"expireAfterSeconds": ARCHIVE_TTL_DAYS * 86400}
+    )
+
+INDEX_OPTION_KEYS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def _hot_queries() -> dict:
+    """Cursors for the queries on the request and worker hot paths"""
+    cutoff = datetime.now(timezone.utc)
+    return {
+        "job_status": db["generations"].find({"job_id": "explain"}),
+        "job_claim": db["generations"].find({"job_id": "explain", "status": "pending"}),
+        "history": db["generations"].find({"user_id": "default_user"}).sort(
+            [("created_at", -1), ("job_id", -1)]
+        ).limit(20),
+        "history_page": db["generations"].find({
+            "user_id": "default_user",
+            "$or": [
+                {"created_at": {"$lt": cutoff}},
+                {"created_at": cutoff, "job_id": {"$lt": "explain"}}
+            ]
+        }).sort([("created_at", -1), ("job_id", -1)]).limit(20),
+        "queue_refill": db["generations"].find({"status": "pending"}).sort("updated_at", 1).limit(100),
+        "orphan_recovery": db["generations"].find({"status": "running", "updated_at": {"$lt": cutoff}}),
+        "live_workers": db["job_workers"].find({"heartbeat_at": {"$gte": cutoff}}),
+        "archive_lookup": db["generations_archive"].find({"job_id": "explain"}),
+        "retention_scan": db["generations"].find(
+            {"created_at": {"$lt": cutoff}, "status": {"$in": ["success", "failed"]}}
+        ).limit(500),
+        "timings_summary": db["generations"].find(
+            {"created_at": {"$gte": cutoff}, "timings": {"$exists": True}}
+        ).sort("created_at", -1).limit(1000),
+        "prompt_cache": db["prompts"].find({"cache_key": "explain", "expires_at": {"$gt": datetime.now(timezone.utc)}}),
+    }
+
+def _normalize_keys(keys) -> list[tuple]:
+    # Servers may report index directions as floats (1.0 / -1.0)
+    return [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in keys]
+
+def _plan_stages(plan: dict) -> list[str]:
+    """Flatten the stage names of an explain() plan tree"""
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+async def ensure_indexes():
+    """Create declared indexes, rebuilding any whose definition changed"""
+    existing = {}
+    for collection_name in {c for c, _, _ in INDEXES.values()}:
+        existing[collection_name] = await db[collection_name].index_information()
+
+    for name, (collection_name, keys, options) in INDEXES.items():
+        collection = db[collection_name]
+        current = existing[collection_name]
+        for other_name, info in current.items():
+            same_keys = _normalize_keys(info["key"]) == keys
+            if other_name == "_id_" or (not same_keys and other_name != name):
+                continue
+            same_options = same_keys and all(info.get(k) == options.get(k) for k in INDEX_OPTION_KEYS)
+            if other_name == name and same_options:
+                break
+            # Same keys under another name or with other options would conflict
+            logger.info(f"Rebuilding index {other_name} on {collection.name} as {name}")
+            await collection.drop_index(other_name)
+        else:
+            await collection.create_index(keys, name=name, **options)
+
+async def verify_query_plans() -> dict:
+    """
+    Run explain() on every hot query.
+    Raises IndexVerificationError if any winning plan contains a COLLSCAN
+    or a plan cannot be read at all.
+    """
+    plans = {}
+    collection_scans = []
+    for query_name, cursor in _hot_queries().items():
+        try:
+            explain = await cursor.explain()
+            stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        except Exception as e:
+            # An unverifiable plan must not pass as index-backed
+            raise IndexVerificationError(f"Could not explain {query_name}: {e}") from e
+        plans[query_name] = stages
+        if "COLLSCAN" in stages:
+            collection_scans.append(query_name)
+
+    if collection_scans:
+        raise IndexVerificationError(f"Queries fall back to COLLSCAN: {', '.join(collection_scans)}")
+    return plans
 
 async def init_db():
-    """Initialize database indexes"""
-    await generations_collection.create_index("job_id")
-    await generations_collection.create_index("created_at")
-    await prompts_collection.create_index("user_id")
+    """Initialize database indexes and check the hot query plans"""
+    await ensure_indexes()
+
+    if VERIFY_QUERY_PLANS == "off":
+        return
+    try:
+        await verify_query_plans()
+        logger.info("All hot queries are index-backed")
+    except IndexVerificationError:
+        if VERIFY_QUERY_PLANS == "strict":
+            raise
+        logger.exception("Query plan verification failed")
 
 async def get_db():
     """Get database reference"""
@@ -0,0 +1,91 @@
+"""
+Convert ISO-string created_at/updated_at fields on generation documents
+to native BSON dates.
+
+Usage:
+    python migrate_timestamps.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+import database
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+def parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def build_update(doc: dict) -> dict:
+    """Return the $set for one document's string timestamps"""
+    updates = {}
+    for field in TIMESTAMP_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, str):
+            try:
+                updates[field] = parse_timestamp(value)
+            except ValueError:
+                logger.warning(f"Skipping unparseable {field} on job {doc.get('job_id')}: {value!r}")
+    return updates
+
+async def migrate(batch_size: int, dry_run: bool) -> int:
+    generations_collection = database.generations_collection
+    query = {"$or": [{field: {"$type": "string"}} for field in TIMESTAMP_FIELDS]}
+    projection = {"_id": 1, "job_id": 1, **{field: 1 for field in TIMESTAMP_FIELDS}}
+
+    total = await generations_collection.count_documents(query)
+    logger.info(f"{total} documents with string timestamps")
+    if dry_run or not total:
+        return 0
+
+    migrated = 0
+    batch = []
+    async for doc in generations_collection.find(query, projection).batch_size(batch_size):
+        updates = build_update(doc)
+        if updates:
+            # Match the string value too, so a concurrent write is never clobbered
+            batch.append(UpdateOne(
+                {"_id": doc["_id"], **{field: doc[field] for field in updates}},
+                {"$set": updates}
+            ))
+        if len(batch) >= batch_size:
+            result = await generations_collection.bulk_write(batch, ordered=False)
+            migrated += result.modified_count
+            batch = []
+            logger.info(f"Migrated {migrated}/{total}")
+
+    if batch:
+        result = await generations_collection.bulk_write(batch, ordered=False)
+        migrated += result.modified_count
+
+    logger.info(f"Migration finished: {migrated} documents updated")
+    return migrated
+
+async def run(batch_size: int, dry_run: bool) -> int:
+    await database.connect_db()
+    try:
+        return await migrate(batch_size, dry_run)
+    finally:
+        database.close_db()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="only count documents to migrate")
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.dry_run))
+
+if __name__ == "__main__":
+    main()
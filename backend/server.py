@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -7,12 +7,32 @@ import logging
 from pathlib import Path
 from pydantic import BaseModel
 import uuid
-from datetime import datetime, timezone
+import json
+import base64
+import heapq
+import asyncio
+import time
+from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
 
-from database import init_db, generations_collection, prompts_collection, users_collection
+import database
+from database import init_db, IndexVerificationError
 from services.rate_limiter import rate_limiter
 from services.llm_service import llm_service
+from services.job_queue import job_queue
+from services.job_events import job_events, TERMINAL_STATUSES
+from services.prompt_cache import prompt_cache
+from services.semantic_cache import semantic_cache
+from services.single_flight import llm_single_flight
+from services.retention import retention_manager
+from services.code_compression import code_compressor
+from services.write_buffer import write_buffer
+from services.job_cache import job_cache
+from services.llm_router import llm_router
+from services.breaker_store import breaker_store
+from services.retry_policy import classify, retry_policy
+from services.metrics import metrics
+from services.job_timing import JobTimer, current_job_timer, summarize_timings
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,27 +43,83 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Request latency until response headers, per route", ("method", "route")
+)
+http_requests = metrics.counter(
+    "http_requests_total", "Requests handled, per route and status code", ("method", "route", "status")
+)
+job_queue_depth = metrics.gauge("job_queue_depth", "Job ids waiting for a free worker")
+job_queue_active = metrics.gauge("job_queue_active_jobs", "Jobs being processed by workers")
+llm_governor_waiting = metrics.gauge("llm_governor_waiting", "LLM calls waiting for governor capacity", ("backend",))
+llm_governor_in_flight = metrics.gauge("llm_governor_in_flight", "LLM calls in flight", ("backend",))
+write_buffer_pending = metrics.gauge("write_buffer_pending_ops", "Generation writes waiting to be flushed")
+mongodb_pool_in_use = metrics.gauge("mongodb_pool_connections_in_use", "Pooled MongoDB connections checked out")
+
+def collect_service_gauges():
+    job_queue_depth.set(job_queue.queue.qsize() if job_queue.queue is not None else 0)
+    job_queue_active.set(job_queue.active_jobs)
+    for backend in llm_router.backends:
+        llm_governor_waiting.labels(backend.name).set(backend.governor.waiting)
+        llm_governor_in_flight.labels(backend.name).set(backend.governor.in_flight)
+    write_buffer_pending.set(write_buffer.get_stats()["pending"])
+    mongodb_pool_in_use.set(database.pool_monitor.in_use)
+
+metrics.add_collector(collect_service_gauges)
+
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# Streams are closed after this long; the client falls back to polling
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "600"))
+STREAM_CHECKPOINT_SECONDS = float(os.getenv("STREAM_CHECKPOINT_SECONDS", "2"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle management for database and services"""
     logger.info("Initializing database...")
+    await database.connect_db()
     try:
         await init_db()
         logger.info("Database initialized")
+    except IndexVerificationError:
+        raise
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
     
     await rate_limiter.connect()
+    await breaker_store.connect()
+    await job_cache.connect()
+    await prompt_cache.connect(database.prompts_collection)
+    await semantic_cache.start()
+    await code_compressor.connect(database.compression_dicts_collection, database.generations_collection)
+    await write_buffer.start(database.generations_collection)
+    await job_queue.start(database.generations_collection, process_generation, database.job_workers_collection)
+    await retention_manager.start(database.generations_collection, database.archive_collection)
     logger.info("Services started")
     
     yield
     
+    await retention_manager.stop()
+    await job_queue.stop()
+    await write_buffer.stop()
+    await code_compressor.close()
+    await prompt_cache.close()
+    await job_cache.close()
+    await breaker_store.close()
     await rate_limiter.close()
+    database.close_db()
     logger.info("Services shut down")
 
 app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
+def to_isoformat(value: datetime | str) -> str:
+    """Serialize a stored timestamp; documents from before the migration hold ISO strings"""
+    if isinstance(value, str):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
 class GenerateRequest(BaseModel):
     prompt: str
 
@@ -60,31 +136,64 @@ class JobStatusResponse(BaseModel):
     error_message: str | None = None
     prompt: str | None = None
     created_at: str
+    timings: dict | None = None
+
+def _timings_state(timings: dict | None) -> dict | None:
+    if not timings:
+        return None
+    return {**timings, "claimed_at": to_isoformat(timings["claimed_at"])}
+
+def _job_state(generation: dict) -> dict:
+    """The cached, response-shaped state of a generation document"""
+    return {
+        "job_id": generation["job_id"],
+        "status": generation["status"],
+        "generated_code": generation.get("generated_code"),
+        "explanation": generation.get("explanation"),
+        "error_message": generation.get("error_message"),
+        "prompt": generation.get("prompt"),
+        "created_at": to_isoformat(generation["created_at"]),
+        "timings": _timings_state(generation.get("timings"))
+    }
 
 class HistoryItem(BaseModel):
     id: str
     prompt: str
     status: str
-    generated_code: str | None
+    generated_code: str | None = None
+    code_size: int | None = None
     created_at: str
 
+class HistoryResponse(BaseModel):
+    history: list[HistoryItem]
+    next_cursor: str | None = None
+
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
     request_id = str(uuid.uuid4())
     request.state.request_id = request_id
     logger.info(f"[{request_id}] {request.method} {request.url.path}")
     
+    started = time.perf_counter()
+    status_code = 500
     try:
         response = await call_next(request)
+        status_code = response.status_code
         response.headers["X-Request-ID"] = request_id
         return response
     except Exception as e:
         logger.error(f"[{request_id}] Request failed: {e}")
         raise
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        http_request_seconds.labels(request.method, route_path).observe(time.perf_counter() - started)
+        http_requests.labels(request.method, route_path, status_code).inc()
 
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
-    if request.url.path == "/api/health":
+    if request.url.path in ("/api/health", "/api/metrics"):
         return await call_next(request)
     
     client_ip = request.client.host if request.client else "unknown"
@@ -106,42 +215,154 @@ async def rate_limit_middleware(request: Request, call_next):
     response.headers["X-RateLimit-Remaining"] = str(remaining)
     return response
 
-async def process_generation(job_id: str, prompt: str):
-    """Background task to process generation"""
+async def stream_generation(job_id: str, prompt: str, state: dict) -> dict:
+    """Stream code chunks to subscribers, checkpointing partial code in MongoDB and the job cache"""
+    chunks: list[str] = []
+    last_checkpoint = asyncio.get_running_loop().time()
+    
     try:
-        logger.info(f"Processing job {job_id}")
-        
-        # Update status to running
-        await generations_collection.update_one(
-            {"job_id": job_id},
-            {"$set": {"status": "running", "updated_at": datetime.now(timezone.utc).isoformat()}}
+        # A stream is not retried, but it is still cut off at the job deadline
+        async with asyncio.timeout(retry_policy.remaining()):
+            async for chunk in llm_service.stream_ui_code(prompt, job_id):
+                chunks.append(chunk)
+                job_events.publish(job_id, {"job_id": job_id, "status": "running", "chunk": chunk})
+                
+                now = asyncio.get_running_loop().time()
+                if now - last_checkpoint >= STREAM_CHECKPOINT_SECONDS:
+                    last_checkpoint = now
+                    state["generated_code"] = "".join(chunks)
+                    write_buffer.update(job_id, {
+                        "generated_code": state["generated_code"],
+                        "updated_at": datetime.now(timezone.utc)
+                    })
+                    await job_cache.set(job_id, state, running_here=True)
+    except Exception as e:
+        if retry_policy.expired():
+            raise retry_policy.deadline_exceeded() from e
+        decision = classify(e)
+        if chunks or not decision.retryable:
+            raise
+        # Nothing reached the client yet, fall back to the retrying call
+        # after the wait the failure asks for (Retry-After or backoff)
+        delay = retry_policy.retry_delay(decision, 1)
+        if delay is None:
+            raise
+        logger.warning(
+            f"Job {job_id} streaming failed before first chunk ({decision.reason}), "
+            f"retrying without streaming in {delay:.2f}s: {e}"
         )
-        
-        # Call LLM
+        await asyncio.sleep(delay)
+        return await llm_service.generate_ui_code(prompt, job_id)
+    
+    return {
+        "code": "".join(chunks).strip(),
+        "explanation": f"Generated React component based on: {prompt}"
+    }
+
+async def generate_and_cache(state: dict, cache_key: str, cache_namespace: str) -> dict:
+    """Call the LLM and store the result in the prompt caches"""
+    job_id, prompt = state["job_id"], state["prompt"]
+    if llm_service.streaming_enabled:
+        result = await stream_generation(job_id, prompt, state)
+    else:
         result = await llm_service.generate_ui_code(prompt, job_id)
+    await prompt_cache.set(cache_key, result)
+    await semantic_cache.add(prompt, cache_namespace, result)
+    return result
+
+async def record_persisted(job_id: str, timer: JobTimer) -> dict:
+    """Mark the persisted stage once the job's outcome is in MongoDB, then store the timings"""
+    try:
+        await write_buffer.written(job_id)
+        timer.mark("persisted")
+    except Exception as e:
+        # A failed flush keeps the update buffered for the next one; the job just has no persist/total stage
+        logger.warning(f"Job {job_id} outcome not written yet: {e}")
+    timings = timer.to_dict()
+    write_buffer.update(job_id, {"timings": timings})
+    return timings
+
+async def process_generation(job: dict):
+    """Process a generation job claimed by a job queue worker"""
+    job_id, prompt = job["job_id"], job["prompt"]
+    timer = current_job_timer.get()
+    if timer is None:
+        timer = JobTimer()
+        current_job_timer.set(timer)
+    # Written through in full on every transition, so the cached state
+    # never depends on an earlier entry still being there
+    state = _job_state({**job, "status": "running"})
+    try:
+        logger.info(f"Processing job {job_id}")
+        job_events.publish(job_id, {"job_id": job_id, "status": "running"})
+        await job_cache.set(job_id, state, running_here=True)
         
-        # Update with success
-        await generations_collection.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "success",
-                "generated_code": result["code"],
-                "explanation": result["explanation"],
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
+        # Serve identical prompts from cache, otherwise call LLM
+        cache_key = llm_service.get_cache_key(prompt)
+        cache_namespace = llm_service.get_cache_namespace()
+        result = await prompt_cache.get(cache_key)
+        if result is not None:
+            timer.source = "prompt_cache"
+            timer.mark("looked_up")
+            logger.info(f"Job {job_id} served from prompt cache")
+        elif (result := await semantic_cache.lookup(prompt, cache_namespace)) is not None:
+            timer.source = "semantic_cache"
+            timer.mark("looked_up")
+            logger.info(f"Job {job_id} served from semantic cache")
+        else:
+            timer.source = "coalesced" if cache_key in llm_single_flight.inflight else "llm"
+            timer.mark("looked_up")
+            # Concurrent jobs with the same prompt share one LLM call
+            result = await llm_single_flight.run(
+                cache_key,
+                lambda: generate_and_cache(state, cache_key, cache_namespace)
+            )
+        timer.mark("completed")
+        
+        # Update with success, large code is stored compressed
+        code_fields, stale_fields = code_compressor.encode_fields(result["code"])
+        update = {
+            "status": "success",
+            **code_fields,
+            "code_size": len(result["code"]),
+            "explanation": result["explanation"],
+            "updated_at": datetime.now(timezone.utc)
+        }
+        write_buffer.update(job_id, update, stale_fields)
+        timings = await record_persisted(job_id, timer)
+        await job_cache.set(job_id, {
+            **state,
+            "status": "success",
+            "generated_code": result["code"],
+            "explanation": result["explanation"],
+            "timings": _timings_state(timings)
+        })
+        job_events.publish(job_id, {
+            "job_id": job_id,
+            "status": "success",
+            "generated_code": result["code"],
+            "explanation": result["explanation"]
+        })
         logger.info(f"Job {job_id} completed successfully")
         
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}")
-        await generations_collection.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "failed",
-                "error_message": str(e),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
+        timer.mark("completed")
+        write_buffer.update(job_id, {
+            "status": "failed",
+            "error_message": str(e),
+            "updated_at": datetime.now(timezone.utc)
+        })
+        timings = await record_persisted(job_id, timer)
+        await job_cache.set(job_id, {
+            **state,
+            "status": "failed",
+            "error_message": str(e),
+            "timings": _timings_state(timings)
+        })
+        job_events.publish(job_id, {"job_id": job_id, "status": "failed", "error_message": str(e)})
+    finally:
+        job_cache.release(job_id)
 
 @api_router.get("/")
 async def root():
@@ -154,19 +375,56 @@ async def health_check():
     return {
         "status": "healthy",
         "services": {
-            "llm": llm_health
+            "llm": llm_health,
+            "job_queue": job_queue.get_stats(),
+            "job_events": job_events.get_stats(),
+            "prompt_cache": prompt_cache.get_stats(),
+            "semantic_cache": semantic_cache.get_stats(),
+            "single_flight": llm_single_flight.get_stats(),
+            "rate_limiter": rate_limiter.get_stats(),
+            "circuit_breaker_store": breaker_store.get_stats(),
+            "retention": retention_manager.get_stats(),
+            "code_compression": code_compressor.get_stats(),
+            "write_buffer": write_buffer.get_stats(),
+            "job_cache": job_cache.get_stats(),
+            "mongodb_pool": database.pool_monitor.get_stats()
         }
     }
 
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+TIMINGS_SAMPLE_LIMIT = int(os.getenv("TIMINGS_SAMPLE_LIMIT", "1000"))
+
+@api_router.get("/timings")
+async def get_timings(window_seconds: int = Query(3600, ge=60, le=7 * 86400)):
+    """
+    Per-stage latency percentiles over recently finished jobs.
+    Summarizes the timings stored with the newest TIMINGS_SAMPLE_LIMIT
+    generations created within window_seconds.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+    await write_buffer.flush_job()
+    docs = await database.generations_collection.find(
+        {"created_at": {"$gte": cutoff}, "timings": {"$exists": True}},
+        {"_id": 0, "timings": 1}
+    ).sort("created_at", -1).limit(TIMINGS_SAMPLE_LIMIT).to_list(TIMINGS_SAMPLE_LIMIT)
+    summary = summarize_timings([doc["timings"] for doc in docs])
+    summary["window_seconds"] = window_seconds
+    return summary
+
 @api_router.post("/generate", response_model=GenerateResponse)
-async def generate_ui(request: Request, body: GenerateRequest, background_tasks: BackgroundTasks):
+async def generate_ui(request: Request, body: GenerateRequest):
     """Generate React UI from natural language prompt."""
     request_id = request.state.request_id
     logger.info(f"[{request_id}] Generate request: {body.prompt[:100]}...")
     
     job_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
     
-    # Create generation record in MongoDB
+    # Create generation record in MongoDB (batched with concurrent requests)
     generation_doc = {
         "job_id": job_id,
         "prompt": body.prompt,
@@ -175,13 +433,15 @@ async def generate_ui(request: Request, body: GenerateRequest, background_tasks:
         "explanation": None,
         "error_message": None,
         "user_id": "default_user",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now,
+        "updated_at": now
     }
-    await generations_collection.insert_one(generation_doc)
+    await write_buffer.insert(generation_doc)
+    await job_cache.set(job_id, _job_state(generation_doc))
     
-    # Process in background
-    background_tasks.add_task(process_generation, job_id, body.prompt)
+    # Hand off to the worker pool; if the queue is full the job stays
+    # pending in MongoDB and is picked up once workers catch up
+    job_queue.enqueue(job_id)
     
     logger.info(f"[{request_id}] Created job {job_id}")
     
@@ -194,43 +454,155 @@ async def generate_ui(request: Request, body: GenerateRequest, background_tasks:
 @api_router.get("/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(job_id: str):
     """Get status of a generation job."""
-    generation = await generations_collection.find_one(
+    state = await _load_job_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(**state)
+
+async def _load_job_state(job_id: str) -> dict | None:
+    """Job state from the job cache, else MongoDB (after buffered writes), else the archive"""
+    state = await job_cache.get(job_id)
+    if state is not None:
+        return state
+    
+    await write_buffer.flush_job(job_id)
+    generation = await database.generations_collection.find_one(
         {"job_id": job_id},
         {"_id": 0}
     )
+    if generation:
+        await code_compressor.restore(generation)
+    else:
+        generation = await retention_manager.find_archived(job_id)
     
     if not generation:
+        return None
+    
+    state = _job_state(generation)
+    await job_cache.remember(job_id, state)
+    return state
+
+SSE_STATE_FIELDS = ("job_id", "status", "generated_code", "explanation", "error_message")
+
+def _format_sse(event: dict) -> str:
+    event_type = "chunk" if "chunk" in event else "status"
+    return f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream status transitions of a generation job as Server-Sent Events.
+    Events come from this process's job event bus; when none arrive for
+    SSE_KEEPALIVE_SECONDS the state is read again, since another process
+    may be running the job. Streams close after SSE_MAX_SECONDS.
+    """
+    # Subscribe before reading the current state so no transition is missed
+    queue = job_events.subscribe(job_id)
+    state = await _load_job_state(job_id)
+    if state is None:
+        job_events.unsubscribe(job_id, queue)
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return JobStatusResponse(
-        job_id=job_id,
-        status=generation["status"],
-        generated_code=generation.get("generated_code"),
-        explanation=generation.get("explanation"),
-        error_message=generation.get("error_message"),
-        prompt=generation.get("prompt"),
-        created_at=generation["created_at"]
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + SSE_MAX_SECONDS
+        status = state["status"]
+        try:
+            yield _format_sse({field: state.get(field) for field in SSE_STATE_FIELDS})
+            if status in TERMINAL_STATUSES:
+                return
+            while (remaining := closes_at - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    current = await _load_job_state(job_id)
+                    if current is None or current["status"] == status:
+                        yield ": keepalive\n\n"
+                        continue
+                    event = {field: current.get(field) for field in SSE_STATE_FIELDS}
+                status = event["status"]
+                yield _format_sse(event)
+                if status in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-@api_router.get("/history")
-async def get_history(limit: int = 20):
-    """Get generation history for current user."""
-    cursor = generations_collection.find(
-        {"user_id": "default_user"},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit)
+HISTORY_MAX_LIMIT = 100
+HISTORY_SUMMARY_PROJECTION = {"_id": 0, "job_id": 1, "prompt": 1, "status": 1, "code_size": 1, "created_at": 1}
+
+def _encode_history_cursor(created_at: str, job_id: str) -> str:
+    raw = json.dumps([created_at, job_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), job_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _history_sort_key(doc: dict) -> tuple:
+    return doc["created_at"], doc["job_id"]
+
+@api_router.get("/history", response_model=HistoryResponse)
+async def get_history(
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str | None = None,
+    summary: bool = False
+):
+    """
+    Get generation history for current user, newest first.
+    Pass next_cursor back as cursor to fetch the following page. With
+    summary=true generated code is left out; fetch it via /api/jobs/{job_id}.
+    """
+    query = {"user_id": "default_user"}
+    if cursor:
+        created_at, job_id = _decode_history_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "job_id": {"$lt": job_id}}
+        ]
+    
+    await write_buffer.flush_job()
+    projection = HISTORY_SUMMARY_PROJECTION if summary else {"_id": 0}
+    docs = await database.generations_collection.find(query, projection).sort(
+        [("created_at", -1), ("job_id", -1)]
+    ).limit(limit).to_list(limit)
+    
+    if retention_manager.enabled:
+        # Unfinished jobs stay hot past the cutoff, so the two collections
+        # overlap in time and have to be merged rather than appended
+        archived = await database.archive_collection.find(query, projection).sort(
+            [("created_at", -1), ("job_id", -1)]
+        ).limit(limit).to_list(limit)
+        # A job can be in both after an interrupted archival run
+        hot_ids = {doc["job_id"] for doc in docs}
+        archived = [doc for doc in archived if doc["job_id"] not in hot_ids]
+        docs = list(heapq.merge(docs, archived, key=_history_sort_key, reverse=True))[:limit]
     
     history = []
-    async for gen in cursor:
+    for gen in docs:
+        code = (await code_compressor.restore(gen)).get("generated_code")
         history.append(HistoryItem(
             id=gen["job_id"],
             prompt=gen.get("prompt", ""),
             status=gen["status"],
-            generated_code=gen.get("generated_code"),
-            created_at=gen["created_at"]
+            generated_code=code,
+            code_size=gen.get("code_size", len(code) if code is not None else None),
+            created_at=to_isoformat(gen["created_at"])
         ))
     
-    return {"history": history}
+    next_cursor = None
+    if len(history) == limit:
+        next_cursor = _encode_history_cursor(history[-1].created_at, history[-1].id)
+    
+    return HistoryResponse(history=history, next_cursor=next_cursor)
 
 app.include_router(api_router)
 
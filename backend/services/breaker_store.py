@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import logging
+from typing import Optional
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is only needed for the redis store
+    aioredis = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+class BreakerStore:
+    """
+    Where circuit breakers publish trips for other worker processes.
+    A trip is shared as the wall-clock time the circuit stays open until;
+    breakers check read() on every call and adopt newer trips, so one
+    worker seeing an outage short-circuits all of them. Recovery stays
+    per process: each worker probes on its own once the shared open
+    period has passed. This base store shares nothing.
+    """
+
+    name = "local"
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def read(self, breaker: str) -> Optional[float]:
+        """Open-until time (time.time()) of the latest shared trip, if any"""
+        return None
+
+    def publish(self, breaker: str, open_until: float):
+        """Share a trip with the other processes"""
+        pass
+
+    def get_stats(self) -> dict:
+        return {"mode": self.name}
+
+class MmapBreakerStore(BreakerStore):
+    """
+    Trips shared through a memory-mapped file (single host).
+    Each breaker owns a slot holding a hash of its name and its open-until
+    time, so read() is a dict lookup plus an 8-byte unpack without a
+    syscall. Writes take an flock on the file.
+    """
+
+    name = "mmap"
+    SLOT = struct.Struct("16sd")
+
+    def __init__(self, path: str, slots: int = 256):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * self.SLOT.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._offsets: dict[str, int] = {}
+        self.published_count = 0
+
+    async def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _offset(self, breaker: str, claim: bool) -> Optional[int]:
+        offset = self._offsets.get(breaker)
+        if offset is not None:
+            return offset
+        key = hashlib.blake2b(breaker.encode("utf-8"), digest_size=16).digest()
+        start = int.from_bytes(key[:4], "little") % self.slots
+        for step in range(self.slots):
+            offset = ((start + step) % self.slots) * self.SLOT.size
+            existing = self._map[offset:offset + 16]
+            if existing == key:
+                self._offsets[breaker] = offset
+                return offset
+            if existing == bytes(16):
+                if not claim:
+                    return None
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+                try:
+                    # Another process may have claimed the slot meanwhile
+                    existing = self._map[offset:offset + 16]
+                    if existing == bytes(16):
+                        self.SLOT.pack_into(self._map, offset, key, 0.0)
+                        existing = key
+                finally:
+                    self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+                if existing == key:
+                    self._offsets[breaker] = offset
+                    return offset
+        raise RuntimeError(f"No free circuit breaker slot in {self.path}")
+
+    def read(self, breaker: str) -> Optional[float]:
+        offset = self._offset(breaker, claim=False)
+        if offset is None:
+            return None
+        _, open_until = self.SLOT.unpack_from(self._map, offset)
+        return open_until or None
+
+    def publish(self, breaker: str, open_until: float):
+        offset = self._offset(breaker, claim=True)
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            key, current = self.SLOT.unpack_from(self._map, offset)
+            self.SLOT.pack_into(self._map, offset, key, max(current, open_until))
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        self.published_count += 1
+
+    def get_stats(self) -> dict:
+        return {"mode": self.name, "path": self.path, "published_count": self.published_count}
+
+class RedisBreakerStore(BreakerStore):
+    """
+    Trips shared through Redis (across hosts).
+    A trip is written as a key expiring with the open period, for workers
+    that start later, and published on a channel every worker listens on,
+    so read() only ever looks at an in-process copy.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.key_prefix = os.getenv("CIRCUIT_BREAKER_KEY_PREFIX", "circuit_breaker:")
+        self.channel = f"{self.key_prefix}trips"
+        self.client = None
+        self.open_until: dict[str, float] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+        self.published_count = 0
+        self.received_count = 0
+        self.error_count = 0
+
+    async def connect(self):
+        try:
+            self.client = aioredis.Redis.from_url(
+                self.url,
+                socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.05"))
+            )
+            await self.client.ping()
+            # Catch up on trips made before this worker started
+            keys = [key async for key in self.client.scan_iter(f"{self.key_prefix}*")]
+            if keys:
+                for key, value in zip(keys, await self.client.mget(keys)):
+                    if value is not None:
+                        self._apply(key.decode()[len(self.key_prefix):], float(value))
+        except Exception as e:
+            logger.warning(f"Redis unavailable, circuit breaker state is per process: {e}")
+            self.client = None
+            return
+        self._listener = asyncio.create_task(self._listen())
+        logger.info("Circuit breaker store initialized (redis mode)")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _apply(self, breaker: str, open_until: float):
+        if open_until > self.open_until.get(breaker, 0.0):
+            self.open_until[breaker] = open_until
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    trip = json.loads(message["data"])
+                    self.received_count += 1
+                    self._apply(trip["breaker"], trip["open_until"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error_count += 1
+                logger.warning(f"Circuit breaker subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def read(self, breaker: str) -> Optional[float]:
+        return self.open_until.get(breaker)
+
+    def publish(self, breaker: str, open_until: float):
+        self._apply(breaker, open_until)
+        if self.client is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._publish(breaker, open_until))
+        except RuntimeError:
+            return
+        # Keep a reference until done so the write is not garbage collected
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _publish(self, breaker: str, open_until: float):
+        ttl_ms = max(1, int((open_until - time.time()) * 1000))
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(f"{self.key_prefix}{breaker}", repr(open_until), px=ttl_ms)
+                pipe.publish(self.channel, json.dumps({"breaker": breaker, "open_until": open_until}))
+                await pipe.execute()
+            self.published_count += 1
+        except Exception as e:
+            self.error_count += 1
+            logger.warning(f"Failed to publish circuit breaker trip: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "mode": self.name,
+            "connected": self.client is not None,
+            "published_count": self.published_count,
+            "received_count": self.received_count,
+            "error_count": self.error_count
+        }
+
+def create_breaker_store() -> BreakerStore:
+    """Store selected by CIRCUIT_BREAKER_STORE: local, mmap or redis"""
+    mode = os.getenv("CIRCUIT_BREAKER_STORE", "local")
+    if mode == "mmap":
+        return MmapBreakerStore(os.getenv("CIRCUIT_BREAKER_MMAP_PATH", "/dev/shm/ai-ui-generator-breakers"))
+    if mode == "redis":
+        url = os.getenv("CIRCUIT_BREAKER_REDIS_URL", os.getenv("REDIS_URL"))
+        if url and aioredis is not None:
+            return RedisBreakerStore(url)
+        logger.warning("CIRCUIT_BREAKER_STORE=redis needs redis and REDIS_URL, breaker state is per process")
+    return BreakerStore()
+
+# Global store shared by all circuit breakers in this process
+breaker_store = create_breaker_store()
@@ -1,107 +1,266 @@
 import time
 import os
+import threading
+from collections import deque
 from enum import Enum
 from typing import Optional
 from dotenv import load_dotenv
 import logging
+from .metrics import metrics
+from .breaker_store import BreakerStore, breaker_store
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+circuit_state_gauge = metrics.gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 half open, 2 open)", ("name",)
+)
+circuit_transitions = metrics.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state transitions", ("name", "from_state", "to_state")
+)
+circuit_rejections = metrics.counter(
+    "circuit_breaker_rejections_total", "Calls rejected by an open breaker or a full set of half-open probes", ("name",)
+)
+
 class CircuitState(Enum):
     CLOSED = "closed"  # Normal operation
     OPEN = "open"      # Circuit breaker triggered, blocking requests
     HALF_OPEN = "half_open"  # Testing if service recovered
 
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+class Permit:
+    """Permission for one call; hand it back through record_success, record_failure or release"""
+
+    __slots__ = ("probe", "generation")
+
+    def __init__(self, probe: bool, generation: int):
+        self.probe = probe
+        self.generation = generation
+
 class CircuitBreaker:
     """
     Circuit breaker pattern implementation for fault tolerance.
     Prevents cascading failures by stopping requests to failing services.
+
+    Trips when, over a rolling window of time buckets with at least
+    min_calls calls, the failure rate or the slow-call rate reaches its
+    threshold, or after failure_threshold consecutive failures (which
+    still catches outages at low traffic). Once the open timeout passes,
+    at most half_open_probes calls run at a time as probes; that many
+    fast successes close the breaker, a failure or slow call reopens it.
+    State changes are made under a lock, so every check-and-update is
+    atomic for coroutines and threads alike. Trips are published to the
+    breaker store, and trips published by other workers open this
+    breaker too.
     """
-    
+
     def __init__(
         self,
         failure_threshold: Optional[int] = None,
         timeout_seconds: Optional[int] = None,
-        name: str = "default"
+        name: str = "default",
+        store: Optional[BreakerStore] = None
     ):
         self.name = name
+        self.store = store or breaker_store
         self.failure_threshold = failure_threshold or int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5"))
         self.timeout_seconds = timeout_seconds or int(os.getenv("CIRCUIT_BREAKER_TIMEOUT", "60"))
-        
-        self.failure_count = 0
-        self.last_failure_time: Optional[float] = None
+        self.window_seconds = float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", "60"))
+        self.bucket_seconds = self.window_seconds / int(os.getenv("CIRCUIT_BREAKER_WINDOW_BUCKETS", "10"))
+        self.min_calls = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "10"))
+        self.failure_rate_threshold = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+        self.slow_call_seconds = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "60"))
+        self.slow_call_rate_threshold = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_RATE", "0.8"))
+        self.half_open_probes = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "2"))
+
+        self._lock = threading.Lock()
+        # [bucket index, calls, failures, slow calls], oldest first
+        self._buckets: deque = deque()
         self.state = CircuitState.CLOSED
-        self.success_count = 0
-    
-    def record_success(self):
-        """Record a successful request"""
-        if self.state == CircuitState.HALF_OPEN:
-            self.success_count += 1
-            if self.success_count >= 2:  # After 2 successes, close the circuit
-                logger.info(f"Circuit breaker '{self.name}' closing after successful requests")
-                self._close_circuit()
-        elif self.state == CircuitState.CLOSED:
-            # Reset failure count on success
-            self.failure_count = 0
-    
-    def record_failure(self):
-        """Record a failed request"""
-        self.failure_count += 1
-        self.last_failure_time = time.time()
-        
-        if self.state == CircuitState.HALF_OPEN:
-            logger.warning(f"Circuit breaker '{self.name}' opening due to failure in HALF_OPEN state")
-            self._open_circuit()
-        elif self.failure_count >= self.failure_threshold:
-            logger.warning(
-                f"Circuit breaker '{self.name}' opening due to {self.failure_count} failures "
-                f"(threshold: {self.failure_threshold})"
-            )
-            self._open_circuit()
-    
-    def can_execute(self) -> bool:
-        """Check if request can be executed"""
-        if self.state == CircuitState.CLOSED:
+        self.opened_at: Optional[float] = None
+        self.consecutive_failures = 0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        # Bumped on every transition so permits from an earlier state are ignored
+        self.generation = 0
+        self._shared_open_until = 0.0
+        self.remote_trips = 0
+        circuit_state_gauge.labels(self.name).set(0)
+
+    def _window(self, now: float) -> tuple[int, int, int]:
+        """Calls, failures and slow calls in the rolling window"""
+        oldest = int(now // self.bucket_seconds) - int(self.window_seconds // self.bucket_seconds) + 1
+        while self._buckets and self._buckets[0][0] < oldest:
+            self._buckets.popleft()
+        calls = failures = slow = 0
+        for _, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            calls += bucket_calls
+            failures += bucket_failures
+            slow += bucket_slow
+        return calls, failures, slow
+
+    def _add(self, now: float, failed: bool, slow: bool):
+        index = int(now // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != index:
+            self._buckets.append([index, 0, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += slow
+
+    def _sync_shared(self, now: float):
+        """Adopt a trip another worker published; callers hold the lock"""
+        open_until = self.store.read(self.name)
+        if open_until is None or open_until <= self._shared_open_until:
+            return
+        self._shared_open_until = open_until
+        remaining = open_until - time.time()
+        if remaining <= 0:
+            return
+        if self.state != CircuitState.OPEN:
+            logger.warning(f"Circuit breaker '{self.name}' opening, tripped by another worker")
+            self._transition(CircuitState.OPEN, publish=False)
+            self.remote_trips += 1
+        # Reopen for probes when the tripping worker does
+        self.opened_at = now - self.timeout_seconds + remaining
+
+    def _open_timeout_passed(self, now: float) -> bool:
+        return self.opened_at is not None and now - self.opened_at >= self.timeout_seconds
+
+    def is_available(self) -> bool:
+        """Whether acquire() would grant a permit, without changing state"""
+        with self._lock:
+            now = time.monotonic()
+            self._sync_shared(now)
+            if self.state == CircuitState.OPEN:
+                return self._open_timeout_passed(now)
+            if self.state == CircuitState.HALF_OPEN:
+                return self.probes_in_flight < self.half_open_probes
             return True
-        
-        if self.state == CircuitState.OPEN:
-            # Check if timeout has passed
-            if self.last_failure_time and (time.time() - self.last_failure_time) >= self.timeout_seconds:
+
+    def acquire(self) -> Optional[Permit]:
+        """Permit for one call, or None if the call must not be made"""
+        with self._lock:
+            now = time.monotonic()
+            self._sync_shared(now)
+            if self.state == CircuitState.OPEN and self._open_timeout_passed(now):
                 logger.info(f"Circuit breaker '{self.name}' entering HALF_OPEN state")
-                self._half_open_circuit()
-                return True
+                self._transition(CircuitState.HALF_OPEN)
+
+            if self.state == CircuitState.CLOSED:
+                return Permit(False, self.generation)
+            if self.state == CircuitState.HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+                self.probes_in_flight += 1
+                return Permit(True, self.generation)
+        circuit_rejections.labels(self.name).inc()
+        return None
+
+    def _finish_probe(self, permit: Optional[Permit]) -> bool:
+        """Hand back a probe slot; True if the permit belongs to the current half-open period"""
+        if permit is None or not permit.probe or permit.generation != self.generation:
             return False
-        
-        # HALF_OPEN state - allow request to test service
+        self.probes_in_flight -= 1
         return True
-    
-    def _open_circuit(self):
-        """Open the circuit (block requests)"""
-        self.state = CircuitState.OPEN
-        self.success_count = 0
-    
-    def _close_circuit(self):
-        """Close the circuit (allow requests)"""
-        self.state = CircuitState.CLOSED
-        self.failure_count = 0
-        self.success_count = 0
-    
-    def _half_open_circuit(self):
-        """Enter half-open state (test service)"""
-        self.state = CircuitState.HALF_OPEN
-        self.success_count = 0
-    
+
+    def record_success(self, permit: Optional[Permit] = None, seconds: Optional[float] = None):
+        """Record a successful request"""
+        slow = seconds is not None and seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._finish_probe(permit):
+                if slow:
+                    logger.warning(f"Circuit breaker '{self.name}' reopening after a slow probe ({seconds:.1f}s)")
+                    self._transition(CircuitState.OPEN)
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    logger.info(f"Circuit breaker '{self.name}' closing after successful requests")
+                    self._transition(CircuitState.CLOSED)
+            elif self.state == CircuitState.CLOSED:
+                self.consecutive_failures = 0
+                self._add(time.monotonic(), False, slow)
+                self._check_rates()
+
+    def record_failure(self, permit: Optional[Permit] = None, seconds: Optional[float] = None):
+        """Record a failed request"""
+        slow = seconds is not None and seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._finish_probe(permit):
+                logger.warning(f"Circuit breaker '{self.name}' opening due to failure in HALF_OPEN state")
+                self._transition(CircuitState.OPEN)
+            elif self.state == CircuitState.CLOSED:
+                self.consecutive_failures += 1
+                self._add(time.monotonic(), True, slow)
+                if self.consecutive_failures >= self.failure_threshold:
+                    logger.warning(
+                        f"Circuit breaker '{self.name}' opening due to {self.consecutive_failures} "
+                        f"consecutive failures (threshold: {self.failure_threshold})"
+                    )
+                    self._transition(CircuitState.OPEN)
+                else:
+                    self._check_rates()
+
+    def release(self, permit: Optional[Permit]):
+        """Return a permit whose call was abandoned without an outcome (cancelled)"""
+        with self._lock:
+            self._finish_probe(permit)
+
+    def _check_rates(self):
+        calls, failures, slow = self._window(time.monotonic())
+        if calls < self.min_calls:
+            return
+        if failures / calls >= self.failure_rate_threshold:
+            logger.warning(
+                f"Circuit breaker '{self.name}' opening due to failure rate {failures}/{calls} "
+                f"(threshold: {self.failure_rate_threshold:.0%})"
+            )
+            self._transition(CircuitState.OPEN)
+        elif slow / calls >= self.slow_call_rate_threshold:
+            logger.warning(
+                f"Circuit breaker '{self.name}' opening due to slow call rate {slow}/{calls} "
+                f"(threshold: {self.slow_call_rate_threshold:.0%} over {self.slow_call_seconds}s)"
+            )
+            self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState, publish: bool = True):
+        """Enter a state; callers hold the lock"""
+        circuit_transitions.labels(self.name, self.state.value, state.value).inc()
+        circuit_state_gauge.labels(self.name).set(STATE_VALUES[state.value])
+        self.state = state
+        self.generation += 1
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        if state == CircuitState.OPEN:
+            self.opened_at = time.monotonic()
+            if publish:
+                self._shared_open_until = time.time() + self.timeout_seconds
+                self.store.publish(self.name, self._shared_open_until)
+        elif state == CircuitState.CLOSED:
+            # Start the window afresh so pre-outage failures cannot trip it again
+            self.opened_at = None
+            self.consecutive_failures = 0
+            self._buckets.clear()
+
     def get_state(self) -> dict:
         """Get current circuit breaker state"""
-        return {
-            "name": self.name,
-            "state": self.state.value,
-            "failure_count": self.failure_count,
-            "failure_threshold": self.failure_threshold,
-            "last_failure_time": self.last_failure_time,
-            "timeout_seconds": self.timeout_seconds
-        }
-
-# Global circuit breaker instance for LLM calls
-llm_circuit_breaker = CircuitBreaker(name="llm_service")
\ No newline at end of file
+        with self._lock:
+            now = time.monotonic()
+            self._sync_shared(now)
+            calls, failures, slow = self._window(now)
+            open_remaining = None
+            if self.state == CircuitState.OPEN:
+                open_remaining = round(max(0.0, self.opened_at + self.timeout_seconds - now), 1)
+            return {
+                "name": self.name,
+                "state": self.state.value,
+                "window_calls": calls,
+                "failure_rate": round(failures / calls, 4) if calls else 0.0,
+                "slow_call_rate": round(slow / calls, 4) if calls else 0.0,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "probes_in_flight": self.probes_in_flight,
+                "half_open_probes": self.half_open_probes,
+                "timeout_seconds": self.timeout_seconds,
+                "remote_trips": self.remote_trips,
+                "open_remaining_seconds": open_remaining
+            }
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+import zlib
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from bson import Binary
+from dotenv import load_dotenv
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is always available
+    zstandard = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def train_dictionary(samples: list[str], dict_size: int) -> bytes:
+    """Train a zstd dictionary from sample generations"""
+    if zstandard is None:
+        raise RuntimeError("zstandard is not installed")
+    encoded = [sample.encode("utf-8") for sample in samples]
+    return zstandard.train_dictionary(dict_size, encoded).as_bytes()
+
+class CodeCompressor:
+    """
+    Transparent compression of generated code.
+    Code of at least CODE_COMPRESSION_MIN_BYTES is stored in
+    generated_code_z instead of generated_code: zstd with a dictionary
+    trained on past generations when zstandard is installed, zlib
+    otherwise. The codec is recognised from the blob's magic bytes and
+    zstd frames carry their dictionary id, so every stored blob stays
+    readable after the dictionary is retrained.
+    """
+
+    def __init__(
+        self,
+        min_bytes: Optional[int] = None,
+        level: Optional[int] = None,
+        dict_size: Optional[int] = None,
+        train_samples: Optional[int] = None,
+        use_zstd: Optional[bool] = None
+    ):
+        if min_bytes is None:
+            min_bytes = int(os.getenv("CODE_COMPRESSION_MIN_BYTES", "1024"))
+        if use_zstd is None:
+            use_zstd = os.getenv("CODE_COMPRESSION_CODEC", "zstd").lower() == "zstd"
+        self.min_bytes = min_bytes
+        self.level = level or int(os.getenv("CODE_COMPRESSION_LEVEL", "3"))
+        self.dict_size = dict_size or int(os.getenv("CODE_COMPRESSION_DICT_SIZE", "16384"))
+        self.train_samples = train_samples or int(os.getenv("CODE_COMPRESSION_TRAIN_SAMPLES", "500"))
+        self.train_interval_seconds = int(os.getenv("CODE_COMPRESSION_TRAIN_INTERVAL_SECONDS", "3600"))
+        self.use_zstd = use_zstd and zstandard is not None
+        if use_zstd and zstandard is None:
+            logger.warning("zstandard not installed, compressing generated code with zlib")
+
+        self.dictionaries: dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self.active_dict_id: Optional[int] = None
+        self._compressor = None
+        self._decompressors: dict[int, "zstandard.ZstdDecompressor"] = {}
+        self._dict_collection = None
+        self._train_task: Optional[asyncio.Task] = None
+
+        self.compressed_count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_seconds = 0.0
+        self._build_compressor()
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_bytes > 0
+
+    def _build_compressor(self):
+        if not self.use_zstd:
+            return
+        dictionary = self.dictionaries.get(self.active_dict_id)
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+
+    def load_dictionary(self, data: bytes, activate: bool = True) -> int:
+        """Register a zstd dictionary, by default also using it for new compressions"""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        dict_id = dictionary.dict_id()
+        self.dictionaries[dict_id] = dictionary
+        self._decompressors.pop(dict_id, None)
+        if activate:
+            self.active_dict_id = dict_id
+            self._build_compressor()
+        return dict_id
+
+    async def _fetch_dictionary(self, dict_id: int):
+        """Load a dictionary trained by another instance after we connected"""
+        if self._dict_collection is None:
+            return
+        doc = await self._dict_collection.find_one({"dict_id": dict_id}, {"_id": 0, "data": 1})
+        if doc:
+            self.load_dictionary(bytes(doc["data"]), activate=False)
+
+    async def connect(self, dict_collection, generations=None):
+        """Load stored zstd dictionaries; train one in the background if none exist"""
+        self._dict_collection = dict_collection
+        if not (self.enabled and self.use_zstd):
+            return
+        try:
+            # Oldest first, so the newest dictionary ends up active
+            async for doc in dict_collection.find({}, {"_id": 0}).sort("created_at", 1):
+                self.load_dictionary(bytes(doc["data"]))
+        except Exception as e:
+            logger.warning(f"Could not load compression dictionaries: {e}")
+
+        if self.active_dict_id is not None:
+            logger.info(f"Code compression using zstd dictionary {self.active_dict_id}")
+        elif generations is not None:
+            self._train_task = asyncio.create_task(self._train_loop(generations))
+
+    async def close(self):
+        if self._train_task is not None:
+            self._train_task.cancel()
+            await asyncio.gather(self._train_task, return_exceptions=True)
+            self._train_task = None
+
+    async def _train_loop(self, generations):
+        while True:
+            try:
+                if await self.train(generations):
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Compression dictionary training failed: {e}")
+            await asyncio.sleep(self.train_interval_seconds)
+
+    async def train(self, generations) -> bool:
+        """Train, store and activate a dictionary from recent successful generations"""
+        docs = await generations.find(
+            {"status": "success"},
+            {"_id": 0, "generated_code": 1, "generated_code_z": 1}
+        ).sort("created_at", -1).limit(self.train_samples).to_list(self.train_samples)
+        samples = [(await self.restore(doc)).get("generated_code") for doc in docs]
+        samples = [code for code in samples if code]
+        # zstd needs a few dozen samples to produce a useful dictionary
+        if len(samples) < 50:
+            logger.info(f"Not enough generations to train a compression dictionary ({len(samples)})")
+            return False
+
+        data = await asyncio.to_thread(train_dictionary, samples, self.dict_size)
+        dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+        await self._dict_collection.update_one(
+            {"dict_id": dict_id},
+            {"$set": {
+                "dict_id": dict_id,
+                "data": Binary(data),
+                "samples": len(samples),
+                "created_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+        self.load_dictionary(data)
+        logger.info(f"Trained zstd dictionary {dict_id} from {len(samples)} generations")
+        return True
+
+    def compress(self, code: str) -> Binary:
+        started = time.perf_counter()
+        raw = code.encode("utf-8")
+        if self._compressor is not None:
+            blob = self._compressor.compress(raw)
+        else:
+            blob = zlib.compress(raw, 6)
+        self.compress_seconds += time.perf_counter() - started
+        self.compressed_count += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(blob)
+        return Binary(blob)
+
+    def decompress(self, blob: bytes) -> str:
+        blob = bytes(blob)
+        if not blob.startswith(ZSTD_MAGIC):
+            return zlib.decompress(blob).decode("utf-8")
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed code")
+
+        dict_id = zstandard.get_frame_parameters(blob).dict_id
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self.dictionaries:
+                raise RuntimeError(f"Unknown zstd dictionary {dict_id}")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+            self._decompressors[dict_id] = decompressor
+        return decompressor.decompress(blob).decode("utf-8")
+
+    def encode_fields(self, code: str, force: bool = False) -> tuple[dict, dict]:
+        """Return the ($set, $unset) fields that store code in its best form"""
+        if force or (self.enabled and len(code) >= self.min_bytes):
+            return {"generated_code_z": self.compress(code)}, {"generated_code": ""}
+        return {"generated_code": code}, {"generated_code_z": ""}
+
+    async def restore(self, doc: dict) -> dict:
+        """Replace generated_code_z on a stored document with plain generated_code"""
+        blob = doc.pop("generated_code_z", None)
+        if blob is not None:
+            blob = bytes(blob)
+            if zstandard is not None and blob.startswith(ZSTD_MAGIC):
+                dict_id = zstandard.get_frame_parameters(blob).dict_id
+                if dict_id and dict_id not in self.dictionaries:
+                    await self._fetch_dictionary(dict_id)
+            doc["generated_code"] = self.decompress(blob)
+        return doc
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "codec": "zstd" if self.use_zstd else "zlib",
+            "dict_id": self.active_dict_id,
+            "min_bytes": self.min_bytes,
+            "compressed_count": self.compressed_count,
+            "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None,
+            "avg_compress_ms": round(self.compress_seconds / self.compressed_count * 1000, 3) if self.compressed_count else 0.0
+        }
+
+# Global compressor for generated code
+code_compressor = CodeCompressor()
@@ -0,0 +1,186 @@
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+from .job_events import TERMINAL_STATUSES
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is only needed for the shared tier
+    aioredis = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+class JobStateCache:
+    """
+    Cache of job status responses in front of the generations collection.
+    The app writes the full state through on every job transition and
+    get_job_status reads here first. Terminal states never change, so they
+    are kept for JOB_CACHE_TTL_SECONDS. States of jobs this process is
+    running are kept until the job finishes, since nobody else moves them
+    on. Any other pending/running state may be moved on by another process
+    and only lives for JOB_CACHE_ACTIVE_TTL_SECONDS. With
+    JOB_CACHE_REDIS_URL (defaults to REDIS_URL) all processes share the
+    states in Redis and only terminal states are kept in process.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        active_ttl_seconds: Optional[float] = None
+    ):
+        self.enabled = os.getenv("JOB_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = max_entries or int(os.getenv("JOB_CACHE_SIZE", "5000"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("JOB_CACHE_TTL_SECONDS", "300"))
+        self.active_ttl_seconds = active_ttl_seconds or float(os.getenv("JOB_CACHE_ACTIVE_TTL_SECONDS", "5"))
+        self.redis_url = os.getenv("JOB_CACHE_REDIS_URL", os.getenv("REDIS_URL"))
+        self.key_prefix = os.getenv("JOB_CACHE_KEY_PREFIX", "jobstate:")
+
+        self.entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # States of jobs running in this process, outside the LRU so they never expire or get evicted
+        self.running: dict[str, dict] = {}
+        self.client = None
+
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_errors = 0
+
+    async def connect(self):
+        """Connect the shared Redis tier when configured"""
+        if not (self.enabled and self.redis_url):
+            return
+        if aioredis is None:
+            logger.warning("Job cache Redis URL is set but redis is not installed, using in-process cache only")
+            return
+        try:
+            self.client = aioredis.Redis.from_url(
+                self.redis_url,
+                socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.05"))
+            )
+            await self.client.ping()
+            logger.info("Job state cache initialized (redis mode)")
+        except Exception as e:
+            logger.warning(f"Redis unavailable, job state cache is in-process only: {e}")
+            self.client = None
+
+    async def close(self):
+        """Clean up"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        self.entries.clear()
+        self.running.clear()
+
+    def _get_local(self, job_id: str) -> Optional[dict]:
+        if job_id in self.running:
+            return self.running[job_id]
+        entry = self.entries.get(job_id)
+        if entry is None:
+            return None
+        expires_at, state = entry
+        if expires_at < time.monotonic():
+            del self.entries[job_id]
+            return None
+        self.entries.move_to_end(job_id)
+        return state
+
+    def _set_local(self, job_id: str, state: dict):
+        terminal = state.get("status") in TERMINAL_STATUSES
+        if self.client is not None and not terminal:
+            # Shared mode: Redis holds the live state, only immutable states stay local
+            self.entries.pop(job_id, None)
+            return
+        ttl_seconds = self.ttl_seconds if terminal else self.active_ttl_seconds
+        self.entries[job_id] = (time.monotonic() + ttl_seconds, state)
+        self.entries.move_to_end(job_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Look up a job's state, promoting terminal Redis hits into memory"""
+        if not self.enabled:
+            return None
+
+        state = self._get_local(job_id)
+        if state is not None:
+            self.local_hits += 1
+            return state
+
+        if self.client is not None:
+            try:
+                raw = await self.client.hgetall(f"{self.key_prefix}{job_id}")
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Job cache lookup failed: {e}")
+                raw = None
+            if raw:
+                self.shared_hits += 1
+                state = {key.decode(): json.loads(value) for key, value in raw.items()}
+                self._set_local(job_id, state)
+                return state
+
+        self.misses += 1
+        return None
+
+    async def set(self, job_id: str, state: dict, running_here: bool = False):
+        """
+        Store a job's full state. running_here marks a job this process
+        is running; its state is kept until a terminal state is stored.
+        """
+        if not self.enabled:
+            return
+        if running_here and state.get("status") not in TERMINAL_STATUSES:
+            self.running[job_id] = state
+        else:
+            self.running.pop(job_id, None)
+            self._set_local(job_id, state)
+        if self.client is not None:
+            key = f"{self.key_prefix}{job_id}"
+            try:
+                async with self.client.pipeline(transaction=True) as pipe:
+                    pipe.delete(key)
+                    pipe.hset(key, mapping={field: json.dumps(value) for field, value in state.items()})
+                    pipe.pexpire(key, self.ttl_seconds * 1000)
+                    await pipe.execute()
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Job cache write failed: {e}")
+
+    async def remember(self, job_id: str, state: dict):
+        """Cache a state read from MongoDB; only terminal states are safe to keep"""
+        # A pending/running read can race a worker's write-through and overwrite a newer state
+        if state.get("status") in TERMINAL_STATUSES:
+            await self.set(job_id, state)
+
+    def release(self, job_id: str):
+        """Forget a job this process stopped running without storing its outcome"""
+        self.running.pop(job_id, None)
+
+    def get_stats(self) -> dict:
+        """Get cache hit/miss counters"""
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "mode": "redis" if self.client is not None else "memory",
+            "entries": len(self.entries),
+            "running": len(self.running),
+            "max_entries": self.max_entries,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared_errors": self.shared_errors,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+# Global job state cache instance
+job_cache = JobStateCache()
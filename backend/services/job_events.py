@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("success", "failed")
+
+class JobEventBus:
+    """
+    In-process pub/sub for job status transitions.
+    Each subscriber gets its own queue, so a slow client never blocks
+    the worker publishing the event.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self.published_count = 0
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Register a new subscriber for a job"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers[job_id].add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        """Remove a subscriber; drops the job entry once nobody listens"""
+        queues = self.subscribers.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[job_id]
+
+    def publish(self, job_id: str, event: dict):
+        """Push an event to every subscriber of a job"""
+        self.published_count += 1
+        for queue in self.subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+
+    def get_stats(self) -> dict:
+        """Get current subscription counts"""
+        return {
+            "jobs_watched": len(self.subscribers),
+            "subscribers": sum(len(q) for q in self.subscribers.values()),
+            "published_count": self.published_count
+        }
+
+# Global event bus instance
+job_events = JobEventBus()
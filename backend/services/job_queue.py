@@ -0,0 +1,258 @@
+import asyncio
+import os
+import time
+import uuid
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from .metrics import metrics
+from .job_timing import JobTimer, current_job_timer
+from .retry_policy import retry_policy
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Called with the claimed job document (job_id, prompt, created_at)
+JobHandler = Callable[[dict], Awaitable[None]]
+
+queue_wait_seconds = metrics.histogram(
+    "job_queue_wait_seconds", "Time from job creation until a worker claims it"
+)
+job_duration_seconds = metrics.histogram(
+    "job_duration_seconds", "Time a worker spends processing a job"
+)
+
+class JobQueue:
+    """
+    Durable worker-pool job queue.
+    The generations collection is the source of truth; the in-memory queue
+    only holds job ids waiting for a free worker. Jobs that don't fit in the
+    queue stay "pending" in MongoDB and are picked up by the refill loop.
+    Each process keeps a heartbeat document, so on startup the jobs of
+    workers that died (including this host's previous process) are
+    requeued right away instead of after the staleness cutoff.
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        poll_interval_seconds: Optional[float] = None,
+        stale_after_seconds: Optional[int] = None
+    ):
+        self.num_workers = num_workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_queue_size = max_queue_size or int(os.getenv("JOB_QUEUE_SIZE", "100"))
+        self.poll_interval_seconds = poll_interval_seconds or float(os.getenv("JOB_POLL_INTERVAL", "5"))
+        self.stale_after_seconds = stale_after_seconds or int(os.getenv("JOB_STALE_AFTER_SECONDS", "300"))
+        self.heartbeat_seconds = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+        # A worker whose heartbeat is older than this is considered dead
+        self.heartbeat_timeout_seconds = float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", "30"))
+        self.worker_id = str(uuid.uuid4())
+
+        self.collection = None
+        self.heartbeats = None
+        self.handler: Optional[JobHandler] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.active_jobs = 0
+        self.processed_count = 0
+        self.failed_count = 0
+
+    async def start(self, collection, handler: JobHandler, heartbeats=None):
+        """Recover orphaned jobs and start the worker pool"""
+        self.collection = collection
+        self.heartbeats = heartbeats
+        self.handler = handler
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._wakeup = asyncio.Event()
+
+        await self._heartbeat()
+        await self.requeue_orphaned_jobs(dead_workers=True)
+        await self._refill()
+
+        for i in range(self.num_workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._refill_loop()))
+        if self.heartbeats is not None:
+            self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        logger.info(
+            f"Job queue started with {self.num_workers} workers "
+            f"(queue size: {self.max_queue_size})"
+        )
+
+    async def stop(self):
+        """Stop all workers; unfinished jobs are recovered on next startup"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._queued.clear()
+        if self.heartbeats is not None:
+            # Our interrupted jobs become recoverable by the next process to start
+            try:
+                await self.heartbeats.delete_one({"_id": self.worker_id})
+            except Exception as e:
+                logger.warning(f"Failed to remove job queue heartbeat: {e}")
+        logger.info("Job queue stopped")
+
+    def enqueue(self, job_id: str) -> bool:
+        """
+        Hand a pending job to the worker pool.
+        Returns False when the queue is full; the job stays pending in MongoDB
+        and will be picked up by the refill loop once workers catch up.
+        """
+        if self.queue is None or job_id in self._queued:
+            return False
+        try:
+            self.queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            logger.warning(f"Job queue full, deferring job {job_id}")
+            return False
+        self._queued.add(job_id)
+        return True
+
+    async def _heartbeat(self):
+        if self.heartbeats is not None:
+            await self.heartbeats.update_one(
+                {"_id": self.worker_id},
+                {"$set": {"heartbeat_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self._heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job queue heartbeat failed: {e}")
+
+    async def _live_workers(self) -> list[str]:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.heartbeat_timeout_seconds)
+        return [doc["_id"] async for doc in self.heartbeats.find({"heartbeat_at": {"$gte": cutoff}}, {"_id": 1})]
+
+    async def requeue_orphaned_jobs(self, dead_workers: bool = False) -> int:
+        """
+        Reset "running" jobs whose worker stopped updating them back to "pending".
+        With dead_workers, also reset jobs claimed by workers without a live
+        heartbeat, however recent the claim.
+        """
+        now = datetime.now(timezone.utc)
+        orphaned = {"updated_at": {"$lt": now - timedelta(seconds=self.stale_after_seconds)}}
+        if dead_workers and self.heartbeats is not None:
+            live_workers = await self._live_workers()
+            # A worker that started after the heartbeat read is missing from
+            # live_workers, but its claims are newer than the read
+            orphaned = {"$or": [orphaned, {"worker_id": {"$nin": live_workers}, "updated_at": {"$lt": now}}]}
+        result = await self.collection.update_many(
+            {"status": "running", **orphaned},
+            {
+                "$set": {"status": "pending", "updated_at": now},
+                "$unset": {"worker_id": ""}
+            }
+        )
+        if result.modified_count:
+            logger.warning(f"Requeued {result.modified_count} orphaned jobs")
+        return result.modified_count
+
+    async def _claim(self, job_id: str) -> Optional[dict]:
+        """Atomically move a job from pending to running"""
+        return await self.collection.find_one_and_update(
+            {"job_id": job_id, "status": "pending"},
+            {"$set": {
+                "status": "running",
+                "worker_id": self.worker_id,
+                "updated_at": datetime.now(timezone.utc)
+            }},
+            projection={"job_id": 1, "prompt": 1, "created_at": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self.queue.get()
+            self._queued.discard(job_id)
+            try:
+                job = await self._claim(job_id)
+                if not job:
+                    # Already claimed by another worker or process
+                    continue
+                created_at = job.get("created_at")
+                if isinstance(created_at, datetime):
+                    if created_at.tzinfo is None:
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    queue_wait_seconds.observe((datetime.now(timezone.utc) - created_at).total_seconds())
+
+                self.active_jobs += 1
+                started = time.perf_counter()
+                # The handler and the LLM service record stages on this timer
+                timer_token = current_job_timer.set(JobTimer(queued_at=created_at))
+                # LLM retries stop once the job runs out of its deadline budget
+                deadline_token = retry_policy.start_deadline()
+                try:
+                    await self.handler(job)
+                    self.processed_count += 1
+                finally:
+                    retry_policy.reset_deadline(deadline_token)
+                    current_job_timer.reset(timer_token)
+                    self.active_jobs -= 1
+                    job_duration_seconds.observe(time.perf_counter() - started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_count += 1
+                logger.error(f"Worker {index} failed on job {job_id}: {e}")
+            finally:
+                self.queue.task_done()
+                if self.queue.empty():
+                    self._wakeup.set()
+
+    async def _refill(self):
+        """Load pending jobs from MongoDB into the free queue slots"""
+        free_slots = self.max_queue_size - self.queue.qsize()
+        if free_slots <= 0:
+            return
+        cursor = self.collection.find(
+            {"status": "pending"},
+            {"_id": 0, "job_id": 1}
+        ).sort("updated_at", 1).limit(free_slots)
+        async for job in cursor:
+            if job["job_id"] in self._queued:
+                continue
+            if not self.enqueue(job["job_id"]):
+                break
+
+    async def _refill_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.requeue_orphaned_jobs()
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job queue refill failed: {e}")
+
+    def get_stats(self) -> dict:
+        """Get current queue state"""
+        return {
+            "workers": self.num_workers,
+            "queue_size": self.max_queue_size,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "active_jobs": self.active_jobs,
+            "processed_count": self.processed_count,
+            "failed_count": self.failed_count
+        }
+
+# Global job queue instance
+job_queue = JobQueue()
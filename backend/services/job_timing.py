@@ -0,0 +1,154 @@
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+STAGES = ("queue", "lookup", "coalesced_wait", "governor_wait", "llm", "backoff", "first_chunk", "persist", "total")
+MAX_ATTEMPTS_RECORDED = 10
+
+class _Attempt:
+    """One LLM call attempt; offsets are seconds since the job was claimed"""
+
+    __slots__ = ("timer", "data")
+
+    def __init__(self, timer: "JobTimer", mode: str, backend: Optional[str] = None):
+        self.timer = timer
+        self.data = {"mode": mode, "start": timer.offset()}
+        if backend is not None:
+            self.data["backend"] = backend
+
+    def mark(self, name: str):
+        """Record the first time an attempt reaches a point (call, first_chunk)"""
+        self.data.setdefault(name, self.timer.offset())
+
+    def end(self, outcome: str, error: Optional[BaseException] = None):
+        self.data["end"] = self.timer.offset()
+        self.data["outcome"] = outcome
+        if error is not None:
+            self.data["error"] = type(error).__name__
+
+class _NullAttempt:
+    def mark(self, name: str):
+        pass
+
+    def end(self, outcome: str, error: Optional[BaseException] = None):
+        pass
+
+class JobTimer:
+    """
+    Stage timing breakdown of one generation job.
+    Created by the job queue worker when it claims a job and carried to
+    process_generation and LLMService through a context variable, so no
+    call signatures change. Stored as the timings field of the generation.
+    """
+
+    def __init__(self, queued_at: Optional[datetime] = None):
+        self.claimed_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.queue_seconds = None
+        if isinstance(queued_at, datetime):
+            if queued_at.tzinfo is None:
+                queued_at = queued_at.replace(tzinfo=timezone.utc)
+            self.queue_seconds = round((self.claimed_at - queued_at).total_seconds(), 4)
+        self.source: Optional[str] = None
+        self.attempts: list[dict] = []
+        self.marks: dict[str, float] = {}
+
+    def offset(self) -> float:
+        return round(time.perf_counter() - self._started, 4)
+
+    def mark(self, name: str):
+        self.marks.setdefault(name, self.offset())
+
+    def start_attempt(self, mode: str, backend: Optional[str] = None) -> _Attempt:
+        attempt = _Attempt(self, mode, backend)
+        if len(self.attempts) < MAX_ATTEMPTS_RECORDED:
+            self.attempts.append(attempt.data)
+        return attempt
+
+    def stages(self) -> dict:
+        """Seconds spent per stage, derived from the marks and attempts"""
+        # Calls that lost a hedged race overlap the winner and are left out
+        finished = [a for a in self.attempts if "end" in a and a["outcome"] != "cancelled"]
+        marks = self.marks
+        stages = {"queue": self.queue_seconds, "lookup": marks.get("looked_up")}
+        if self.source == "coalesced" and "looked_up" in marks and "completed" in marks:
+            stages["coalesced_wait"] = round(marks["completed"] - marks["looked_up"], 4)
+        if finished:
+            stages["llm"] = round(sum(a["end"] - a.get("call", a["start"]) for a in finished), 4)
+            stages["governor_wait"] = round(sum(a.get("call", a["start"]) - a["start"] for a in finished), 4)
+        if len(finished) > 1:
+            # Gaps between attempts are retry policy backoff (and the stream -> retry fallback)
+            stages["backoff"] = round(sum(
+                max(0.0, later["start"] - earlier["end"]) for earlier, later in zip(finished, finished[1:])
+            ), 4)
+        first_chunk = next((a for a in self.attempts if "first_chunk" in a), None)
+        if first_chunk is not None:
+            stages["first_chunk"] = round(first_chunk["first_chunk"] - first_chunk.get("call", first_chunk["start"]), 4)
+        if "persisted" in marks:
+            if "completed" in marks:
+                stages["persist"] = round(marks["persisted"] - marks["completed"], 4)
+            stages["total"] = round(marks["persisted"] + (self.queue_seconds or 0.0), 4)
+        return {stage: value for stage, value in stages.items() if value is not None}
+
+    def to_dict(self) -> dict:
+        return {
+            "claimed_at": self.claimed_at,
+            "source": self.source,
+            "marks": dict(self.marks),
+            "attempts": list(self.attempts),
+            "stages": self.stages()
+        }
+
+class _NullTimer:
+    """Stand-in outside a job (direct LLMService calls), records nothing"""
+
+    def mark(self, name: str):
+        pass
+
+    def start_attempt(self, mode: str, backend: Optional[str] = None) -> _NullAttempt:
+        return _NullAttempt()
+
+_null_timer = _NullTimer()
+
+current_job_timer: ContextVar[Optional[JobTimer]] = ContextVar("current_job_timer", default=None)
+
+def job_timer():
+    """The timer of the job being processed, or a no-op timer"""
+    return current_job_timer.get() or _null_timer
+
+def _percentile(values: list[float], pct: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def summarize_timings(timings: list[dict]) -> dict:
+    """Per-stage percentiles and source counts over stored timing breakdowns"""
+    sources: dict[str, int] = {}
+    samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    attempts = 0
+    for timing in timings:
+        source = timing.get("source") or "unknown"
+        sources[source] = sources.get(source, 0) + 1
+        attempts += len(timing.get("attempts", []))
+        for stage, value in timing.get("stages", {}).items():
+            if stage in samples:
+                samples[stage].append(value)
+
+    stages = {}
+    for stage, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        stages[stage] = {
+            "count": len(values),
+            "avg": round(sum(values) / len(values), 4),
+            "p50": _percentile(values, 50),
+            "p90": _percentile(values, 90),
+            "p99": _percentile(values, 99),
+            "max": values[-1]
+        }
+    return {
+        "jobs": len(timings),
+        "sources": sources,
+        "llm_attempts": attempts,
+        "stages": stages
+    }
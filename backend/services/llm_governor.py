@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+class _Reservation:
+    """A granted slot; record actual usage once the response arrives"""
+
+    __slots__ = ("entry",)
+
+    def __init__(self, entry: list):
+        self.entry = entry
+
+    def record_usage(self, total_tokens: Optional[int]):
+        """Replace the token estimate with the count reported by the API"""
+        if total_tokens is not None:
+            self.entry[1] = total_tokens
+
+class _Slot:
+    def __init__(self, governor: "LLMGovernor", estimated_tokens: int):
+        self.governor = governor
+        self.estimated_tokens = estimated_tokens
+
+    async def __aenter__(self) -> _Reservation:
+        return await self.governor._acquire(self.estimated_tokens)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.governor._release()
+
+class LLMGovernor:
+    """
+    Outbound governor for LLM calls.
+    Enforces max concurrent requests, requests per second and estimated
+    tokens per minute. Callers wait in FIFO order instead of failing, so
+    bursts are smoothed to what the OpenAI quota sustains rather than
+    turning into 429s and retries. A limit of 0 disables that dimension.
+    A call reserves its estimate (prompt plus max_tokens) and is charged
+    the tokens the API reports once it answers. The token limit is off by
+    default: the reservation is far above what a typical call uses, so it
+    is only worth setting to the account's real TPM quota.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_requests_per_second: Optional[float] = None,
+        max_tokens_per_minute: Optional[int] = None
+    ):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        if max_requests_per_second is None:
+            max_requests_per_second = float(os.getenv("LLM_MAX_RPS", "5"))
+        if max_tokens_per_minute is None:
+            max_tokens_per_minute = int(os.getenv("LLM_MAX_TPM", "0"))
+        self.max_concurrency = max_concurrency
+        self.max_requests_per_second = max_requests_per_second
+        self.max_tokens_per_minute = max_tokens_per_minute
+
+        self._admission = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        self._next_slot = 0.0
+        self._token_window: deque = deque()
+        self._recent_waits: deque = deque(maxlen=1000)
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.granted_count = 0
+
+    def slot(self, estimated_tokens: int) -> _Slot:
+        """Async context manager that waits for capacity for one request"""
+        return _Slot(self, estimated_tokens)
+
+    def _prune(self, now: float):
+        while self._token_window and self._token_window[0][0] <= now - 60:
+            self._token_window.popleft()
+
+    def _tokens_in_window(self, now: float) -> int:
+        self._prune(now)
+        return sum(tokens for _, tokens in self._token_window)
+
+    async def _acquire(self, estimated_tokens: int) -> _Reservation:
+        started = time.monotonic()
+        holds_semaphore = False
+        self.waiting += 1
+        try:
+            # The admission lock is FIFO, so callers are served in arrival order
+            async with self._admission:
+                if self._semaphore is not None:
+                    await self._semaphore.acquire()
+                    holds_semaphore = True
+
+                if self.max_requests_per_second:
+                    now = time.monotonic()
+                    slot = max(now, self._next_slot)
+                    self._next_slot = slot + 1 / self.max_requests_per_second
+                    if slot > now:
+                        await asyncio.sleep(slot - now)
+
+                if self.max_tokens_per_minute:
+                    now = time.monotonic()
+                    while (
+                        self._token_window
+                        and self._tokens_in_window(now) + estimated_tokens > self.max_tokens_per_minute
+                    ):
+                        await asyncio.sleep(self._token_window[0][0] + 60 - now)
+                        now = time.monotonic()
+
+                now = time.monotonic()
+                self._prune(now)
+                entry = [now, estimated_tokens]
+                self._token_window.append(entry)
+        except BaseException:
+            # Cancelled while waiting for the rate or token budget
+            if holds_semaphore:
+                self._semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.granted_count += 1
+        self._recent_waits.append(time.monotonic() - started)
+        return _Reservation(entry)
+
+    def _release(self):
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def get_stats(self) -> dict:
+        """Get queue depth, in-flight count and recent wait times"""
+        waits = sorted(self._recent_waits)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_requests_per_second": self.max_requests_per_second,
+            "max_tokens_per_minute": self.max_tokens_per_minute,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "granted_count": self.granted_count,
+            "tokens_last_minute": self._tokens_in_window(time.monotonic()),
+            "wait_seconds": {
+                "avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+                "max": round(waits[-1], 4) if waits else 0.0
+            }
+        }
+
+# Global governor for outbound OpenAI calls
+llm_governor = LLMGovernor()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from .metrics import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+hedge_outcomes = metrics.counter(
+    "llm_hedges_total", "Hedged LLM calls by outcome (won, lost, failed, skipped)", ("mode", "outcome")
+)
+
+class HedgePolicy:
+    """
+    Hedged requests for LLM calls.
+    When a call has not returned (or, for streams, produced its first chunk)
+    within the rolling LLM_HEDGE_PERCENTILE of recent calls, a duplicate is
+    sent and whichever succeeds first wins; the other is cancelled. Extra
+    spend is capped by a token budget that earns LLM_HEDGE_BUDGET_RATIO of
+    every call's estimated tokens, so hedges can never add more than that
+    share on top of normal traffic.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        percentile: Optional[float] = None,
+        budget_ratio: Optional[float] = None
+    ):
+        if enabled is None:
+            enabled = os.getenv("LLM_HEDGING", "false").lower() == "true"
+        self.enabled = enabled
+        self.percentile = percentile or float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+        self.budget_ratio = budget_ratio if budget_ratio is not None else float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.05"))
+        self.max_budget_tokens = int(os.getenv("LLM_HEDGE_MAX_BUDGET_TOKENS", "20000"))
+        self.min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.min_delay_seconds = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+
+        self._samples: dict[str, deque] = {}
+        self.budget_tokens = 0.0
+
+        self.hedged_count = 0
+        self.won_count = 0
+        self.skipped_count = 0
+
+    def record(self, mode: str, seconds: float):
+        """Add a completed call's latency to the rolling window"""
+        self._samples.setdefault(mode, deque(maxlen=500)).append(seconds)
+
+    def delay(self, mode: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off or unwarmed"""
+        samples = self._samples.get(mode)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        threshold = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        return max(self.min_delay_seconds, threshold)
+
+    def _spend(self, tokens: int) -> bool:
+        if self.budget_tokens < tokens:
+            return False
+        self.budget_tokens -= tokens
+        return True
+
+    async def race(
+        self,
+        mode: str,
+        start_primary: Callable[[], Awaitable],
+        start_hedge: Callable[[], Optional[Awaitable]],
+        tokens: int
+    ) -> tuple[int, Any]:
+        """
+        Run start_primary(), hedging with start_hedge() if it is slow.
+        Returns (0, result) if the primary wins, (1, result) if the hedge
+        does. start_hedge may return None when there is nowhere to hedge to.
+        """
+        if not self.enabled:
+            return 0, await start_primary()
+        self.budget_tokens = min(self.max_budget_tokens, self.budget_tokens + tokens * self.budget_ratio)
+        delay = self.delay(mode)
+        started = [time.perf_counter()]
+        tasks = [asyncio.ensure_future(start_primary())]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if not self._spend(tokens):
+                        self.skipped_count += 1
+                        hedge_outcomes.labels(mode, "skipped").inc()
+                    elif (hedge := start_hedge()) is not None:
+                        self.hedged_count += 1
+                        started.append(time.perf_counter())
+                        tasks.append(asyncio.ensure_future(hedge))
+                    else:
+                        # Nowhere to hedge to, give the tokens back
+                        self.budget_tokens += tokens
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    index = tasks.index(task)
+                    self.record(mode, time.perf_counter() - started[index])
+                    if len(tasks) > 1:
+                        self.won_count += index
+                        hedge_outcomes.labels(mode, "won" if index else "lost").inc()
+                    return index, task.result()
+            if len(tasks) > 1:
+                hedge_outcomes.labels(mode, "failed").inc()
+            raise error
+        finally:
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "delay_seconds": {mode: self.delay(mode) for mode in self._samples},
+            "budget_ratio": self.budget_ratio,
+            "budget_tokens": round(self.budget_tokens),
+            "hedged_count": self.hedged_count,
+            "won_count": self.won_count,
+            "skipped_count": self.skipped_count,
+            "win_ratio": round(self.won_count / self.hedged_count, 4) if self.hedged_count else 0.0
+        }
+
+# Global hedge policy for LLM calls
+llm_hedger = HedgePolicy()
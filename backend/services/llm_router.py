@@ -0,0 +1,193 @@
+import os
+import json
+import random
+import logging
+from typing import Optional
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+from .circuit_breaker import CircuitBreaker, Permit
+from .llm_governor import LLMGovernor, llm_governor
+from .metrics import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+backend_requests = metrics.counter(
+    "llm_backend_requests_total", "LLM calls per backend and outcome", ("backend", "outcome")
+)
+backend_latency = metrics.gauge(
+    "llm_backend_latency_ewma_seconds", "Smoothed LLM call latency the router ranks backends by", ("backend", "mode")
+)
+
+class LLMBackend:
+    """One OpenAI-compatible endpoint and model with its own breaker, governor and latency stats"""
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        governor: Optional[LLMGovernor] = None,
+        timeout: Optional[float] = None
+    ):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        # The retry policy owns retries, the SDK's own would multiply them and hide Retry-After
+        client_options = {"max_retries": int(os.getenv("LLM_CLIENT_MAX_RETRIES", "0"))}
+        if timeout:
+            client_options["timeout"] = timeout
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, **client_options) if api_key else None
+        self.breaker = CircuitBreaker(name=f"llm_{name}")
+        self.governor = governor or LLMGovernor()
+
+        # EWMA per mode: "complete" is the full response time, "stream" the time to first chunk
+        self.latency: dict[str, float] = {}
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "base_url": self.base_url,
+            "configured": self.client is not None,
+            "latency_ewma_seconds": {mode: round(value, 4) for mode, value in self.latency.items()},
+            "error_rate": round(self.error_rate, 4),
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit_breaker": self.breaker.get_state(),
+            "governor": self.governor.get_stats()
+        }
+
+def load_backends() -> list[LLMBackend]:
+    """
+    Backends from LLM_BACKENDS, a JSON list of objects with name, model,
+    base_url, api_key or api_key_env, and optional max_concurrency, max_rps,
+    max_tpm and timeout. Without it, a single backend from OPENAI_API_KEY.
+    """
+    raw = os.getenv("LLM_BACKENDS")
+    if not raw:
+        return [LLMBackend(
+            "openai",
+            "gpt-4o",
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            governor=llm_governor
+        )]
+
+    try:
+        configs = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"LLM_BACKENDS is not valid JSON: {e}") from e
+
+    backends = []
+    for index, config in enumerate(configs):
+        backends.append(LLMBackend(
+            config.get("name", f"backend{index}"),
+            config.get("model", "gpt-4o"),
+            api_key=config.get("api_key") or os.getenv(config.get("api_key_env", "OPENAI_API_KEY")),
+            base_url=config.get("base_url"),
+            # Quotas are per account, so every backend gets its own governor
+            governor=LLMGovernor(config.get("max_concurrency"), config.get("max_rps"), config.get("max_tpm")),
+            timeout=config.get("timeout")
+        ))
+    if not backends:
+        raise ValueError("LLM_BACKENDS must list at least one backend")
+    return backends
+
+class LLMRouter:
+    """
+    Routes LLM calls across several OpenAI-compatible backends.
+    Each request goes to the healthy backend with the lowest expected
+    latency: the EWMA of its recent calls, inflated by its error rate and by
+    the queue in front of its governor. Backends whose circuit breaker is
+    open, or whose half-open probes are all taken, are skipped, so a
+    failing backend drops out until its breaker lets probe requests
+    through. A small share of requests explores a random healthy backend
+    to keep the other estimates fresh.
+    """
+
+    def __init__(self, backends: Optional[list[LLMBackend]] = None, rng: Optional[random.Random] = None):
+        self.backends = backends or load_backends()
+        # Exploration draws from rng, so tests can seed it
+        self.rng = rng or random.Random()
+        self.alpha = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+        self.explore_ratio = float(os.getenv("LLM_ROUTER_EXPLORE_RATIO", "0.05"))
+        self.error_penalty = float(os.getenv("LLM_ROUTER_ERROR_PENALTY", "4"))
+
+        self.failover_count = 0
+        self.unavailable_count = 0
+        logger.info(f"LLM router backends: {', '.join(f'{b.name} ({b.model})' for b in self.backends)}")
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    def _score(self, backend: LLMBackend, mode: str) -> float:
+        latency = backend.latency.get(mode)
+        busy = backend.governor.waiting + backend.governor.in_flight
+        if latency is None:
+            # Unmeasured backends get one probe call at a time, in configuration order
+            return float("inf") if busy else 0.0
+        queued = backend.governor.waiting / max(1, backend.governor.max_concurrency)
+        return latency * (1 + self.error_penalty * backend.error_rate) * (1 + queued)
+
+    def select(self, mode: str, exclude: set = frozenset()) -> Optional[LLMBackend]:
+        """Pick the backend for the next call, or None if every breaker is open"""
+        candidates = [
+            backend for backend in self.backends
+            if backend.name not in exclude and backend.breaker.is_available()
+        ]
+        if not candidates:
+            if not exclude:
+                self.unavailable_count += 1
+            return None
+        if exclude:
+            self.failover_count += 1
+        return self._pick(candidates, mode)
+
+    def select_hedge(self, mode: str, primary: LLMBackend) -> Optional[LLMBackend]:
+        """Backend for a hedged duplicate of a call on primary: the best other one, else primary"""
+        candidates = [
+            backend for backend in self.backends
+            if backend is not primary and backend.breaker.is_available()
+        ] or [primary]
+        backend = self._pick(candidates, mode)
+        # A hedge that has to queue behind the governor would only add load
+        if backend.governor.waiting:
+            return None
+        return backend
+
+    def _pick(self, candidates: list[LLMBackend], mode: str) -> LLMBackend:
+        if len(candidates) > 1 and self.rng.random() < self.explore_ratio:
+            return self.rng.choice(candidates)
+        return min(candidates, key=lambda candidate: self._score(candidate, mode))
+
+    def record_success(self, backend: LLMBackend, mode: str, seconds: float, permit: Optional[Permit] = None):
+        previous = backend.latency.get(mode)
+        backend.latency[mode] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        backend.error_rate -= self.alpha * backend.error_rate
+        backend.requests += 1
+        backend.breaker.record_success(permit, seconds)
+        backend_requests.labels(backend.name, "success").inc()
+        backend_latency.labels(backend.name, mode).set(backend.latency[mode])
+
+    def record_failure(self, backend: LLMBackend, permit: Optional[Permit] = None, seconds: Optional[float] = None):
+        backend.error_rate += self.alpha * (1.0 - backend.error_rate)
+        backend.requests += 1
+        backend.failures += 1
+        backend.breaker.record_failure(permit, seconds)
+        backend_requests.labels(backend.name, "error").inc()
+
+    def get_stats(self) -> dict:
+        return {
+            "failover_count": self.failover_count,
+            "unavailable_count": self.unavailable_count,
+            "backends": [backend.get_stats() for backend in self.backends]
+        }
+
+# Global LLM router
+llm_router = LLMRouter()
@@ -1,39 +1,123 @@
 import os
+import time
+import asyncio
 import logging
-from openai import AsyncOpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from typing import AsyncIterator, Awaitable, Callable
 from dotenv import load_dotenv
-from .circuit_breaker import llm_circuit_breaker
+from .prompt_cache import make_cache_key, make_cache_namespace
+from .llm_router import LLMBackend, llm_router
+from .llm_hedging import llm_hedger
+from .retry_policy import classify, retry_policy
+from .metrics import metrics
+from .job_timing import job_timer
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+llm_request_seconds = metrics.histogram(
+    "llm_request_duration_seconds", "OpenAI call latency, excluding governor wait", ("mode", "outcome", "backend")
+)
+llm_first_chunk_seconds = metrics.histogram(
+    "llm_first_chunk_seconds", "Time from a streaming OpenAI call to its first code chunk", ("backend",)
+)
+llm_tokens = metrics.counter(
+    "llm_tokens_total", "Tokens reported in OpenAI usage", ("direction",)
+)
+
 class LLMServiceError(Exception):
     """Base exception for LLM service errors"""
-    pass
+    # None lets the retry policy judge by the underlying error
+    retryable = None
 
 class CircuitBreakerOpenError(LLMServiceError):
     """Raised when circuit breaker is open"""
-    pass
+    retryable = False
+
+class LLMConfigurationError(LLMServiceError):
+    """Raised when a backend cannot be called at all (no API key)"""
+    retryable = False
 
 class RateLimitError(LLMServiceError):
     """Raised when rate limit is exceeded"""
     pass
 
+def _pass_error(kept: Exception | None, error: Exception) -> Exception:
+    """Error to raise after a pass over the backends; a transient one wins so the pass is retried"""
+    if kept is None or not classify(kept).retryable:
+        return error
+    return kept
+
+class CodeFenceStripper:
+    """
+    Incrementally removes markdown code fences from a streamed response.
+    Holds back only the text that could still turn out to be a fence.
+    """
+    
+    FENCE = "```"
+    
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._fenced = False
+    
+    def feed(self, text: str) -> str:
+        """Add a chunk and return the text that is safe to emit"""
+        self._buffer += text
+        
+        if not self._started:
+            stripped = self._buffer.lstrip()
+            if self.FENCE.startswith(stripped):
+                return ""
+            if stripped.startswith(self.FENCE):
+                if "\n" not in stripped:
+                    return ""
+                # Drop the opening fence line (```jsx)
+                stripped = stripped.split("\n", 1)[1]
+                self._fenced = True
+            self._buffer = stripped
+            self._started = True
+        
+        body = self._buffer.rstrip()
+        newline = body.rfind("\n")
+        tail = body[newline + 1:].strip()
+        if self._fenced and self.FENCE.startswith(tail):
+            # Possible closing fence, keep it until more code follows
+            hold = max(newline, 0)
+        elif self._fenced:
+            # Trailing whitespace may still turn out to precede the closing fence
+            hold = len(body)
+        else:
+            hold = len(self._buffer)
+        out, self._buffer = self._buffer[:hold], self._buffer[hold:]
+        return out
+    
+    def finish(self) -> str:
+        """Flush whatever is left once the stream ends"""
+        rest, self._buffer = self._buffer, ""
+        if not self._started:
+            rest = rest.strip()
+            return "" if rest == self.FENCE else rest
+        if self._fenced and rest.strip() == self.FENCE:
+            return ""
+        return rest
+
 class LLMService:
     """
     Fault-tolerant LLM service with:
-    - Retry logic with exponential backoff
-    - Circuit breaker pattern
+    - Retries of transient failures, honoring Retry-After, within the job deadline
+    - Latency-aware routing and failover across backends
+    - Circuit breaker per backend
     - Secure API key handling
     """
     
     def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        if not any(backend.client for backend in llm_router.backends):
             logger.warning("No OPENAI_API_KEY found, LLM service will not work")
-        self.client = AsyncOpenAI(api_key=self.api_key) if self.api_key else None
-        self.model = "gpt-4o"
+        # Backends are interchangeable for caching, results are keyed by the primary model
+        self.model = llm_router.primary.model
+        self.temperature = 0.7
+        self.max_tokens = 2000
+        self.streaming_enabled = os.getenv("LLM_STREAMING", "true").lower() == "true"
     
     def _create_system_prompt(self) -> str:
         """Create system prompt for UI code generation"""
@@ -54,43 +138,107 @@ Rules:
 12. Keep components simple and self-contained
 13. DO NOT wrap code in markdown (no ```jsx or ``` blocks)"""
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-        retry=retry_if_exception_type(LLMServiceError),
-        reraise=True
-    )
+    def get_cache_key(self, prompt: str) -> str:
+        """Cache key covering the prompt and every setting that shapes the output"""
+        return make_cache_key(prompt, self.model, self.temperature, self._create_system_prompt())
+    
+    def get_cache_namespace(self) -> str:
+        """Hash of the settings that shape the output, without the prompt"""
+        return make_cache_namespace(self.model, self.temperature, self._create_system_prompt())
+    
+    def _build_messages(self, prompt: str) -> list[dict]:
+        """Build the chat messages for a generation request"""
+        return [
+            {"role": "system", "content": self._create_system_prompt()},
+            {"role": "user", "content": f"Create a React component with Tailwind CSS for: {prompt}"}
+        ]
+    
+    def _estimate_tokens(self, prompt: str) -> int:
+        """Rough upper bound for governor accounting (~4 chars per token)"""
+        return (len(self._create_system_prompt()) + len(prompt)) // 4 + self.max_tokens
+    
+    def _record_usage(self, usage):
+        if usage:
+            llm_tokens.labels("prompt").inc(usage.prompt_tokens)
+            llm_tokens.labels("completion").inc(usage.completion_tokens)
+    
     async def generate_ui_code(self, prompt: str, request_id: str) -> dict:
         """
         Generate React UI code from natural language prompt.
+        A failed call fails over to the next healthy backend right away;
+        the retry policy only backs off once every backend has failed.
+        Slow calls are hedged when LLM_HEDGING is on.
         """
+        return await retry_policy.run(lambda: self._generate_once(prompt, request_id), request_id)
+    
+    async def _generate_once(self, prompt: str, request_id: str) -> dict:
+        """One pass over the healthy backends"""
         logger.info(f"[{request_id}] Generating UI code for prompt")
         
-        # Check circuit breaker
-        if not llm_circuit_breaker.can_execute():
-            logger.error(f"[{request_id}] Circuit breaker is OPEN, rejecting request")
-            raise CircuitBreakerOpenError(
-                "LLM service is temporarily unavailable. Please try again later."
-            )
+        def generate(target: LLMBackend):
+            return self._generate_with(target, prompt, request_id)
         
+        tried = set()
+        error = None
+        while (backend := llm_router.select("complete", exclude=tried)) is not None:
+            tried.add(backend.name)
+            try:
+                _, result = await llm_hedger.race(
+                    "complete",
+                    lambda: generate(backend),
+                    lambda: self._hedge("complete", backend, tried, generate),
+                    self._estimate_tokens(prompt)
+                )
+                return result
+            except LLMServiceError as e:
+                error = _pass_error(error, e)
+        
+        if error is not None:
+            raise error
+        job_timer().start_attempt("complete").end("circuit_open")
+        logger.error(f"[{request_id}] Circuit breakers of all LLM backends are OPEN, rejecting request")
+        raise CircuitBreakerOpenError(
+            "LLM service is temporarily unavailable. Please try again later."
+        )
+    
+    def _hedge(self, mode: str, primary: LLMBackend, tried: set, start: Callable[[LLMBackend], Awaitable]):
+        """Start a duplicate of a slow call on primary, or None if there is nowhere to send it"""
+        target = llm_router.select_hedge(mode, primary)
+        if target is None:
+            return None
+        tried.add(target.name)
+        logger.info(f"Hedging slow {mode} call on {primary.name} with {target.name}")
+        return start(target)
+    
+    async def _generate_with(self, backend: LLMBackend, prompt: str, request_id: str) -> dict:
+        """One completion call against a single backend"""
+        permit = backend.breaker.acquire()
+        if permit is None:
+            raise CircuitBreakerOpenError(f"Circuit breaker of {backend.name} is open")
+        attempt = job_timer().start_attempt("complete", backend.name)
+        started = None
         try:
-            if not self.client:
-                raise LLMServiceError("OpenAI API key not configured")
+            if not backend.client:
+                raise LLMConfigurationError("OpenAI API key not configured")
             
-            logger.info(f"[{request_id}] Calling OpenAI API")
+            logger.info(f"[{request_id}] Calling {backend.name} ({backend.model})")
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self._create_system_prompt()},
-                    {"role": "user", "content": f"Create a React component with Tailwind CSS for: {prompt}"}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
+            async with backend.governor.slot(self._estimate_tokens(prompt)) as reservation:
+                started = time.perf_counter()
+                attempt.mark("call")
+                response = await backend.client.chat.completions.create(
+                    model=backend.model,
+                    messages=self._build_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
+                elapsed = time.perf_counter() - started
+                llm_request_seconds.labels("complete", "success", backend.name).observe(elapsed)
+                reservation.record_usage(response.usage.total_tokens if response.usage else None)
+                self._record_usage(response.usage)
             
-            # Record success in circuit breaker
-            llm_circuit_breaker.record_success()
+            # Feeds the backend's latency estimate and circuit breaker
+            llm_router.record_success(backend, "complete", elapsed, permit)
             
             code = response.choices[0].message.content.strip()
             
@@ -103,24 +251,160 @@ Rules:
                 code = "\n".join(lines)
             
             logger.info(f"[{request_id}] Successfully generated UI code")
+            attempt.end("success")
             
             return {
                 "code": code.strip(),
                 "explanation": f"Generated React component based on: {prompt}"
             }
         
+        except asyncio.CancelledError:
+            # Lost a hedged race, not a backend failure
+            backend.breaker.release(permit)
+            attempt.end("cancelled")
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started if started is not None else None
+            if elapsed is not None:
+                llm_request_seconds.labels("complete", "error", backend.name).observe(elapsed)
+            attempt.end("error", e)
+            llm_router.record_failure(backend, permit, elapsed)
+            logger.error(f"[{request_id}] {backend.name} call failed: {type(e).__name__}: {e}")
+            raise LLMServiceError(f"Failed to generate UI code: {str(e)}") from e
+    
+    async def stream_ui_code(self, prompt: str, request_id: str) -> AsyncIterator[str]:
+        """
+        Stream React UI code chunks as the model produces them.
+        Markdown fences are stripped on the fly. A backend that fails before
+        its first chunk is failed over, and a slow first chunk is hedged;
+        the stream is not retried after that, callers fall back to
+        generate_ui_code instead.
+        """
+        logger.info(f"[{request_id}] Streaming UI code for prompt")
+        
+        tried = set()
+        error = None
+        while (backend := llm_router.select("stream", exclude=tried)) is not None:
+            tried.add(backend.name)
+            streams = []
+            winner = None
+            
+            def first_chunk(target: LLMBackend):
+                stream = self._stream_from(target, prompt, request_id)
+                streams.append(stream)
+                return anext(stream, None)
+            
+            try:
+                # Only the wait for the first chunk is hedged, then the winner is streamed
+                winner, text = await llm_hedger.race(
+                    "stream",
+                    lambda: first_chunk(backend),
+                    lambda: self._hedge("stream", backend, tried, first_chunk),
+                    self._estimate_tokens(prompt)
+                )
+            except LLMServiceError as e:
+                error = _pass_error(error, e)
+                continue
+            finally:
+                for index, stream in enumerate(streams):
+                    if index != winner:
+                        await stream.aclose()
+            
+            if text is None:
+                return
+            yield text
+            async for text in streams[winner]:
+                yield text
+            return
+        
+        if error is not None:
+            raise error
+        job_timer().start_attempt("stream").end("circuit_open")
+        logger.error(f"[{request_id}] Circuit breakers of all LLM backends are OPEN, rejecting request")
+        raise CircuitBreakerOpenError(
+            "LLM service is temporarily unavailable. Please try again later."
+        )
+    
+    async def _stream_from(self, backend: LLMBackend, prompt: str, request_id: str) -> AsyncIterator[str]:
+        """One streaming call against a single backend"""
+        permit = backend.breaker.acquire()
+        if permit is None:
+            raise CircuitBreakerOpenError(f"Circuit breaker of {backend.name} is open")
+        attempt = job_timer().start_attempt("stream", backend.name)
+        started = None
+        try:
+            if not backend.client:
+                raise LLMConfigurationError("OpenAI API key not configured")
+            
+            logger.info(f"[{request_id}] Calling {backend.name} ({backend.model}, streaming)")
+            
+            async with backend.governor.slot(self._estimate_tokens(prompt)) as reservation:
+                started = time.perf_counter()
+                attempt.mark("call")
+                first_chunk_seconds = None
+                stream = await backend.client.chat.completions.create(
+                    model=backend.model,
+                    messages=self._build_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                
+                stripper = CodeFenceStripper()
+                async for event in stream:
+                    if event.usage:
+                        reservation.record_usage(event.usage.total_tokens)
+                        self._record_usage(event.usage)
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        text = stripper.feed(delta)
+                        if text:
+                            if first_chunk_seconds is None:
+                                first_chunk_seconds = time.perf_counter() - started
+                                llm_first_chunk_seconds.labels(backend.name).observe(first_chunk_seconds)
+                                attempt.mark("first_chunk")
+                            yield text
+                
+                text = stripper.finish()
+                if text:
+                    yield text
+                llm_request_seconds.labels("stream", "success", backend.name).observe(time.perf_counter() - started)
+            
+            # Streams are ranked by time to first chunk, which the user waits on
+            llm_router.record_success(
+                backend,
+                "stream",
+                first_chunk_seconds if first_chunk_seconds is not None else time.perf_counter() - started,
+                permit
+            )
+            attempt.end("success")
+            logger.info(f"[{request_id}] Successfully streamed UI code")
+        
+        except (asyncio.CancelledError, GeneratorExit):
+            # Lost a hedged race or closed by the consumer, not a backend failure
+            backend.breaker.release(permit)
+            attempt.end("cancelled")
+            raise
         except Exception as e:
-            # Record failure in circuit breaker
-            llm_circuit_breaker.record_failure()
-            logger.error(f"[{request_id}] OpenAI API call failed: {type(e).__name__}: {e}")
+            elapsed = time.perf_counter() - started if started is not None else None
+            if elapsed is not None:
+                llm_request_seconds.labels("stream", "error", backend.name).observe(elapsed)
+            attempt.end("error", e)
+            llm_router.record_failure(backend, permit, elapsed)
+            logger.error(f"[{request_id}] {backend.name} streaming call failed: {type(e).__name__}: {e}")
             raise LLMServiceError(f"Failed to generate UI code: {str(e)}") from e
     
     def get_health_status(self) -> dict:
-        """Get health status including circuit breaker state"""
+        """Get health status including backend and circuit breaker states"""
         return {
             "service": "llm",
-            "circuit_breaker": llm_circuit_breaker.get_state(),
-            "api_key_configured": bool(self.api_key)
+            "router": llm_router.get_stats(),
+            "hedging": llm_hedger.get_stats(),
+            "retry": retry_policy.get_stats(),
+            "api_key_configured": any(backend.client for backend in llm_router.backends)
         }
 
 # Global LLM service instance
@@ -0,0 +1,157 @@
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+# Seconds; covers sub-millisecond cache hits up to minute-long generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        # Buckets are stored non-cumulative and summed up at scrape time
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Metric:
+    """A named metric family; labels(...) returns the child for one label set"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: tuple, child_factory: Callable):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._child_factory = child_factory
+        self._children: dict[tuple, object] = {}
+        self._lookup: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            key = tuple(str(value) for value in values)
+            with self._lock:
+                child = self._children.setdefault(key, self._child_factory())
+                # Also cache under the raw values so repeat lookups skip str()
+                self._lookup[values] = child
+        return child
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(child.buckets + (float("inf"),), child.counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus registry.
+    Recording is a dict lookup plus a locked add (PyMongo listeners call in
+    from executor threads), so a labelled observation costs about half a
+    microsecond. Collectors run at scrape time to refresh gauges that
+    mirror state owned by other services.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register(Metric("counter", name, documentation, labelnames, _CounterChild))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register(Metric("gauge", name, documentation, labelnames, _GaugeChild))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Metric:
+        buckets = tuple(sorted(buckets))
+        return self._register(Metric("histogram", name, documentation, labelnames, lambda: _HistogramChild(buckets)))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that updates gauges right before each scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase and collapse whitespace so trivial variations share a key"""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+def make_cache_namespace(model: str, temperature: float, system_prompt: str) -> str:
+    """Hash the generation settings that influence the generated code"""
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([model, repr(temperature), system_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def make_cache_key(prompt: str, model: str, temperature: float, system_prompt: str) -> str:
+    """Hash the normalized prompt together with the generation settings"""
+    raw = "\x1f".join([normalize_prompt(prompt), make_cache_namespace(model, temperature, system_prompt)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class PromptCache:
+    """
+    Two-tier exact-match cache for generation results.
+    An in-memory LRU with TTL sits in front of a MongoDB tier stored in the
+    prompts collection, so results survive restarts and are shared across
+    workers.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None
+    ):
+        self.enabled = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = max_entries or int(os.getenv("PROMPT_CACHE_SIZE", "1000"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "86400"))
+
+        self.collection = None
+        self.entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    async def connect(self, collection):
+        """Attach the MongoDB tier"""
+        self.collection = collection
+        logger.info(
+            f"Prompt cache initialized (enabled: {self.enabled}, "
+            f"size: {self.max_entries}, ttl: {self.ttl_seconds}s)"
+        )
+
+    async def close(self):
+        """Clean up"""
+        self.entries.clear()
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: dict, ttl_seconds: float):
+        self.entries[key] = (time.monotonic() + ttl_seconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Look up a cached result, promoting MongoDB hits into memory"""
+        if not self.enabled:
+            return None
+
+        value = self._get_local(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        if self.collection is not None:
+            try:
+                now = datetime.now(timezone.utc)
+                doc = await self.collection.find_one(
+                    {"cache_key": key, "expires_at": {"$gt": now}},
+                    {"_id": 0, "code": 1, "explanation": 1, "expires_at": 1}
+                )
+            except Exception as e:
+                logger.error(f"Prompt cache lookup failed: {e}")
+                doc = None
+            if doc:
+                self.mongo_hits += 1
+                value = {"code": doc["code"], "explanation": doc["explanation"]}
+                expires_at = doc["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                self._set_local(key, value, (expires_at - now).total_seconds())
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict):
+        """Store a successful generation result in both tiers"""
+        if not self.enabled:
+            return
+
+        value = {"code": value["code"], "explanation": value["explanation"]}
+        self._set_local(key, value, self.ttl_seconds)
+
+        if self.collection is not None:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.collection.update_one(
+                    {"cache_key": key},
+                    {"$set": {
+                        **value,
+                        "created_at": now,
+                        "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Prompt cache write failed: {e}")
+
+    def get_stats(self) -> dict:
+        """Get cache hit/miss counters"""
+        hits = self.memory_hits + self.mongo_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+# Global prompt cache instance
+prompt_cache = PromptCache()
@@ -1,32 +1,64 @@
+import asyncio
+import math
 import time
 import os
+import uuid
+from abc import ABC, abstractmethod
 from typing import Optional
 from dotenv import load_dotenv
 import logging
 from collections import defaultdict
+from .metrics import metrics
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is only needed when REDIS_URL is configured
+    aioredis = None
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-class RateLimiter:
+rate_limit_rejections = metrics.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter"
+)
+
+class RateLimitBackend(ABC):
+    """Storage backend for rate limiting"""
+
+    name = "base"
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def size(self) -> int:
+        """Number of identifiers currently tracked"""
+        return 0
+
+    @abstractmethod
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> tuple[bool, int]:
+        """Record a request if allowed; returns (is_allowed, remaining)"""
+
+class SlidingWindowBackend(RateLimitBackend):
     """
-    In-memory rate limiter using sliding window algorithm.
-    Falls back gracefully if Redis is unavailable.
+    Per-process sliding window over a list of request timestamps.
+    Memory grows with request volume and idle identifiers are never
+    evicted; kept for comparison with GCRABackend.
     """
-    
+
+    name = "sliding_window"
+
     def __init__(self):
-        self.max_requests_per_minute = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "10"))
         self.requests: dict = defaultdict(list)
-    
-    async def connect(self):
-        """Initialize rate limiter"""
-        logger.info("Rate limiter initialized (in-memory mode)")
-    
+
     async def close(self):
-        """Clean up"""
         self.requests.clear()
-        logger.info("Rate limiter closed")
-    
+
+    def size(self) -> int:
+        return len(self.requests)
+
     def _clean_old_requests(self, identifier: str, window_seconds: int):
         """Remove requests outside the current window"""
         current_time = time.time()
@@ -34,42 +66,243 @@ class RateLimiter:
         self.requests[identifier] = [
             ts for ts in self.requests[identifier] if ts > window_start
         ]
-    
-    async def check_rate_limit(
-        self,
-        identifier: str,
-        max_requests: Optional[int] = None,
-        window_seconds: int = 60
-    ) -> tuple[bool, int]:
-        """
-        Check if request is within rate limit.
-        """
-        max_requests = max_requests or self.max_requests_per_minute
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> tuple[bool, int]:
         current_time = time.time()
-        
+
         # Clean old requests
         self._clean_old_requests(identifier, window_seconds)
-        
+
         request_count = len(self.requests[identifier])
-        
+
         if request_count >= max_requests:
             return False, 0
-        
+
         # Add current request
         self.requests[identifier].append(current_time)
-        
+
         remaining = max_requests - request_count - 1
         return True, remaining
-    
-    async def check_outbound_rate_limit(self, service: str = "llm") -> bool:
+
+class _GCRAState:
+    __slots__ = ("tat",)
+
+    def __init__(self, tat: float):
+        # Theoretical arrival time of the next request at the steady rate
+        self.tat = tat
+
+class GCRABackend(RateLimitBackend):
+    """
+    Per-process Generic Cell Rate Algorithm limiter.
+    Keeps a single timestamp per identifier, allows bursts of up to
+    max_requests and refills at max_requests per window. Identifiers whose
+    allowance is fully replenished carry no information and are evicted by a
+    background sweeper.
+    """
+
+    name = "gcra"
+
+    def __init__(self, sweep_interval_seconds: Optional[float] = None):
+        self.sweep_interval_seconds = sweep_interval_seconds or float(
+            os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60")
+        )
+        self.states: dict[str, _GCRAState] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.evicted_count = 0
+
+    async def connect(self):
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        self.states.clear()
+
+    def size(self) -> int:
+        return len(self.states)
+
+    def sweep(self) -> int:
+        """Evict identifiers that are back to a full allowance"""
+        now = time.monotonic()
+        idle = [key for key, state in self.states.items() if state.tat <= now]
+        for key in idle:
+            del self.states[key]
+        self.evicted_count += len(idle)
+        return len(idle)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            evicted = self.sweep()
+            if evicted:
+                logger.debug(f"Rate limiter evicted {evicted} idle identifiers")
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> tuple[bool, int]:
+        now = time.monotonic()
+        interval = window_seconds / max_requests
+
+        state = self.states.get(identifier)
+        tat = state.tat if state is not None and state.tat > now else now
+        new_tat = tat + interval
+
+        if new_tat - now > window_seconds:
+            return False, 0
+
+        if state is None:
+            self.states[identifier] = _GCRAState(new_tat)
+        else:
+            state.tat = new_tat
+
+        remaining = math.floor((window_seconds - (new_tat - now)) / interval + 1e-9)
+        return True, remaining
+
+# Atomic sliding window over a sorted set of request timestamps (ms).
+# Uses the Redis server clock so all app hosts agree on the window.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count >= limit then
+    return {0, 0}
+end
+redis.call('ZADD', key, now, member)
+redis.call('PEXPIRE', key, window)
+return {1, limit - count - 1}
+"""
+
+class RedisBackend(RateLimitBackend):
+    """
+    Shared sliding window in Redis.
+    Every check is a single EVALSHA round trip on a pooled connection, so
+    the limit holds across all worker processes and hosts.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.key_prefix = os.getenv("RATE_LIMIT_KEY_PREFIX", "ratelimit:")
+        self.max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+        self.socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.05"))
+        self.client = None
+        self._script = None
+
+    async def connect(self):
+        pool = aioredis.ConnectionPool.from_url(
+            self.url,
+            max_connections=self.max_connections,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.socket_timeout
+        )
+        self.client = aioredis.Redis(connection_pool=pool)
+        self._script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+        await self.client.ping()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def hit(self, identifier: str, max_requests: int, window_seconds: int) -> tuple[bool, int]:
+        allowed, remaining = await self._script(
+            keys=[f"{self.key_prefix}{identifier}"],
+            args=[window_seconds * 1000, max_requests, uuid.uuid4().hex]
+        )
+        return bool(allowed), int(remaining)
+
+class RateLimiter:
+    """
+    Rate limiter with a constant-memory GCRA engine per process.
+    Uses a shared Redis sliding window when REDIS_URL is configured, so limits are shared across
+    worker processes; falls back to in-memory limiting if Redis is
+    unavailable and retries Redis after REDIS_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self.max_requests_per_minute = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "10"))
+        self.redis_url = os.getenv("REDIS_URL")
+        self.redis_retry_seconds = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+
+        algorithm = os.getenv("RATE_LIMIT_ALGORITHM", "gcra")
+        self.local_backend: RateLimitBackend = (
+            SlidingWindowBackend() if algorithm == "sliding_window" else GCRABackend()
+        )
+        self.shared_backend: Optional[RedisBackend] = None
+        self._shared_down_until = 0.0
+        self.fallback_count = 0
+
+    async def connect(self):
+        """Initialize rate limiter"""
+        await self.local_backend.connect()
+        if self.redis_url and aioredis is None:
+            logger.warning("REDIS_URL is set but redis is not installed, using in-memory mode")
+        elif self.redis_url:
+            self.shared_backend = RedisBackend(self.redis_url)
+            try:
+                await self.shared_backend.connect()
+                logger.info("Rate limiter initialized (redis mode)")
+                return
+            except Exception as e:
+                logger.warning(f"Redis unavailable, falling back to in-memory rate limiting: {e}")
+                self._mark_shared_down()
+                return
+        logger.info(f"Rate limiter initialized (in-memory {self.local_backend.name} mode)")
+
+    async def close(self):
+        """Clean up"""
+        if self.shared_backend is not None:
+            await self.shared_backend.close()
+        await self.local_backend.close()
+        logger.info("Rate limiter closed")
+
+    def _mark_shared_down(self):
+        self._shared_down_until = time.monotonic() + self.redis_retry_seconds
+
+    @property
+    def mode(self) -> str:
+        if self.shared_backend is not None and time.monotonic() >= self._shared_down_until:
+            return self.shared_backend.name
+        return self.local_backend.name
+
+    async def check_rate_limit(
+        self,
+        identifier: str,
+        max_requests: Optional[int] = None,
+        window_seconds: int = 60
+    ) -> tuple[bool, int]:
         """
-        Check rate limit for outbound API calls.
+        Check if request is within rate limit.
         """
-        is_allowed, _ = await self.check_rate_limit(
-            f"outbound:{service}",
-            max_requests=5,
-            window_seconds=1
-        )
-        return is_allowed
+        max_requests = max_requests or self.max_requests_per_minute
+
+        result = None
+        if self.shared_backend is not None and time.monotonic() >= self._shared_down_until:
+            try:
+                result = await self.shared_backend.hit(identifier, max_requests, window_seconds)
+            except Exception as e:
+                logger.warning(f"Redis rate limit check failed, using in-memory fallback: {e}")
+                self._mark_shared_down()
+                self.fallback_count += 1
+
+        if result is None:
+            result = await self.local_backend.hit(identifier, max_requests, window_seconds)
+        if not result[0]:
+            rate_limit_rejections.inc()
+        return result
+
+    def get_stats(self) -> dict:
+        """Get current backend state"""
+        return {
+            "mode": self.mode,
+            "fallback_count": self.fallback_count,
+            "local_identifiers": self.local_backend.size()
+        }
 
 rate_limiter = RateLimiter()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import ReplaceOne
+from .code_compression import code_compressor
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+def archive_document(doc: dict) -> dict:
+    """Convert a hot generation document into its compressed archive form"""
+    archived = dict(doc)
+    code = archived.pop("generated_code", None)
+    if code is not None:
+        archived["generated_code_z"] = code_compressor.compress(code)
+    archived["archived_at"] = datetime.now(timezone.utc)
+    return archived
+
+class RetentionManager:
+    """
+    Moves finished generations older than RETENTION_DAYS from the hot
+    collection into a compressed archive collection, keeping the working
+    set small. Reads fall through to the archive on a miss.
+    """
+
+    def __init__(
+        self,
+        retention_days: Optional[int] = None,
+        interval_seconds: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        if retention_days is None:
+            retention_days = int(os.getenv("RETENTION_DAYS", "30"))
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds or int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+        self.batch_size = batch_size or int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+
+        self.collection = None
+        self.archive = None
+        self._task: Optional[asyncio.Task] = None
+        self.archived_count = 0
+        self.last_run: Optional[datetime] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    async def start(self, collection, archive):
+        """Start the periodic archival job"""
+        self.collection = collection
+        self.archive = archive
+        if self.enabled:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Retention started (archiving generations older than {self.retention_days} days)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> int:
+        """Archive every finished generation past the retention period"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        moved = 0
+        while True:
+            docs = await self.collection.find(
+                {"created_at": {"$lt": cutoff}, "status": {"$in": ["success", "failed"]}},
+                {"_id": 0}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+
+            # Upsert first so a crash between the two steps never loses data
+            await self.archive.bulk_write(
+                [ReplaceOne({"job_id": doc["job_id"]}, archive_document(doc), upsert=True) for doc in docs],
+                ordered=False
+            )
+            result = await self.collection.delete_many({"job_id": {"$in": [doc["job_id"] for doc in docs]}})
+            moved += result.deleted_count
+            if len(docs) < self.batch_size:
+                break
+
+        self.archived_count += moved
+        self.last_run = datetime.now(timezone.utc)
+        if moved:
+            logger.info(f"Archived {moved} generations")
+        return moved
+
+    async def find_archived(self, job_id: str) -> Optional[dict]:
+        """Look up a single generation in the archive"""
+        if self.archive is None:
+            return None
+        doc = await self.archive.find_one({"job_id": job_id}, {"_id": 0})
+        return await code_compressor.restore(doc) if doc else None
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "retention_days": self.retention_days,
+            "archived_count": self.archived_count,
+            "last_run": self.last_run.isoformat() if self.last_run else None
+        }
+
+# Global retention manager instance
+retention_manager = RetentionManager()
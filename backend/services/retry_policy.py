@@ -0,0 +1,241 @@
+import asyncio
+import os
+import re
+import time
+import random
+import logging
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, NamedTuple, Optional, TypeVar
+from dotenv import load_dotenv
+import openai
+from .metrics import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+retry_decisions = metrics.counter(
+    "llm_retry_decisions_total",
+    "What the retry policy did after a failed LLM call (retried, not_retryable, exhausted, over_budget, deadline)",
+    ("decision",)
+)
+
+# Monotonic time by which the current job has to finish, set by the job queue worker
+current_job_deadline: ContextVar[Optional[float]] = ContextVar("current_job_deadline", default=None)
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a job runs out of its deadline budget"""
+    retryable = False
+
+class Decision(NamedTuple):
+    retryable: bool
+    reason: str
+    # Seconds the server asked us to wait (Retry-After and friends)
+    retry_after: Optional[float] = None
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def _parse_duration(value: str) -> Optional[float]:
+    """OpenAI reset durations such as "20ms", "1s" or "6m0s"""
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value.strip():
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After as delta seconds or an HTTP date"""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_from_headers(headers) -> Optional[float]:
+    """
+    Seconds to wait according to a rate-limited response: retry-after-ms,
+    then Retry-After, then the x-ratelimit-reset-* of whichever limit is
+    used up.
+    """
+    if headers is None:
+        return None
+    if (value := headers.get("retry-after-ms")) is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    if (value := headers.get("retry-after")) is not None:
+        if (seconds := _parse_retry_after(value)) is not None:
+            return seconds
+    resets = []
+    for limit in ("requests", "tokens"):
+        reset = headers.get(f"x-ratelimit-reset-{limit}")
+        if reset is None or headers.get(f"x-ratelimit-remaining-{limit}", "0") != "0":
+            continue
+        if (seconds := _parse_duration(reset)) is not None:
+            resets.append(seconds)
+    if (reset := headers.get("x-ratelimit-reset")) is not None:
+        seconds = _parse_duration(reset)
+        if seconds is None:
+            seconds = _parse_retry_after(reset)
+        if seconds is not None:
+            resets.append(seconds)
+    return max(resets) if resets else None
+
+def classify(error: BaseException) -> Decision:
+    """
+    Whether an LLM call failure is worth retrying. Walks the exception
+    chain, so an LLMServiceError wrapping an OpenAI error is judged by the
+    OpenAI error. Errors can decide for themselves with a retryable
+    attribute; anything unknown is retried.
+    """
+    seen = 0
+    while error is not None and seen < 10:
+        retryable = getattr(error, "retryable", None)
+        if retryable is not None:
+            return Decision(retryable, type(error).__name__)
+        if isinstance(error, openai.APIStatusError):
+            status = error.status_code
+            if status == 429:
+                if getattr(error, "code", None) == "insufficient_quota":
+                    return Decision(False, "insufficient_quota")
+                return Decision(True, "rate_limited", retry_after_from_headers(error.response.headers))
+            if status in (408, 409) or status >= 500:
+                return Decision(True, f"http_{status}", retry_after_from_headers(error.response.headers))
+            # 400, 401, 403, 404, 422: the same request will fail again
+            return Decision(False, f"http_{status}")
+        if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+            return Decision(True, type(error).__name__)
+        error = error.__cause__ or error.__context__
+        seen += 1
+    return Decision(True, "unknown")
+
+class RetryPolicy:
+    """
+    Retries LLM calls that can still succeed.
+    Failures are classified first: bad requests, missing keys and open
+    circuit breakers are raised straight away. Otherwise the wait is the
+    server's Retry-After (or rate-limit reset) if it sent one, else
+    exponential backoff with full jitter. The job deadline caps the whole
+    thing: every attempt is cut off when it runs out, and a wait that
+    would end past it is not taken, so a worker never sleeps towards a
+    retry it has no time for.
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay_seconds: Optional[float] = None,
+        max_delay_seconds: Optional[float] = None
+    ):
+        self.max_attempts = max_attempts or int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+        self.base_delay_seconds = base_delay_seconds or float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "1"))
+        self.max_delay_seconds = max_delay_seconds or float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "10"))
+        # Longest server-requested wait we are willing to sleep through
+        self.max_retry_after_seconds = float(os.getenv("LLM_RETRY_MAX_RETRY_AFTER_SECONDS", "30"))
+        # Below JOB_STALE_AFTER_SECONDS, so a job gives up before it is requeued as orphaned
+        self.job_deadline_seconds = float(os.getenv("LLM_JOB_DEADLINE_SECONDS", "240"))
+
+        self.retried_count = 0
+        self.not_retryable_count = 0
+        self.exhausted_count = 0
+        self.over_budget_count = 0
+        self.deadline_count = 0
+
+    def start_deadline(self):
+        """Give the current context (one job) its deadline budget; returns a token for reset_deadline"""
+        return current_job_deadline.set(time.monotonic() + self.job_deadline_seconds)
+
+    def reset_deadline(self, token):
+        current_job_deadline.reset(token)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left of the current job's deadline, None outside a job"""
+        deadline = current_job_deadline.get()
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def backoff(self, attempt: int, decision: Decision) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the server asks for too long"""
+        if decision.retry_after is not None:
+            if decision.retry_after > self.max_retry_after_seconds:
+                return None
+            # A little jitter so workers told the same reset time don't retry in lockstep
+            return decision.retry_after + random.uniform(0, min(1.0, 0.1 * decision.retry_after))
+        return random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1)))
+
+    def retry_delay(self, decision: Decision, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after attempt, or None if the wait does not fit the budget"""
+        delay = self.backoff(attempt, decision)
+        remaining = self.remaining()
+        if delay is None or (remaining is not None and delay >= remaining):
+            return None
+        return delay
+
+    def deadline_exceeded(self) -> DeadlineExceededError:
+        """Count a job that ran out of time and build its error"""
+        self.deadline_count += 1
+        retry_decisions.labels("deadline").inc()
+        return DeadlineExceededError(f"Job deadline of {self.job_deadline_seconds:g}s exceeded")
+
+    async def run(self, call: Callable[[], Awaitable[T]], request_id: str) -> T:
+        """Run call(), retrying failures the policy considers transient"""
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.expired():
+                raise self.deadline_exceeded()
+            try:
+                async with asyncio.timeout(self.remaining()):
+                    return await call()
+            except Exception as e:
+                if self.expired():
+                    raise self.deadline_exceeded() from e
+                error = e
+
+            decision = classify(error)
+            if not decision.retryable:
+                self.not_retryable_count += 1
+                retry_decisions.labels("not_retryable").inc()
+                logger.warning(f"[{request_id}] Not retrying {decision.reason}: {error}")
+                raise error
+            if attempt >= self.max_attempts:
+                self.exhausted_count += 1
+                retry_decisions.labels("exhausted").inc()
+                raise error
+
+            delay = self.retry_delay(decision, attempt)
+            if delay is None:
+                self.over_budget_count += 1
+                retry_decisions.labels("over_budget").inc()
+                logger.warning(f"[{request_id}] Not retrying {decision.reason}, the wait exceeds the budget")
+                raise error
+
+            self.retried_count += 1
+            retry_decisions.labels("retried").inc()
+            logger.info(f"[{request_id}] Retrying after {decision.reason} in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "job_deadline_seconds": self.job_deadline_seconds,
+            "retried_count": self.retried_count,
+            "not_retryable_count": self.not_retryable_count,
+            "exhausted_count": self.exhausted_count,
+            "over_budget_count": self.over_budget_count,
+            "deadline_count": self.deadline_count
+        }
+
+# Global retry policy for LLM calls
+retry_policy = RetryPolicy()
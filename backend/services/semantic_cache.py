@@ -0,0 +1,212 @@
+import os
+import re
+import zlib
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional, Protocol
+from dotenv import load_dotenv
+from .prompt_cache import normalize_prompt
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed when the semantic cache is enabled
+    np = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+class Embedder(Protocol):
+    dim: int
+
+    def embed(self, text: str) -> "np.ndarray":
+        ...
+
+class HashingEmbedder:
+    """
+    Deterministic hashed n-gram vectorizer.
+    Word unigrams, word bigrams and character trigrams are hashed into a
+    fixed number of buckets and L2-normalized. Runs offline with no model.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"[a-z0-9]+", text)
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        # Character trigrams across word boundaries, so "sign up" ~ "signup"
+        joined = "".join(words)
+        features += [f"c:{joined[i:i + 3]}" for i in range(len(joined) - 2)]
+        return features
+
+    def embed(self, text: str) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(normalize_prompt(text)):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Use one hash bit as the sign to reduce collision bias
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class SentenceTransformerEmbedder:
+    """Local CPU embedding model (requires sentence-transformers)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> "np.ndarray":
+        vector = self.model.encode(normalize_prompt(text), normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+class VectorIndex:
+    """
+    Brute-force cosine index over a preallocated NumPy matrix.
+    Vectors are unit length, so a single matrix-vector product gives the
+    similarity to every entry. Full indexes overwrite the oldest slot.
+    """
+
+    def __init__(self, dim: int, capacity: int):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.values: list[Optional[dict]] = [None] * capacity
+        self.capacity = capacity
+        self.size = 0
+        self._next = 0
+
+    def add(self, vector: "np.ndarray", value: dict):
+        self.matrix[self._next] = vector
+        self.values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def search(self, vector: "np.ndarray") -> tuple[float, Optional[dict]]:
+        """Return the best similarity and its value"""
+        if self.size == 0:
+            return 0.0, None
+        scores = self.matrix[:self.size] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.values[best]
+
+class SemanticCache:
+    """
+    Near-duplicate prompt cache.
+    Serves a previous generation when a new prompt's embedding is close
+    enough (cosine similarity >= threshold) to one already answered.
+    Entries are grouped by namespace (model + settings) so a result is only
+    reused under the same generation settings. Embedding and search run in
+    a worker thread, so a model encode never blocks the event loop.
+    """
+
+    TUNING_THRESHOLDS = (0.80, 0.85, 0.90, 0.95)
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        embedder: Optional[Embedder] = None
+    ):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_SIZE", "5000"))
+
+        if np is None:
+            if self.enabled:
+                logger.warning("numpy is not installed, semantic cache disabled")
+            self.enabled = False
+
+        self.embedder = embedder
+        self.indexes: dict[str, VectorIndex] = {}
+        # Searches and adds run in threads and must not see a half-written slot
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recent_scores: deque = deque(maxlen=1000)
+
+    def _get_embedder(self) -> Embedder:
+        if self.embedder is None:
+            model_name = os.getenv("SEMANTIC_CACHE_MODEL")
+            if model_name:
+                self.embedder = SentenceTransformerEmbedder(model_name)
+            else:
+                self.embedder = HashingEmbedder(int(os.getenv("SEMANTIC_CACHE_DIM", "512")))
+        return self.embedder
+
+    async def start(self):
+        """Load the embedding model up front instead of inside the first request"""
+        if self.enabled:
+            embedder = await asyncio.to_thread(self._get_embedder)
+            logger.info(f"Semantic cache initialized ({type(embedder).__name__}, dim {embedder.dim})")
+
+    def _search(self, prompt: str, index: VectorIndex) -> tuple[float, Optional[dict]]:
+        vector = self._get_embedder().embed(prompt)
+        with self._lock:
+            return index.search(vector)
+
+    def _add(self, prompt: str, namespace: str, value: dict):
+        embedder = self._get_embedder()
+        vector = embedder.embed(prompt)
+        with self._lock:
+            index = self.indexes.get(namespace)
+            if index is None:
+                index = self.indexes[namespace] = VectorIndex(embedder.dim, self.max_entries)
+            index.add(vector, value)
+
+    async def lookup(self, prompt: str, namespace: str) -> Optional[dict]:
+        """Return a cached result for a near-duplicate prompt, if any"""
+        if not self.enabled:
+            return None
+
+        index = self.indexes.get(namespace)
+        if index is None or index.size == 0:
+            self.misses += 1
+            return None
+
+        score, value = await asyncio.to_thread(self._search, prompt, index)
+        self.recent_scores.append(score)
+        if score >= self.threshold:
+            self.hits += 1
+            logger.info(f"Semantic cache hit (similarity: {score:.3f})")
+            return value
+
+        self.misses += 1
+        return None
+
+    async def add(self, prompt: str, namespace: str, value: dict):
+        """Remember a generation result for future near-duplicates"""
+        if not self.enabled:
+            return
+
+        await asyncio.to_thread(
+            self._add, prompt, namespace, {"code": value["code"], "explanation": value["explanation"]}
+        )
+
+    def get_stats(self) -> dict:
+        """Get hit rates and similarity distribution for threshold tuning"""
+        lookups = self.hits + self.misses
+        stats = {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": sum(index.size for index in list(self.indexes.values())),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if self.recent_scores:
+            scores = np.fromiter(self.recent_scores, dtype=np.float32)
+            stats["similarity"] = {
+                "p50": round(float(np.percentile(scores, 50)), 4),
+                "p90": round(float(np.percentile(scores, 90)), 4),
+                "max": round(float(scores.max()), 4),
+                # Share of recent lookups that would hit at each threshold
+                "hit_ratio_at": {
+                    str(t): round(float((scores >= t).mean()), 4) for t in self.TUNING_THRESHOLDS
+                }
+            }
+        return stats
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    In-flight request coalescing.
+    The first caller for a key runs the work; concurrent callers with the
+    same key wait on the same future instead of starting their own call.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.leader_count = 0
+        self.coalesced_count = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory() once per key among concurrent callers"""
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced_count += 1
+            # Shield so a cancelled follower doesn't cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        self.leader_count += 1
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.inflight.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Get coalescing counters"""
+        return {
+            "name": self.name,
+            "in_flight": len(self.inflight),
+            "leader_count": self.leader_count,
+            "coalesced_count": self.coalesced_count
+        }
+
+# Global single-flight group for LLM generations
+llm_single_flight = SingleFlight(name="llm_generation")
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import logging
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+class WriteBuffer:
+    """
+    Write-behind buffer for generation documents.
+    Inserts and per-job updates are collected and written with one unordered
+    bulk_write every WRITE_BUFFER_FLUSH_SECONDS, or as soon as
+    WRITE_BUFFER_MAX_BATCH operations are waiting. Updates to the same job
+    are coalesced into a single operation. Inserts wait for their batch to
+    be written (group commit); updates return immediately, and readers call
+    flush_job first so they never see stale state. A writer that needs to
+    know when an update is stored awaits written(job_id).
+    """
+
+    def __init__(self, flush_seconds: Optional[float] = None, max_batch: Optional[int] = None):
+        self.flush_seconds = flush_seconds or float(os.getenv("WRITE_BUFFER_FLUSH_SECONDS", "0.05"))
+        self.max_batch = max_batch or int(os.getenv("WRITE_BUFFER_MAX_BATCH", "500"))
+
+        self.collection = None
+        self._inserts: list[tuple[dict, asyncio.Future]] = []
+        self._updates: dict[str, tuple[dict, dict]] = {}
+        self._update_waiters: dict[str, list[asyncio.Future]] = {}
+        # Jobs whose updates are being written, with the callers waiting for them
+        self._flushing: dict[str, list[asyncio.Future]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.flush_count = 0
+        self.ops_written = 0
+        self.coalesced_count = 0
+        self.error_count = 0
+
+    async def start(self, collection):
+        """Start the periodic flusher"""
+        self.collection = collection
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Write buffer started (flush every {self.flush_seconds}s or {self.max_batch} ops)")
+
+    async def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        if self._task is not None:
+            # Let the loop finish its current flush rather than cancelling mid-write
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _pending_count(self) -> int:
+        return len(self._inserts) + len(self._updates)
+
+    def _notify(self):
+        if self._wakeup is not None and self._pending_count() >= self.max_batch:
+            self._wakeup.set()
+
+    async def insert(self, doc: dict):
+        """Insert a document; returns once its batch is written"""
+        future = asyncio.get_running_loop().create_future()
+        self._inserts.append((doc, future))
+        self._notify()
+        await future
+
+    def update(self, job_id: str, set_fields: dict, unset_fields: Optional[dict] = None):
+        """Queue a $set/$unset for a job, merging with any update not yet written"""
+        self._merge(job_id, set_fields, unset_fields or {})
+        self._notify()
+
+    def _merge(self, job_id: str, set_fields: dict, unset_fields: dict):
+        if job_id in self._updates:
+            self.coalesced_count += 1
+            pending_set, pending_unset = self._updates[job_id]
+        else:
+            pending_set, pending_unset = {}, {}
+            self._updates[job_id] = (pending_set, pending_unset)
+        # Later writes win, so a field is never both set and unset
+        for field in set_fields:
+            pending_unset.pop(field, None)
+        for field in unset_fields:
+            pending_set.pop(field, None)
+        pending_set.update(set_fields)
+        pending_unset.update(unset_fields)
+
+    def has_pending(self, job_id: Optional[str] = None) -> bool:
+        """Whether writes (for one job, or any) are buffered or being written"""
+        if job_id is None:
+            return bool(self._pending_count() or self._flushing)
+        return job_id in self._updates or job_id in self._flushing
+
+    async def written(self, job_id: str):
+        """Wait until the buffered updates for a job are in MongoDB; raises if writing them failed"""
+        if job_id in self._updates:
+            waiters = self._update_waiters.setdefault(job_id, [])
+        elif job_id in self._flushing:
+            waiters = self._flushing[job_id]
+        else:
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        await future
+
+    async def flush_job(self, job_id: Optional[str] = None):
+        """Flush-on-read: make buffered writes for a job (or any) visible in MongoDB"""
+        if self.has_pending(job_id):
+            await self.flush()
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write buffer flush failed: {e}")
+
+    async def flush(self):
+        """Write all buffered operations with one unordered bulk_write"""
+        async with self._flush_lock:
+            inserts, self._inserts = self._inserts, []
+            updates, self._updates = self._updates, {}
+            if not inserts and not updates:
+                return
+
+            ops = [InsertOne(doc) for doc, _ in inserts]
+            for job_id, (set_fields, unset_fields) in updates.items():
+                update = {}
+                if set_fields:
+                    update["$set"] = set_fields
+                if unset_fields:
+                    update["$unset"] = unset_fields
+                ops.append(UpdateOne({"job_id": job_id}, update))
+
+            waiters = {job_id: self._update_waiters.pop(job_id, []) for job_id in updates}
+            self._flushing = waiters
+            try:
+                await self.collection.bulk_write(ops, ordered=False)
+                errors = {}
+            except BulkWriteError as e:
+                errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            except Exception as e:
+                # Nothing is known to be written: fail the inserts, retry the updates
+                self.error_count += 1
+                for _, future in inserts:
+                    if not future.done():
+                        future.set_exception(e)
+                for job_id, (set_fields, unset_fields) in updates.items():
+                    pending = self._updates.pop(job_id, None)
+                    self._merge(job_id, set_fields, unset_fields)
+                    if pending:
+                        self._merge(job_id, *pending)
+                for futures in waiters.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                raise
+            finally:
+                self._flushing = {}
+
+            self.flush_count += 1
+            self.ops_written += len(ops) - len(errors)
+            for index, (_, future) in enumerate(inserts):
+                if future.done():
+                    continue
+                if index in errors:
+                    future.set_exception(RuntimeError(errors[index].get("errmsg", "insert failed")))
+                else:
+                    future.set_result(None)
+            job_ids = list(updates)
+            for index in errors:
+                if index >= len(inserts):
+                    self.error_count += 1
+                    message = errors[index].get("errmsg", "update failed")
+                    logger.error(f"Buffered update failed: {message}")
+                    for future in waiters[job_ids[index - len(inserts)]]:
+                        if not future.done():
+                            future.set_exception(RuntimeError(message))
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(None)
+
+    def get_stats(self) -> dict:
+        return {
+            "flush_seconds": self.flush_seconds,
+            "max_batch": self.max_batch,
+            "pending": self._pending_count(),
+            "flush_count": self.flush_count,
+            "ops_written": self.ops_written,
+            "avg_batch": round(self.ops_written / self.flush_count, 2) if self.flush_count else 0.0,
+            "coalesced_count": self.coalesced_count,
+            "error_count": self.error_count
+        }
+
+# Global write buffer for the generations collection
+write_buffer = WriteBuffer()
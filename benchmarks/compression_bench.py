@@ -0,0 +1,121 @@
+"""
+Benchmark: compression ratio and CPU cost per document for generated code.
+
+Compares zlib, zstd and zstd with a dictionary trained on a separate set of
+generations. Uses synthetic JSX/Tailwind components by default, or real
+successful generations from the MongoDB at MONGO_URL.
+
+Usage:
+    python benchmarks/compression_bench.py [--docs 2000] [--level 3]
+    python benchmarks/compression_bench.py --mongo
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_openai_server import SAMPLE_COMPONENT
+from services.code_compression import CodeCompressor, train_dictionary, zstandard
+
+COLORS = ("indigo", "blue", "emerald", "rose", "amber", "gray", "slate", "violet")
+WORDS = ("Overview", "Pricing", "Contact", "Dashboard", "Settings", "Profile", "Revenue", "Users", "Orders")
+
+def synthetic_component(rng: random.Random) -> str:
+    """A sample component with varied names, classes and a repeated card grid"""
+    code = SAMPLE_COMPONENT.replace("indigo", rng.choice(COLORS)).replace("GeneratedComponent", rng.choice(WORDS) + "Page")
+    cards = "\n".join(
+        f'        <div className="rounded-xl border border-{rng.choice(COLORS)}-200 bg-white p-{rng.randint(2, 8)} shadow-sm">\n'
+        f'          <h2 className="text-lg font-semibold text-gray-900">{rng.choice(WORDS)}</h2>\n'
+        f'          <p className="mt-1 text-sm text-gray-500">{rng.randint(0, 99999):,} {rng.choice(WORDS).lower()}</p>\n'
+        f'        </div>'
+        for _ in range(rng.randint(4, 24))
+    )
+    return code.replace('      <div className="w-full', f'      <div className="grid grid-cols-3 gap-4">\n{cards}\n      </div>\n      <div className="w-full', 1)
+
+async def load_from_mongo(limit: int) -> list[str]:
+    import database
+    from services.code_compression import code_compressor
+
+    await database.connect_db()
+    await code_compressor.connect(database.compression_dicts_collection)
+    docs = await database.generations_collection.find(
+        {"status": "success"},
+        {"_id": 0, "generated_code": 1, "generated_code_z": 1}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    codes = [(await code_compressor.restore(doc)).get("generated_code") for doc in docs]
+    database.close_db()
+    return [code for code in codes if code]
+
+def measure(compressor: CodeCompressor, docs: list[str]) -> dict:
+    blobs = []
+    started = time.perf_counter()
+    for code in docs:
+        blobs.append(compressor.compress(code))
+    compress_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob, code in zip(blobs, docs):
+        assert compressor.decompress(blob) == code
+    decompress_seconds = time.perf_counter() - started
+
+    raw = sum(len(code.encode("utf-8")) for code in docs)
+    stored = sum(len(blob) for blob in blobs)
+    return {
+        "avg_bytes": stored / len(docs),
+        "ratio": raw / stored,
+        "compress_us": compress_seconds / len(docs) * 1e6,
+        "decompress_us": decompress_seconds / len(docs) * 1e6
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000, help="documents to compress (plus as many to train on)")
+    parser.add_argument("--level", type=int, default=3, help="zstd compression level")
+    parser.add_argument("--dict-size", type=int, default=16384)
+    parser.add_argument("--mongo", action="store_true", help="use real generations from MONGO_URL")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.mongo:
+        corpus = asyncio.run(load_from_mongo(args.docs * 2))
+    else:
+        rng = random.Random(args.seed)
+        corpus = [synthetic_component(rng) for _ in range(args.docs * 2)]
+    # Train on one half and measure on the other, as in production
+    training, docs = corpus[:len(corpus) // 2], corpus[len(corpus) // 2:]
+    if not docs:
+        sys.exit("No documents to benchmark")
+
+    avg_raw = sum(len(code.encode("utf-8")) for code in docs) / len(docs)
+    print(f"🗜️  Compression benchmark: {len(docs)} documents, avg {avg_raw:,.0f} bytes "
+          f"({'mongo' if args.mongo else 'synthetic'})")
+    print("=" * 72)
+    print(f"{'codec':<18}{'avg bytes':>12}{'ratio':>9}{'compress us':>15}{'decompress us':>16}")
+
+    codecs = [("zlib-6", CodeCompressor(min_bytes=1, use_zstd=False))]
+    if zstandard is None:
+        print("(zstandard not installed, only zlib is measured)")
+    else:
+        codecs.append((f"zstd-{args.level}", CodeCompressor(min_bytes=1, level=args.level, use_zstd=True)))
+        with_dict = CodeCompressor(min_bytes=1, level=args.level, use_zstd=True)
+        started = time.perf_counter()
+        with_dict.load_dictionary(train_dictionary(training, args.dict_size))
+        print(f"(trained {args.dict_size // 1024} KB dictionary on {len(training)} documents "
+              f"in {time.perf_counter() - started:.2f}s)")
+        codecs.append((f"zstd-{args.level}+dict", with_dict))
+
+    for name, compressor in codecs:
+        result = measure(compressor, docs)
+        print(
+            f"{name:<18}{result['avg_bytes']:>12,.0f}{result['ratio']:>8.2f}x"
+            f"{result['compress_us']:>15.1f}{result['decompress_us']:>16.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Load test for the generation API.
+
+Starts the FastAPI app in-process against a local mock OpenAI server and a
+mongomock (or real MongoDB) database, drives concurrent generate / poll /
+history traffic with an async client, and reports throughput, per-endpoint
+latency percentiles and job end-to-end time.
+
+Usage:
+    python benchmarks/load_test.py --users 1000 --iterations 2 --latency 1.0
+    python benchmarks/load_test.py --mongo real --json results.json
+    python benchmarks/load_test.py --backend-latencies 1.0,3.0 --backend-error-rates 0,0.5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import httpx
+
+from mock_openai_server import MockConfig, start_mock_server
+
+TERMINAL_STATUSES = ("success", "failed")
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.job_times: list[float] = []
+        self.job_statuses: dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+def use_mock_database():
+    """Point the app at an in-memory mongomock database"""
+    import mongomock_motor
+    import database
+
+    # connect_db() keeps an already bound client
+    database.bind_client(mongomock_motor.AsyncMongoMockClient())
+
+async def timed(stats: LoadStats, endpoint: str, request):
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        stats.record(endpoint, time.perf_counter() - started, False)
+        return None
+    stats.record(endpoint, time.perf_counter() - started, response.status_code < 400)
+    return response
+
+async def wait_polling(client, stats, job_id, poll_interval, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await timed(stats, "GET /api/jobs/{job_id}", client.get(f"/api/jobs/{job_id}"))
+        if response is not None and response.status_code == 200:
+            status = response.json()["status"]
+            if status in TERMINAL_STATUSES:
+                return status
+        await asyncio.sleep(poll_interval)
+    return "timeout"
+
+async def wait_events(client, stats, job_id, timeout):
+    started = time.perf_counter()
+    status = "timeout"
+    try:
+        async with client.stream("GET", f"/api/jobs/{job_id}/events", timeout=timeout) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    status = json.loads(line[6:]).get("status", status)
+                    if status in TERMINAL_STATUSES:
+                        break
+    except httpx.HTTPError:
+        pass
+    stats.record("GET /api/jobs/{job_id}/events", time.perf_counter() - started, status in TERMINAL_STATUSES)
+    return status
+
+async def virtual_user(client, stats, prompts, args):
+    for _ in range(args.iterations):
+        job_started = time.perf_counter()
+        response = await timed(
+            stats, "POST /api/generate",
+            client.post("/api/generate", json={"prompt": random.choice(prompts)})
+        )
+        if response is None or response.status_code != 200:
+            continue
+
+        job_id = response.json()["job_id"]
+        if args.sse:
+            status = await wait_events(client, stats, job_id, args.job_timeout)
+        else:
+            status = await wait_polling(client, stats, job_id, args.poll_interval, args.job_timeout)
+        stats.job_statuses[status] += 1
+        if status in TERMINAL_STATUSES:
+            stats.job_times.append(time.perf_counter() - job_started)
+
+        await timed(stats, "GET /api/history", client.get("/api/history"))
+
+def build_report(stats: LoadStats, elapsed: float, mocks: dict) -> dict:
+    endpoints = {}
+    for endpoint, values in sorted(stats.latencies.items()):
+        endpoints[endpoint] = {
+            "count": len(values),
+            "errors": stats.errors[endpoint],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2)
+        }
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "endpoints": endpoints,
+        "jobs": {
+            "statuses": dict(stats.job_statuses),
+            "p50_seconds": round(percentile(stats.job_times, 50), 3),
+            "p95_seconds": round(percentile(stats.job_times, 95), 3),
+            "p99_seconds": round(percentile(stats.job_times, 99), 3)
+        },
+        "upstream": {
+            name: {
+                "requests": mock_stats.requests,
+                "streams": mock_stats.streams,
+                "errors": mock_stats.errors,
+                "rate_limited": mock_stats.rate_limited
+            }
+            for name, (_, mock_stats) in mocks.items()
+        }
+    }
+
+def print_report(report: dict):
+    print("\n" + "=" * 78)
+    print(f"📊 Load test finished in {report['elapsed_seconds']}s")
+    print(f"{'endpoint':<34}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<34}{row['count']:>8}{row['errors']:>6}{row['throughput_rps']:>9}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+        )
+    jobs = report["jobs"]
+    print(f"\nJobs: {jobs['statuses']}")
+    print(f"Job end-to-end: p50 {jobs['p50_seconds']}s  p95 {jobs['p95_seconds']}s  p99 {jobs['p99_seconds']}s")
+    for name, upstream in report["upstream"].items():
+        print(f"Upstream LLM calls ({name}): {upstream}")
+
+def parse_floats(value: str | None, count: int, default: float) -> list[float]:
+    values = [float(part) for part in value.split(",")] if value else []
+    return values + [values[-1] if values else default] * (count - len(values))
+
+async def run(args):
+    latencies = parse_floats(args.backend_latencies, 1, args.latency)
+    error_rates = parse_floats(args.backend_error_rates, len(latencies), args.error_rate)
+    # One mock server per backend, routed between by the app's LLM router
+    mocks = {}
+    backends = []
+    for index, (latency, error_rate) in enumerate(zip(latencies, error_rates)):
+        mock_server, mock_stats, base_url = await start_mock_server(MockConfig(
+            latency=latency,
+            jitter=args.jitter,
+            chunk_delay=args.chunk_delay,
+            error_rate=error_rate,
+            rate_limit_rate=args.rate_limit_rate
+        ))
+        mocks[f"mock{index}"] = (mock_server, mock_stats)
+        backends.append({"name": f"mock{index}", "model": "gpt-4o", "base_url": base_url})
+
+    # Must be set before the app modules read their configuration
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_BASE_URL"] = backends[0]["base_url"]
+    if len(backends) > 1:
+        os.environ["LLM_BACKENDS"] = json.dumps(backends)
+    os.environ.setdefault("MAX_REQUESTS_PER_MINUTE", str(10 ** 9))
+
+    import server
+    if args.mongo == "mock":
+        use_mock_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    prompts = [f"Create a dashboard card variant {i} with a chart and stats" for i in range(args.unique_prompts)]
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=args.job_timeout) as client:
+            print(f"🚀 {args.users} users x {args.iterations} iterations against "
+                  f"{', '.join(backend['base_url'] for backend in backends)} "
+                  f"(mongo: {args.mongo}, {'sse' if args.sse else 'polling'})")
+            started = time.perf_counter()
+            await asyncio.gather(*(virtual_user(client, stats, prompts, args) for _ in range(args.users)))
+            elapsed = time.perf_counter() - started
+
+    for mock_server, _ in mocks.values():
+        mock_server.should_exit = True
+        await mock_server.task
+
+    report = build_report(stats, elapsed, mocks)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.json}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=2, help="generate/poll/history cycles per user")
+    parser.add_argument("--unique-prompts", type=int, default=100, help="size of the prompt pool")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--job-timeout", type=float, default=120.0)
+    parser.add_argument("--sse", action="store_true", help="wait on the SSE endpoint instead of polling")
+    parser.add_argument("--mongo", choices=("mock", "real"), default="mock",
+                        help="mongomock in-process, or the MongoDB at MONGO_URL")
+    parser.add_argument("--latency", type=float, default=1.0, help="mock LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--backend-latencies", help="comma-separated latencies, one mock backend each")
+    parser.add_argument("--backend-error-rates", help="comma-separated error rates per mock backend")
+    parser.add_argument("--json", help="write the report as JSON to this path")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
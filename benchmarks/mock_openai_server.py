@@ -0,0 +1,194 @@
+"""
+Local OpenAI-compatible mock server for benchmarks.
+
+Serves POST /v1/chat/completions (plain and streaming) with configurable
+latency, per-chunk delay and error rates, so load tests never touch the
+real API or spend tokens.
+
+Usage:
+    python benchmarks/mock_openai_server.py --port 9000 --latency 1.5 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+SAMPLE_COMPONENT = """import React, { useState } from "react";
+
+export default function GeneratedComponent() {
+  const [active, setActive] = useState(0);
+  const items = ["Overview", "Pricing", "Contact"];
+
+  return (
+    <div className="min-h-screen bg-gray-50 flex items-center justify-center p-6">
+      <div className="w-full max-w-md bg-white rounded-2xl shadow-lg p-8 space-y-6">
+        <h1 className="text-2xl font-bold text-gray-900">Generated UI</h1>
+        <div className="flex gap-2">
+          {items.map((item, index) => (
+            <button
+              key={item}
+              onClick={() => setActive(index)}
+              className={`px-4 py-2 rounded-lg text-sm font-medium ${
+                active === index ? "bg-indigo-600 text-white" : "bg-gray-100 text-gray-700"
+              }`}
+            >
+              {item}
+            </button>
+          ))}
+        </div>
+        <p className="text-gray-600">Selected: {items[active]}</p>
+      </div>
+    </div>
+  );
+}"""
+
+@dataclass
+class MockConfig:
+    latency: float = 1.0
+    jitter: float = 0.2
+    chunk_delay: float = 0.01
+    chunk_size: int = 24
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.streams = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+def _completion_id() -> str:
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+def _usage(prompt_chars: int, content: str) -> dict:
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+def create_app(config: MockConfig, stats: MockStats) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        model = body.get("model", "gpt-4o")
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"Retry-After": "1", "x-ratelimit-reset-requests": "1s"}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats.errors += 1
+            return JSONResponse(
+                {"error": {"message": "The server had an error", "type": "server_error"}},
+                status_code=500
+            )
+
+        await asyncio.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+        content = f"```jsx\n{SAMPLE_COMPONENT}\n```"
+        completion_id = _completion_id()
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": _usage(prompt_chars, content)
+            })
+
+        stats.streams += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events():
+            for i in range(0, len(content), config.chunk_size):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": content[i:i + config.chunk_size]},
+                        "finish_reason": None
+                    }]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.chunk_delay)
+            if include_usage:
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": _usage(prompt_chars, content)
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+async def start_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock server in the running loop; returns (server, stats, base_url)"""
+    stats = MockStats()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(config, stats), host=host, port=port, log_level="warning", lifespan="off"
+    ))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    server.task = task
+    return server, stats, f"http://{host}:{bound_port}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=1.0, help="mean seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.2, help="stddev of the latency")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between stream chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+    print(f"🤖 Mock OpenAI server on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(config, MockStats()), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
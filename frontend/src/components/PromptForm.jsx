@@ -19,16 +19,10 @@ const PromptForm = ({ onGenerationComplete, onLoadingChange }) => {
     while (attempts < maxAttempts) {
       try {
         const response = await axios.get(`${API}/jobs/${jobId}`);
-        const { status, generated_code, explanation, error_message } = response.data;
-
-        if (status === 'success') {
-          onGenerationComplete(generated_code, explanation);
-          toast.success('UI component generated successfully!');
-          return true;
-        } else if (status === 'failed') {
-          setError(error_message || 'Generation failed');
-          toast.error(error_message || 'Generation failed');
-          return false;
+        const { status } = response.data;
+
+        if (status === 'success' || status === 'failed') {
+          return handleJobResult(response.data);
         }
 
         // Still pending or running, wait and try again
@@ -46,6 +40,47 @@ const PromptForm = ({ onGenerationComplete, onLoadingChange }) => {
     return false;
   };
 
+  const handleJobResult = (data) => {
+    const { status, generated_code, explanation, error_message } = data;
+
+    if (status === 'success') {
+      onGenerationComplete(generated_code, explanation);
+      toast.success('UI component generated successfully!');
+      return true;
+    }
+    setError(error_message || 'Generation failed');
+    toast.error(error_message || 'Generation failed');
+    return false;
+  };
+
+  const watchJobEvents = (jobId) => {
+    if (typeof EventSource === 'undefined') {
+      return pollJobStatus(jobId);
+    }
+
+    return new Promise((resolve) => {
+      const source = new EventSource(`${API}/jobs/${jobId}/events`);
+      let finished = false;
+
+      source.addEventListener('status', (event) => {
+        const data = JSON.parse(event.data);
+        if (data.status === 'success' || data.status === 'failed') {
+          finished = true;
+          source.close();
+          resolve(handleJobResult(data));
+        }
+      });
+
+      source.onerror = () => {
+        source.close();
+        if (!finished) {
+          // Stream unavailable or dropped, fall back to polling
+          resolve(pollJobStatus(jobId));
+        }
+      };
+    });
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     
@@ -65,8 +100,8 @@ const PromptForm = ({ onGenerationComplete, onLoadingChange }) => {
 
       toast.info('Generation started...');
 
-      // Poll for job completion
-      await pollJobStatus(job_id);
+      // Wait for job completion via server-sent events
+      await watchJobEvents(job_id);
     } catch (err) {
       console.error('Generation error:', err);
       
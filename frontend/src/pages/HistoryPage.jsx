@@ -11,15 +11,20 @@ const HistoryPage = () => {
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedItem, setSelectedItem] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchHistory();
   }, []);
 
-  const fetchHistory = async () => {
+  const fetchHistory = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API}/history`);
-      setHistory(response.data.history);
+      // Summary mode leaves out generated code; it is fetched when an item is opened
+      const params = { summary: true, ...(cursor && { cursor }) };
+      const response = await axios.get(`${API}/history`, { params });
+      setHistory((prev) => (cursor ? [...prev, ...response.data.history] : response.data.history));
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Failed to fetch history:', error);
       toast.error('Failed to load history');
@@ -28,6 +33,28 @@ const HistoryPage = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    await fetchHistory(nextCursor);
+    setLoadingMore(false);
+  };
+
+  const openItem = async (item) => {
+    setSelectedItem(item);
+    if (item.status !== 'success') {
+      return;
+    }
+    try {
+      const response = await axios.get(`${API}/jobs/${item.id}`);
+      setSelectedItem((current) =>
+        current?.id === item.id ? { ...current, generated_code: response.data.generated_code } : current
+      );
+    } catch (error) {
+      console.error('Failed to fetch generated code:', error);
+      toast.error('Failed to load generated code');
+    }
+  };
+
   const getStatusIcon = (status) => {
     switch (status) {
       case 'success':
@@ -83,7 +110,7 @@ const HistoryPage = () => {
                 animate={{ opacity: 1, y: 0 }}
                 transition={{ duration: 0.3, delay: index * 0.05 }}
                 data-testid={`history-item-${item.id}`}
-                onClick={() => setSelectedItem(item)}
+                onClick={() => openItem(item)}
                 className="group border border-border/40 rounded-xl p-6 hover:border-primary/50 hover:shadow-md transition-all duration-300 cursor-pointer bg-card"
               >
                 {/* Status Badge */}
@@ -104,18 +131,30 @@ const HistoryPage = () => {
                   {item.prompt}
                 </p>
 
-                {/* Code Preview */}
-                {item.generated_code && (
-                  <div className="bg-background/50 rounded-md p-3 border border-border/40">
-                    <code className="text-xs text-muted-foreground font-mono line-clamp-2">
-                      {item.generated_code.substring(0, 100)}...
-                    </code>
+                {/* Code Size */}
+                {item.code_size > 0 && (
+                  <div className="flex items-center gap-2 text-xs text-muted-foreground font-mono">
+                    <Code className="w-4 h-4" />
+                    <span>{(item.code_size / 1024).toFixed(1)} KB of code</span>
                   </div>
                 )}
               </motion.div>
             ))}
           </div>
         )}
+
+        {nextCursor && !loading && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              data-testid="history-load-more"
+              className="px-6 py-2 border border-border/40 rounded-md hover:border-primary/50 transition-all disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Modal for selected item */}
@@ -140,6 +179,10 @@ const HistoryPage = () => {
                 <pre className="bg-background/50 rounded-md p-4 overflow-x-auto border border-border/40">
                   <code className="text-sm font-mono">{selectedItem.generated_code}</code>
                 </pre>
+              ) : selectedItem.status === 'success' ? (
+                <div className="flex items-center justify-center py-8">
+                  <Loader className="w-6 h-6 text-primary animate-spin" />
+                </div>
               ) : (
                 <p className="text-muted-foreground">No code generated</p>
               )}
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# The backend runs with backend/ as its working directory (from services.x import ...)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """Route redis.asyncio connection pools to an in-process fake Redis server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    # The rate limiter's sliding window is a Lua script
+    pytest.importorskip("lupa")
+    aioredis = pytest.importorskip("redis.asyncio")
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+
+    server = fakeredis.FakeServer()
+
+    def from_url(url, **options):
+        return aioredis.ConnectionPool(connection_class=FakeAsyncRedisConnection, server=server)
+
+    monkeypatch.setattr(aioredis.ConnectionPool, "from_url", from_url)
+    return server
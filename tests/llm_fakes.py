@@ -0,0 +1,41 @@
+"""OpenAI-compatible backends that answer from memory, for the LLM service tests"""
+import asyncio
+from types import SimpleNamespace
+
+from services.llm_governor import LLMGovernor
+from services.llm_router import LLMBackend
+
+CODE = "export default function Card() { return <div/>; }"
+
+class FakeCompletions:
+    """chat.completions of an OpenAI client that answers after delay seconds"""
+
+    def __init__(self, delay: float, code: str, error: Exception | None = None):
+        self.delay = delay
+        self.code = code
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, stream: bool = False, **options):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        if stream:
+            return self._events()
+        message = SimpleNamespace(content=self.code)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+
+    async def _events(self):
+        for part in (self.code[:10], self.code[10:]):
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+def fake_backend(name: str, delay: float, code: str = CODE, error: Exception | None = None) -> LLMBackend:
+    backend = LLMBackend(name, "gpt-test", governor=LLMGovernor(2, 0, 0))
+    backend.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(delay, code, error)))
+    return backend
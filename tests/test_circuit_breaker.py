@@ -0,0 +1,202 @@
+import asyncio
+import time
+
+import pytest
+
+from services import breaker_store as breaker_store_module
+from services.breaker_store import BreakerStore, MmapBreakerStore, RedisBreakerStore, create_breaker_store
+from services.circuit_breaker import CircuitBreaker, CircuitState
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    from services import circuit_breaker as circuit_breaker_module
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker_module, "time", fake)
+    return fake
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    """A breaker with 2 half-open probes that has just tripped"""
+    monkeypatch.setenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "2")
+    monkeypatch.setenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "10")
+    breaker = CircuitBreaker(failure_threshold=2, timeout_seconds=30, name="test", store=BreakerStore())
+    for _ in range(2):
+        breaker.record_failure(breaker.acquire())
+    assert breaker.state == CircuitState.OPEN
+    return breaker
+
+def half_open(breaker: CircuitBreaker, clock: FakeClock) -> list:
+    clock.now += 30
+    return [breaker.acquire() for _ in range(3)]
+
+def test_open_breaker_rejects_until_the_timeout_passes(breaker, clock):
+    clock.now += 29.9
+    assert breaker.acquire() is None
+    assert not breaker.is_available()
+    clock.now += 0.1
+    assert breaker.is_available()
+
+def test_half_open_admits_only_the_configured_number_of_probes(breaker, clock):
+    first, second, third = half_open(breaker, clock)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert first.probe and second.probe
+    assert third is None
+    assert breaker.probes_in_flight == 2
+    assert not breaker.is_available()
+
+def test_every_probe_has_to_succeed_to_close(breaker, clock):
+    first, second, _ = half_open(breaker, clock)
+    breaker.record_success(first, seconds=1)
+    assert breaker.state == CircuitState.HALF_OPEN
+    # A finished probe frees its slot for the next one
+    third = breaker.acquire()
+    assert third is not None and third.probe
+    breaker.record_success(second, seconds=1)
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.acquire().probe is False
+
+def test_failed_probe_reopens_and_late_probes_are_ignored(breaker, clock):
+    first, second, _ = half_open(breaker, clock)
+    breaker.record_failure(first)
+    assert breaker.state == CircuitState.OPEN
+
+    clock.now += 30
+    probe = breaker.acquire()
+    # The second probe of the previous half-open period neither closes the breaker nor frees a slot
+    breaker.record_success(second, seconds=1)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.probes_in_flight == 1
+    assert probe.probe
+
+def test_slow_probe_reopens(breaker, clock):
+    first, _, _ = half_open(breaker, clock)
+    breaker.record_success(first, seconds=10)
+    assert breaker.state == CircuitState.OPEN
+
+def test_released_probe_frees_its_slot_without_an_outcome(breaker, clock):
+    first, _, _ = half_open(breaker, clock)
+    breaker.release(first)
+    assert breaker.probes_in_flight == 1
+    assert breaker.acquire() is not None
+    assert breaker.acquire() is None
+    assert breaker.state == CircuitState.HALF_OPEN
+
+def tripping_breaker(store) -> CircuitBreaker:
+    return CircuitBreaker(failure_threshold=1, timeout_seconds=30, name="shared", store=store)
+
+def test_mmap_store_shares_trips_between_processes(tmp_path, clock):
+    path = str(tmp_path / "breakers")
+    # One store per worker process, mapping the same file
+    first_store, second_store = MmapBreakerStore(path, slots=8), MmapBreakerStore(path, slots=8)
+    first, second = tripping_breaker(first_store), tripping_breaker(second_store)
+    try:
+        assert second_store.read("shared") is None
+        first.record_failure(first.acquire())
+
+        assert second_store.read("shared") == clock.now + 30
+        assert second.acquire() is None
+        assert second.state == CircuitState.OPEN
+        assert second.remote_trips == 1
+
+        # Both reopen for probes when the shared open period ends
+        clock.now += 30
+        assert first.acquire().probe and second.acquire().probe
+    finally:
+        asyncio.run(first_store.close())
+        asyncio.run(second_store.close())
+
+def test_mmap_store_keeps_the_latest_trip_and_separates_breakers(tmp_path):
+    store = MmapBreakerStore(str(tmp_path / "breakers"), slots=4)
+    try:
+        store.publish("a", 2000.0)
+        store.publish("a", 1500.0)
+        store.publish("b", 1000.0)
+        assert (store.read("a"), store.read("b"), store.read("c")) == (2000.0, 1000.0, None)
+    finally:
+        asyncio.run(store.close())
+
+def test_redis_store_publishes_and_receives_trips(redis_server, clock):
+    async def run():
+        first, second = RedisBreakerStore("redis://fake"), RedisBreakerStore("redis://fake")
+        await first.connect()
+        await second.connect()
+        try:
+            breaker, other = tripping_breaker(first), tripping_breaker(second)
+            breaker.record_failure(breaker.acquire())
+            # The trip reaches the other worker's listener
+            for _ in range(100):
+                if second.read("shared") is not None:
+                    break
+                await asyncio.sleep(0.01)
+            rejected = other.acquire() is None
+
+            # A worker starting later catches up from the key
+            late = RedisBreakerStore("redis://fake")
+            await late.connect()
+            await late.close()
+            return second.read("shared"), rejected, other.remote_trips, late.read("shared"), first.get_stats()
+        finally:
+            await first.close()
+            await second.close()
+
+    # The key expires with the open period, measured against the real clock
+    clock.now = time.time()
+    received, rejected, remote_trips, caught_up, stats = asyncio.run(run())
+    assert received == caught_up == clock.now + 30
+    assert rejected and remote_trips == 1
+    assert stats["published_count"] == 1 and stats["connected"]
+
+def test_unreachable_redis_leaves_breaker_state_per_process(redis_server, monkeypatch, clock):
+    monkeypatch.setenv("CIRCUIT_BREAKER_STORE", "redis")
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    redis_server.connected = False
+
+    async def run():
+        store = create_breaker_store()
+        await store.connect()
+        try:
+            breaker = tripping_breaker(store)
+            breaker.record_failure(breaker.acquire())
+            return store, store.get_stats(), breaker.state
+        finally:
+            await store.close()
+
+    store, stats, state = asyncio.run(run())
+    assert isinstance(store, RedisBreakerStore)
+    assert stats["connected"] is False
+    assert state == CircuitState.OPEN
+
+@pytest.mark.parametrize("env", [
+    {"CIRCUIT_BREAKER_STORE": "local"},
+    # Redis mode without a URL
+    {"CIRCUIT_BREAKER_STORE": "redis"}
+])
+def test_create_breaker_store_falls_back_to_local(monkeypatch, env):
+    for name in ("CIRCUIT_BREAKER_REDIS_URL", "REDIS_URL"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    assert type(create_breaker_store()) is BreakerStore
+
+def test_create_breaker_store_without_redis_installed_is_local(monkeypatch):
+    monkeypatch.setenv("CIRCUIT_BREAKER_STORE", "redis")
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    monkeypatch.setattr(breaker_store_module, "aioredis", None)
+    assert type(create_breaker_store()) is BreakerStore
+
+def test_create_breaker_store_mmap(monkeypatch, tmp_path):
+    monkeypatch.setenv("CIRCUIT_BREAKER_STORE", "mmap")
+    monkeypatch.setenv("CIRCUIT_BREAKER_MMAP_PATH", str(tmp_path / "breakers"))
+    store = create_breaker_store()
+    assert isinstance(store, MmapBreakerStore)
+    asyncio.run(store.close())
@@ -0,0 +1,100 @@
+import asyncio
+import zlib
+
+import pytest
+
+zstandard = pytest.importorskip("zstandard")
+
+from services.code_compression import CodeCompressor, ZSTD_MAGIC, train_dictionary
+
+def component(i: int) -> str:
+    return (
+        f"import React, {{ useState }} from 'react';\n"
+        f"export default function Widget{i}({{ title = 'Item {i}' }}) {{\n"
+        f"  const [count{i}, setCount{i}] = useState({i % 7});\n"
+        f"  return (\n"
+        f"    <div className=\"p-{i % 5} rounded-lg shadow bg-white\">\n"
+        f"      <h2 className=\"text-xl font-bold\">{{title}}</h2>\n"
+        f"      <button onClick={{() => setCount{i}(count{i} + {i % 3 + 1})}}>Clicked {{count{i}}} times</button>\n"
+        f"    </div>\n"
+        f"  );\n"
+        f"}}\n"
+    )
+
+@pytest.fixture(scope="module")
+def dictionary() -> bytes:
+    return train_dictionary([component(i) for i in range(200)], 4096)
+
+def test_short_code_is_stored_as_a_plain_string():
+    compressor = CodeCompressor(min_bytes=1024)
+    assert compressor.encode_fields("short") == ({"generated_code": "short"}, {"generated_code_z": ""})
+    assert compressor.compressed_count == 0
+
+def test_disabled_compression_stores_every_string_plain():
+    compressor = CodeCompressor(min_bytes=0)
+    code = component(1) * 20
+    assert compressor.encode_fields(code) == ({"generated_code": code}, {"generated_code_z": ""})
+
+@pytest.mark.parametrize("use_zstd, magic", [(True, ZSTD_MAGIC), (False, b"\x78")])
+def test_round_trip_without_a_dictionary(use_zstd, magic):
+    compressor = CodeCompressor(min_bytes=1, use_zstd=use_zstd)
+    code = component(3) * 5
+    fields, unset = compressor.encode_fields(code)
+    assert unset == {"generated_code": ""}
+    assert bytes(fields["generated_code_z"]).startswith(magic)
+
+    doc = asyncio.run(compressor.restore({"job_id": "job", **fields}))
+    assert doc == {"job_id": "job", "generated_code": code}
+
+def test_round_trip_with_a_trained_dictionary(dictionary):
+    compressor = CodeCompressor(min_bytes=1)
+    dict_id = compressor.load_dictionary(dictionary)
+    code = component(1234)
+
+    blob = compressor.compress(code)
+    assert zstandard.get_frame_parameters(bytes(blob)).dict_id == dict_id
+    # The dictionary is what makes single small documents compress well
+    assert len(blob) < len(CodeCompressor(min_bytes=1).compress(code))
+    assert compressor.decompress(blob) == code
+
+def test_blobs_stay_readable_after_the_dictionary_is_retrained(dictionary):
+    compressor = CodeCompressor(min_bytes=1)
+    plain_blob = compressor.compress(component(1))
+    compressor.load_dictionary(dictionary)
+    dict_blob = compressor.compress(component(2))
+    compressor.load_dictionary(train_dictionary([component(i) * 2 for i in range(200)], 4096))
+
+    assert compressor.decompress(plain_blob) == component(1)
+    assert compressor.decompress(dict_blob) == component(2)
+
+def test_dictionary_trained_elsewhere_is_fetched_on_first_read(dictionary):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    dicts = mongomock_motor.AsyncMongoMockClient()["test"]["compression_dicts"]
+    writer = CodeCompressor(min_bytes=1)
+    dict_id = writer.load_dictionary(dictionary)
+    reader = CodeCompressor(min_bytes=1)
+
+    async def run():
+        await reader.connect(dicts)
+        # Another instance trains and stores a dictionary after the reader connected
+        await dicts.insert_one({"dict_id": dict_id, "data": dictionary})
+        return await reader.restore({"generated_code_z": writer.compress(component(5))})
+
+    assert asyncio.run(run()) == {"generated_code": component(5)}
+    assert dict_id in reader.dictionaries
+
+def test_unknown_dictionary_is_an_error(dictionary):
+    writer = CodeCompressor(min_bytes=1)
+    writer.load_dictionary(dictionary)
+    with pytest.raises(RuntimeError, match="Unknown zstd dictionary"):
+        CodeCompressor(min_bytes=1).decompress(writer.compress(component(5)))
+
+def test_legacy_documents_are_read_as_stored():
+    compressor = CodeCompressor(min_bytes=1)
+    # Written before compression existed
+    legacy = {"job_id": "job", "generated_code": "plain code"}
+    assert asyncio.run(compressor.restore(dict(legacy))) == legacy
+    # Compressed with zlib before zstandard was installed
+    zlib_doc = {"generated_code_z": zlib.compress(b"zlib code")}
+    assert asyncio.run(compressor.restore(zlib_doc)) == {"generated_code": "zlib code"}
+    assert asyncio.run(compressor.restore({"job_id": "running"})) == {"job_id": "running"}
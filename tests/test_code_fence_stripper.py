@@ -0,0 +1,44 @@
+import pytest
+
+from services.llm_service import CodeFenceStripper
+
+CODE = "export default function Card() {\n  return <div className=\"p-4\">Hi</div>;\n}"
+
+def strip(chunks: list[str]) -> str:
+    stripper = CodeFenceStripper()
+    out = "".join(stripper.feed(chunk) for chunk in chunks)
+    return out + stripper.finish()
+
+def split_every(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.mark.parametrize("size", [*range(1, 12), 1000])
+def test_fenced_response_is_unwrapped_at_any_chunking(size):
+    assert strip(split_every(f"```jsx\n{CODE}\n```", size)) == CODE
+    assert strip(split_every(f"```jsx\n{CODE}\n```\n", size)) == CODE
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_unfenced_response_passes_through(size):
+    assert strip(split_every(CODE, size)) == CODE
+
+def test_leading_whitespace_before_fence_is_dropped():
+    assert strip(["\n  ``", "`javascript\n", CODE, "\n``", "`\n"]) == CODE
+
+def test_fence_without_language_tag():
+    assert strip(["```\n", CODE, "\n```"]) == CODE
+
+def test_backticks_inside_code_are_kept():
+    code = "const s = `a ${b}`;\nconst t = ``;"
+    assert strip(["```jsx\n", code, "\n```"]) == code
+
+def test_missing_closing_fence_keeps_all_code():
+    assert strip(split_every(f"```jsx\n{CODE}", 3)) == CODE
+
+def test_possible_closing_fence_is_held_back_until_more_code_arrives():
+    stripper = CodeFenceStripper()
+    assert stripper.feed("```jsx\nline one\n``") == "line one"
+    # The held back backticks turned out to be code
+    assert stripper.feed("`const x = 1;") == "\n```const x = 1;"
+
+def test_response_that_is_only_a_fence_yields_nothing():
+    assert strip(["``", "`"]) == ""
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import database
+
+IXSCAN_PLAN = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+COLLSCAN_PLAN = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+
+class ExplainCursor:
+    """Stands in for a cursor on a server that would pick the given winning plan"""
+
+    def __init__(self, plan: dict):
+        self.plan = plan
+
+    async def explain(self) -> dict:
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+@pytest.fixture
+def mongo():
+    database.bind_client(mongomock_motor.AsyncMongoMockClient())
+    yield database.db
+    database.close_db()
+
+@pytest.fixture
+def plans(monkeypatch):
+    """Winning plan per hot query; every query is index-backed unless a test says otherwise"""
+    winning = {name: IXSCAN_PLAN for name in database._hot_queries()}
+    monkeypatch.setattr(database, "_hot_queries", lambda: {name: ExplainCursor(plan) for name, plan in winning.items()})
+    return winning
+
+def test_ensure_indexes_creates_every_declared_index(mongo):
+    asyncio.run(database.ensure_indexes())
+
+    for name, (collection_name, keys, options) in database.INDEXES.items():
+        info = asyncio.run(mongo[collection_name].index_information())[name]
+        assert info["key"] == keys
+        for option in database.INDEX_OPTION_KEYS:
+            assert info.get(option) == options.get(option), (name, option)
+
+def test_ensure_indexes_rebuilds_changed_definitions(mongo):
+    async def run():
+        prompts = mongo["prompts"]
+        await prompts.create_index([("expires_at", 1)], name="cache_expires_ttl", expireAfterSeconds=60)
+        # Same keys as job_id_unique under a legacy name
+        await mongo["generations"].create_index([("job_id", 1)], name="job_id_1", unique=True)
+        await database.ensure_indexes()
+        return await prompts.index_information(), await mongo["generations"].index_information()
+
+    prompts, generations = asyncio.run(run())
+    assert prompts["cache_expires_ttl"]["expireAfterSeconds"] == 0
+    assert "job_id_1" not in generations
+    assert generations["job_id_unique"]["unique"] is True
+
+def test_ensure_indexes_is_idempotent(mongo):
+    asyncio.run(database.ensure_indexes())
+    before = asyncio.run(mongo["generations"].index_information())
+    asyncio.run(database.ensure_indexes())
+    assert asyncio.run(mongo["generations"].index_information()) == before
+
+def test_hot_queries_are_index_backed(mongo, plans):
+    stages = asyncio.run(database.verify_query_plans())
+    assert set(stages) == set(plans)
+    assert stages["history"] == ["LIMIT", "FETCH", "IXSCAN"]
+
+def test_collection_scan_fails_verification(mongo, plans):
+    plans["history"] = COLLSCAN_PLAN
+    # A COLLSCAN under one branch of an $or counts too
+    plans["history_page"] = {"stage": "SUBPLAN", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "IXSCAN"}, {"stage": "COLLSCAN"}
+    ]}}
+
+    with pytest.raises(database.IndexVerificationError, match="history, history_page"):
+        asyncio.run(database.verify_query_plans())
+
+def test_plan_verification_is_strict_by_default():
+    if "VERIFY_QUERY_PLANS" in os.environ:
+        pytest.skip("VERIFY_QUERY_PLANS is set in the environment")
+    assert database.VERIFY_QUERY_PLANS == "strict"
+
+def test_init_db_strict_mode_aborts_on_collection_scan(mongo, plans, monkeypatch):
+    plans["job_claim"] = COLLSCAN_PLAN
+    monkeypatch.setattr(database, "VERIFY_QUERY_PLANS", "strict")
+
+    with pytest.raises(database.IndexVerificationError, match="job_claim"):
+        asyncio.run(database.init_db())
+
+def test_init_db_warn_mode_only_logs(mongo, plans, monkeypatch, caplog):
+    plans["history"] = COLLSCAN_PLAN
+    monkeypatch.setattr(database, "VERIFY_QUERY_PLANS", "warn")
+
+    with caplog.at_level(logging.ERROR, logger="database"):
+        asyncio.run(database.init_db())
+    assert "Query plan verification failed" in caplog.text
+
+def test_init_db_strict_mode_aborts_when_a_plan_cannot_be_explained(mongo, monkeypatch):
+    # mongomock cursors have no explain()
+    monkeypatch.setattr(database, "VERIFY_QUERY_PLANS", "strict")
+
+    with pytest.raises(database.IndexVerificationError, match="Could not explain"):
+        asyncio.run(database.init_db())
+
+def test_lifespan_aborts_startup_when_strict_verification_fails(mongo, monkeypatch):
+    import server
+    monkeypatch.setattr(database, "VERIFY_QUERY_PLANS", "strict")
+
+    async def run():
+        async with server.lifespan(server.app):
+            pass
+
+    with pytest.raises(database.IndexVerificationError):
+        asyncio.run(run())
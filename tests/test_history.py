@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+httpx = pytest.importorskip("httpx")
+
+import database
+import server
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def generations():
+    """Seven finished generations; job-2 and job-3 share a created_at to exercise the job_id tie-break"""
+    database.bind_client(mongomock_motor.AsyncMongoMockClient(tz_aware=True))
+    created = [START + timedelta(minutes=i) for i in (0, 1, 2, 2, 3, 4, 5)]
+    docs = [
+        {"job_id": f"job-{i}", "user_id": "default_user", "prompt": f"prompt {i}",
+         "status": "success", "generated_code": f"code {i}", "created_at": created_at}
+        for i, created_at in enumerate(created)
+    ]
+    docs.append({"job_id": "other", "user_id": "someone_else", "prompt": "", "status": "success", "created_at": START})
+    asyncio.run(database.generations_collection.insert_many(docs))
+    yield
+    database.close_db()
+
+def get(path: str, **params) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, params=params)
+    return asyncio.run(run())
+
+def test_cursor_pages_through_history_newest_first(generations):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = get("/api/history", **params)
+        assert response.status_code == 200
+        body = response.json()
+        seen += [item["id"] for item in body["history"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ["job-6", "job-5", "job-4", "job-3", "job-2", "job-1", "job-0"]
+    assert pages == 3
+
+def test_cursor_round_trips_created_at_and_job_id():
+    created_at = (START + timedelta(microseconds=123)).isoformat()
+    cursor = server._encode_history_cursor(created_at, "job-3")
+    assert server._decode_history_cursor(cursor) == (START + timedelta(microseconds=123), "job-3")
+
+def test_summary_page_leaves_out_code(generations):
+    body = get("/api/history", limit=2, summary="true").json()
+    assert [item["generated_code"] for item in body["history"]] == [None, None]
+    assert body["next_cursor"] is not None
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24=", server._encode_history_cursor("yesterday", "job-1")])
+def test_invalid_cursor_is_rejected(generations, cursor):
+    response = get("/api/history", cursor=cursor)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+@pytest.fixture
+def retention(monkeypatch):
+    """Hot and archived generations: finished jobs older than 30 days get archived, an old running job stays hot"""
+    from services.retention import retention_manager
+    database.bind_client(mongomock_motor.AsyncMongoMockClient(tz_aware=True))
+    monkeypatch.setattr(retention_manager, "retention_days", 30)
+    monkeypatch.setattr(retention_manager, "collection", database.generations_collection)
+    monkeypatch.setattr(retention_manager, "archive", database.archive_collection)
+
+    now = datetime.now(timezone.utc)
+    docs = [
+        {"job_id": "old-1", "status": "success", "created_at": now - timedelta(days=40), "generated_code": "x" * 4096},
+        {"job_id": "old-3", "status": "failed", "created_at": now - timedelta(days=35)},
+        {"job_id": "stuck-2", "status": "running", "created_at": now - timedelta(days=38)},
+        {"job_id": "new-4", "status": "success", "created_at": now - timedelta(days=1), "generated_code": "new"}
+    ]
+    for doc in docs:
+        doc.update(user_id="default_user", prompt=doc["job_id"])
+    asyncio.run(database.generations_collection.insert_many(docs))
+    yield retention_manager
+    database.close_db()
+
+def test_archived_generations_are_still_served(retention):
+    assert asyncio.run(retention.run_once()) == 2
+
+    async def hot_ids():
+        return [doc["job_id"] async for doc in database.generations_collection.find({}, {"job_id": 1})]
+    assert sorted(asyncio.run(hot_ids())) == ["new-4", "stuck-2"]
+
+    # The hot running job sorts between the archived ones
+    body = get("/api/history", limit=3).json()
+    assert [item["id"] for item in body["history"]] == ["new-4", "old-3", "stuck-2"]
+    body = get("/api/history", limit=3, cursor=body["next_cursor"]).json()
+    assert [item["id"] for item in body["history"]] == ["old-1"]
+    assert body["history"][0]["generated_code"] == "x" * 4096
+    assert body["next_cursor"] is None
+
+    state = asyncio.run(server._load_job_state("old-1"))
+    assert (state["status"], state["generated_code"]) == ("success", "x" * 4096)
+
+def test_job_in_both_collections_is_listed_once(retention):
+    async def copy_to_archive():
+        doc = await database.generations_collection.find_one({"job_id": "old-1"}, {"_id": 0})
+        await database.archive_collection.insert_one(doc)
+    asyncio.run(copy_to_archive())
+
+    ids = [item["id"] for item in get("/api/history", limit=10).json()["history"]]
+    assert ids == ["new-4", "old-3", "stuck-2", "old-1"]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from services.job_cache import JobStateCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    from services import job_cache as job_cache_module
+    fake = FakeClock()
+    monkeypatch.setattr(job_cache_module, "time", fake)
+    return fake
+
+def state(status: str, **fields) -> dict:
+    return {"job_id": "job", "status": status, "prompt": "p", "created_at": "2025-01-01T00:00:00+00:00", **fields}
+
+def make_cache(monkeypatch) -> JobStateCache:
+    monkeypatch.setenv("JOB_CACHE_ENABLED", "true")
+    monkeypatch.delenv("JOB_CACHE_REDIS_URL", raising=False)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    return JobStateCache(max_entries=2, ttl_seconds=300, active_ttl_seconds=5)
+
+def test_running_job_outlives_the_active_ttl_until_it_finishes(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.set("job", state("running"), running_here=True))
+
+    clock.now += 60
+    assert asyncio.run(cache.get("job"))["status"] == "running"
+    asyncio.run(cache.set("job", state("running", generated_code="partial"), running_here=True))
+    clock.now += 60
+    assert asyncio.run(cache.get("job"))["generated_code"] == "partial"
+
+    asyncio.run(cache.set("job", state("success", generated_code="done")))
+    assert cache.running == {}
+    clock.now += 299
+    assert asyncio.run(cache.get("job"))["status"] == "success"
+    clock.now += 2
+    assert asyncio.run(cache.get("job")) is None
+
+def test_running_jobs_are_not_evicted(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.set("job", state("running"), running_here=True))
+    for i in range(5):
+        asyncio.run(cache.set(f"done-{i}", {**state("success"), "job_id": f"done-{i}"}))
+
+    assert cache.evictions == 3
+    assert asyncio.run(cache.get("job"))["status"] == "running"
+
+def test_other_processes_active_states_expire(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.set("job", state("pending")))
+
+    clock.now += 4
+    assert asyncio.run(cache.get("job"))["status"] == "pending"
+    clock.now += 2
+    assert asyncio.run(cache.get("job")) is None
+
+def test_release_forgets_a_job_that_stopped_without_an_outcome(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.set("job", state("running"), running_here=True))
+    cache.release("job")
+    assert asyncio.run(cache.get("job")) is None
+
+def test_remember_only_keeps_terminal_states(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.remember("job", state("running")))
+    assert asyncio.run(cache.get("job")) is None
+    asyncio.run(cache.remember("job", state("failed", error_message="boom")))
+    assert asyncio.run(cache.get("job"))["error_message"] == "boom"
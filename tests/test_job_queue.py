@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services.job_queue import JobQueue
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+
+def make_queue(db) -> JobQueue:
+    queue = JobQueue(num_workers=1, max_queue_size=10, stale_after_seconds=300)
+    queue.collection = db["generations"]
+    queue.heartbeats = db["job_workers"]
+    return queue
+
+def running(job_id: str, worker_id: str, seconds_ago: float) -> dict:
+    return {
+        "job_id": job_id, "prompt": "", "status": "running", "worker_id": worker_id,
+        "updated_at": datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+    }
+
+def statuses(db) -> dict:
+    async def run():
+        return {doc["job_id"]: (doc["status"], doc.get("worker_id")) async for doc in db["generations"].find()}
+    return asyncio.run(run())
+
+def test_a_job_is_claimed_by_exactly_one_worker(db):
+    queues = [make_queue(db) for _ in range(5)]
+
+    async def run():
+        await db["generations"].insert_one({"job_id": "job", "prompt": "a card", "status": "pending"})
+        return await asyncio.gather(*(queue._claim("job") for queue in queues))
+
+    claims = asyncio.run(run())
+    winners = [queue for queue, job in zip(queues, claims) if job]
+    assert len(winners) == 1
+    assert statuses(db) == {"job": ("running", winners[0].worker_id)}
+
+def test_startup_requeues_jobs_of_dead_workers_only(db):
+    queue = make_queue(db)
+
+    async def run():
+        now = datetime.now(timezone.utc)
+        await db["job_workers"].insert_many([
+            {"_id": "live", "heartbeat_at": now},
+            {"_id": "dead", "heartbeat_at": now - timedelta(minutes=5)}
+        ])
+        await db["generations"].insert_many([
+            running("live-job", "live", 5),
+            running("dead-job", "dead", 5),
+            # The worker never wrote a heartbeat, e.g. this host's previous process
+            running("unknown-job", "gone", 5),
+            # Stale, whoever holds it
+            running("stale-job", "live", 600),
+            {"job_id": "done", "status": "success", "worker_id": "dead", "updated_at": now}
+        ])
+        await queue._heartbeat()
+        return await queue.requeue_orphaned_jobs(dead_workers=True)
+
+    assert asyncio.run(run()) == 3
+    assert statuses(db) == {
+        "live-job": ("running", "live"),
+        "dead-job": ("pending", None),
+        "unknown-job": ("pending", None),
+        "stale-job": ("pending", None),
+        "done": ("success", "dead")
+    }
+
+def test_refill_requeues_only_stale_jobs(db):
+    queue = make_queue(db)
+
+    async def run():
+        await db["generations"].insert_many([running("recent", "dead", 5), running("stale", "dead", 600)])
+        return await queue.requeue_orphaned_jobs()
+
+    assert asyncio.run(run()) == 1
+    assert statuses(db)["recent"] == ("running", "dead")
+
+def test_startup_leaves_claims_made_after_reading_heartbeats(db, monkeypatch):
+    starting, newcomer = make_queue(db), make_queue(db)
+    read_live_workers = JobQueue._live_workers
+
+    async def live_workers_then_newcomer_claims(self):
+        live = await read_live_workers(self)
+        # Another process starts and claims a job between the heartbeat read and the requeue
+        await newcomer._heartbeat()
+        await newcomer._claim("job")
+        return live
+
+    monkeypatch.setattr(JobQueue, "_live_workers", live_workers_then_newcomer_claims)
+
+    async def run():
+        await db["generations"].insert_one({"job_id": "job", "prompt": "", "status": "pending"})
+        await starting._heartbeat()
+        return await starting.requeue_orphaned_jobs(dead_workers=True)
+
+    assert asyncio.run(run()) == 0
+    assert statuses(db) == {"job": ("running", newcomer.worker_id)}
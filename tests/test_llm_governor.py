@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm_governor as llm_governor_module
+from services.llm_governor import LLMGovernor
+
+class FakeClock:
+    """monotonic() and an asyncio.sleep that jumps the clock instead of waiting"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(round(seconds, 4))
+        self.now += seconds
+        await asyncio.sleep(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_governor_module, "time", fake)
+    monkeypatch.setattr(llm_governor_module, "asyncio", SimpleNamespace(
+        Lock=asyncio.Lock, Semaphore=asyncio.Semaphore, sleep=fake.sleep
+    ))
+    return fake
+
+def test_token_limit_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_MAX_TPM", raising=False)
+    assert LLMGovernor().max_tokens_per_minute == 0
+
+def test_callers_are_admitted_in_arrival_order(clock):
+    governor = LLMGovernor(1, 0, 0)
+    order = []
+
+    async def call(name):
+        async with governor.slot(100):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        tasks = [asyncio.ensure_future(call(name)) for name in "abcd"]
+        await asyncio.sleep(0)
+        waiting = governor.waiting
+        await asyncio.gather(*tasks)
+        return waiting
+
+    # One holds the only slot, the rest queue behind it
+    assert asyncio.run(run()) == 3
+    assert order == list("abcd")
+    assert (governor.waiting, governor.in_flight, governor.granted_count) == (0, 0, 4)
+
+def test_requests_are_spaced_by_the_rate_limit(clock):
+    governor = LLMGovernor(0, 4, 0)
+
+    async def run():
+        for _ in range(3):
+            async with governor.slot(100):
+                pass
+
+    asyncio.run(run())
+    assert clock.sleeps == [0.25, 0.25]
+
+def test_token_window_waits_until_old_calls_age_out(clock):
+    governor = LLMGovernor(0, 0, 1000)
+
+    async def run():
+        async with governor.slot(600):
+            pass
+        clock.now += 10
+        async with governor.slot(600):
+            pass
+
+    asyncio.run(run())
+    # The first call's tokens leave the window 60s after it started
+    assert clock.sleeps == [50.0]
+
+def test_reported_usage_replaces_the_reservation(clock):
+    governor = LLMGovernor(0, 0, 1000)
+
+    async def run():
+        async with governor.slot(600) as reservation:
+            reservation.record_usage(150)
+        async with governor.slot(600):
+            pass
+        return governor.get_stats()["tokens_last_minute"]
+
+    assert asyncio.run(run()) == 750
+    assert clock.sleeps == []
+
+def test_cancelled_waiter_gives_back_its_place(clock):
+    governor = LLMGovernor(1, 0, 0)
+
+    async def run():
+        holder = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold():
+            async with governor.slot(100):
+                holder.set()
+                await release.wait()
+
+        first = asyncio.ensure_future(hold())
+        await holder.wait()
+        waiter = asyncio.ensure_future(governor._acquire(100))
+        await asyncio.sleep(0)
+        assert governor.waiting == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await first
+        # The slot is free again for the next caller
+        async with governor.slot(100):
+            return governor.waiting, governor.in_flight
+
+    assert asyncio.run(run()) == (0, 1)
+    assert governor.in_flight == 0
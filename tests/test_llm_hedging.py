@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+
+from services import llm_service as llm_service_module
+from services.circuit_breaker import CircuitState
+from services.llm_hedging import HedgePolicy
+from services.llm_router import LLMBackend, LLMRouter
+from services.llm_service import LLMService, LLMServiceError
+
+from .llm_fakes import CODE, fake_backend
+
+def half_open(backend: LLMBackend):
+    """Trip the backend's breaker and let its open timeout pass, so its next permit is a probe"""
+    for _ in range(backend.breaker.failure_threshold):
+        backend.breaker.record_failure()
+    backend.breaker.opened_at -= backend.breaker.timeout_seconds
+
+def warmed_hedger(mode: str, delay: float = 0.05, budget_tokens: float = 1e6) -> HedgePolicy:
+    hedger = HedgePolicy(enabled=True, percentile=50, budget_ratio=0)
+    hedger.min_samples = 1
+    hedger.min_delay_seconds = delay
+    hedger.max_budget_tokens = budget_tokens
+    hedger.budget_tokens = budget_tokens
+    hedger.record(mode, delay)
+    # Keep the hedge delay fixed, whatever the calls in a test take
+    hedger.record = lambda mode, seconds: None
+    return hedger
+
+@pytest.fixture
+def service(monkeypatch):
+    """An LLMService over a slow primary and a fast secondary backend"""
+    primary, secondary = fake_backend("primary", 5), fake_backend("secondary", 0.01, code="hedged")
+    router = LLMRouter([primary, secondary])
+    router.explore_ratio = 0
+    monkeypatch.setattr(llm_service_module, "llm_router", router)
+    return LLMService(), primary, secondary
+
+def use_hedger(monkeypatch, hedger: HedgePolicy):
+    monkeypatch.setattr(llm_service_module, "llm_hedger", hedger)
+
+def test_delay_is_the_percentile_of_recent_calls_once_warmed():
+    hedger = HedgePolicy(enabled=True, percentile=90)
+    hedger.min_samples = 10
+    hedger.min_delay_seconds = 0.5
+    for seconds in range(1, 10):
+        hedger.record("complete", seconds)
+    assert hedger.delay("complete") is None
+    hedger.record("complete", 10)
+    assert hedger.delay("complete") == 10
+    assert hedger.delay("stream") is None
+
+    fast = HedgePolicy(enabled=True)
+    fast.min_samples = 1
+    fast.min_delay_seconds = 0.5
+    fast.record("complete", 0.1)
+    assert fast.delay("complete") == 0.5
+    assert HedgePolicy(enabled=False).delay("complete") is None
+
+def test_budget_earns_a_share_of_every_call_and_stops_hedging_once_spent():
+    hedger = warmed_hedger("complete", budget_tokens=0)
+    hedger.budget_ratio = 0.5
+    hedger.max_budget_tokens = 1000
+    started = []
+
+    async def answer(result, seconds):
+        await asyncio.sleep(seconds)
+        return result
+
+    def hedge():
+        started.append(1)
+        return answer("hedge", 0.01)
+
+    async def race():
+        return await hedger.race("complete", lambda: answer("primary", 0.2), hedge, 100)
+
+    # Earns 50 tokens, a 100-token hedge is not affordable yet
+    assert asyncio.run(race()) == (0, "primary")
+    assert hedger.skipped_count == 1
+    # Earns 50 more and spends all 100 on a hedge, which wins
+    assert asyncio.run(race()) == (1, "hedge")
+    assert hedger.budget_tokens == 0
+    assert asyncio.run(race()) == (0, "primary")
+    assert (len(started), hedger.hedged_count, hedger.skipped_count) == (1, 1, 2)
+
+def test_nowhere_to_hedge_returns_the_tokens():
+    hedger = warmed_hedger("complete", budget_tokens=100)
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "primary"
+
+    assert asyncio.run(hedger.race("complete", slow, lambda: None, 100)) == (0, "primary")
+    assert hedger.budget_tokens == 100
+    assert hedger.hedged_count == 0
+
+def test_hedge_wins_and_the_slow_primary_releases_its_probe_and_slot(monkeypatch, service):
+    llm, primary, secondary = service
+    use_hedger(monkeypatch, warmed_hedger("complete"))
+    half_open(primary)
+
+    result = asyncio.run(llm.generate_ui_code("a card", "req"))
+
+    assert result["code"] == "hedged"
+    assert primary.client.chat.completions.cancelled == 1
+    assert primary.breaker.state == CircuitState.HALF_OPEN
+    assert primary.breaker.probes_in_flight == 0
+    assert (primary.governor.in_flight, secondary.governor.in_flight) == (0, 0)
+    # Losing a race is not a failure
+    assert primary.failures == 0
+    assert llm_service_module.llm_hedger.won_count == 1
+
+def test_failing_hedge_falls_back_to_the_primary(monkeypatch, service):
+    llm, primary, secondary = service
+    primary.client.chat.completions.delay = 0.2
+    secondary.client.chat.completions.error = RuntimeError("backend down")
+    use_hedger(monkeypatch, warmed_hedger("complete"))
+
+    result = asyncio.run(llm.generate_ui_code("a card", "req"))
+
+    assert result["code"] == CODE
+    assert secondary.failures == 1
+    assert (primary.governor.in_flight, secondary.governor.in_flight) == (0, 0)
+    assert llm_service_module.llm_hedger.won_count == 0
+
+def test_spent_budget_sends_no_hedge(monkeypatch, service):
+    llm, primary, secondary = service
+    primary.client.chat.completions.delay = 0.1
+    use_hedger(monkeypatch, warmed_hedger("complete", budget_tokens=0))
+
+    assert asyncio.run(llm.generate_ui_code("a card", "req"))["code"] == CODE
+    assert secondary.client.chat.completions.calls == 0
+    assert llm_service_module.llm_hedger.skipped_count == 1
+
+def test_hedged_stream_closes_the_losing_stream(monkeypatch, service):
+    llm, primary, secondary = service
+    use_hedger(monkeypatch, warmed_hedger("stream"))
+    half_open(primary)
+
+    async def run():
+        return "".join([chunk async for chunk in llm.stream_ui_code("a card", "req")])
+
+    assert asyncio.run(run()) == "hedged"
+    assert primary.client.chat.completions.cancelled == 1
+    assert primary.breaker.probes_in_flight == 0
+    assert (primary.governor.in_flight, secondary.governor.in_flight) == (0, 0)
+    assert primary.failures == 0
+
+def test_stream_winner_is_streamed_to_the_end_when_the_primary_wins(monkeypatch, service):
+    llm, primary, secondary = service
+    primary.client.chat.completions.delay = 0.01
+    use_hedger(monkeypatch, warmed_hedger("stream"))
+
+    async def run():
+        return "".join([chunk async for chunk in llm.stream_ui_code("a card", "req")])
+
+    assert asyncio.run(run()) == CODE
+    assert secondary.client.chat.completions.calls == 0
+    assert primary.governor.in_flight == 0
+
+def test_hedge_failure_surfaces_when_both_calls_fail(monkeypatch, service):
+    llm, primary, secondary = service
+    primary.client.chat.completions.delay = 0.1
+    primary.client.chat.completions.error = RuntimeError("primary down")
+    secondary.client.chat.completions.error = RuntimeError("secondary down")
+    use_hedger(monkeypatch, warmed_hedger("complete"))
+    monkeypatch.setattr(llm_service_module.retry_policy, "max_attempts", 1)
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(llm.generate_ui_code("a card", "req"))
+    assert (primary.failures, secondary.failures) == (1, 1)
+    assert (primary.governor.in_flight, secondary.governor.in_flight) == (0, 0)
@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+from services.llm_router import LLMRouter
+
+from .llm_fakes import fake_backend
+
+class ScriptedRandom:
+    """Returns the given draws from random(), then 1.0; choice() takes the last candidate"""
+
+    def __init__(self, *draws: float):
+        self.draws = list(draws)
+        self.drawn = 0
+
+    def random(self) -> float:
+        self.drawn += 1
+        return self.draws.pop(0) if self.draws else 1.0
+
+    def choice(self, candidates: list):
+        return candidates[-1]
+
+def trip(backend):
+    for _ in range(backend.breaker.failure_threshold):
+        backend.breaker.record_failure()
+
+@pytest.fixture
+def router():
+    """Three measured backends, fastest first, that never explore"""
+    backends = [fake_backend(name, 0) for name in ("a", "b", "c")]
+    for backend, seconds in zip(backends, (1.0, 2.0, 3.0)):
+        backend.latency["complete"] = seconds
+    router = LLMRouter(backends, rng=ScriptedRandom())
+    router.explore_ratio = 0
+    return router
+
+def names(router, mode="complete", **options) -> str:
+    backend = router.select(mode, **options)
+    return backend.name if backend else None
+
+def test_latency_is_an_ewma_of_successful_calls(router):
+    backend = router.backends[0]
+    router.alpha = 0.5
+    router.record_success(backend, "stream", 2.0)
+    router.record_success(backend, "stream", 4.0)
+    router.record_success(backend, "stream", 4.0)
+    assert backend.latency["stream"] == 3.5
+    assert backend.latency["complete"] == 1.0
+
+def test_error_rate_rises_on_failures_and_decays_on_successes(router):
+    backend = router.backends[0]
+    router.alpha = 0.5
+    router.record_failure(backend)
+    router.record_failure(backend)
+    assert backend.error_rate == 0.75
+    router.record_success(backend, "complete", 1.0)
+    assert backend.error_rate == 0.375
+    assert (backend.requests, backend.failures) == (3, 2)
+
+def test_fastest_backend_wins_until_errors_inflate_its_score(router):
+    assert names(router) == "a"
+    # 1s * (1 + 4 * 0.3) = 2.2s is slower than b's 2s
+    router.backends[0].error_rate = 0.3
+    assert names(router) == "b"
+
+def test_governor_queue_inflates_the_score(router):
+    a = router.backends[0]
+    a.governor.waiting = a.governor.max_concurrency * 2
+    assert names(router) == "b"
+
+def test_unmeasured_backend_gets_one_call_at_a_time(router):
+    new = fake_backend("new", 0)
+    router.backends.append(new)
+    assert names(router) == "new"
+    new.governor.in_flight = 1
+    assert names(router) == "a"
+
+def test_a_share_of_calls_explores(router):
+    router.explore_ratio = 0.1
+    router.rng = ScriptedRandom(0.05, 0.5)
+    assert names(router) == "c"
+    assert names(router) == "a"
+
+def test_exploration_is_repeatable_with_a_seeded_rng(router):
+    router.explore_ratio = 0.5
+    router.rng = random.Random(7)
+    first = [names(router) for _ in range(20)]
+    router.rng = random.Random(7)
+    assert [names(router) for _ in range(20)] == first
+    assert set(first) > {"a"}
+
+def test_single_candidate_never_draws(router):
+    router.explore_ratio = 1
+    assert names(router, exclude={"a", "b"}) == "c"
+    assert router.rng.drawn == 0
+
+def test_exclude_fails_over_to_the_next_best(router):
+    assert names(router, exclude={"a"}) == "b"
+    assert router.failover_count == 1
+    assert names(router, exclude={"a", "b", "c"}) is None
+    # Running out of failover targets is not the same as every backend being down
+    assert router.unavailable_count == 0
+
+def test_open_breakers_are_skipped(router):
+    trip(router.backends[0])
+    assert names(router) == "b"
+    trip(router.backends[1])
+    trip(router.backends[2])
+    assert names(router) is None
+    assert router.unavailable_count == 1
+
+def test_hedge_goes_to_the_best_other_backend(router):
+    a, b, c = router.backends
+    assert router.select_hedge("complete", a) is b
+    assert router.select_hedge("complete", b) is a
+
+def test_hedge_skips_a_saturated_governor(router):
+    a, b, c = router.backends
+    b.governor.waiting = 1
+    # b still scores best, and a hedge queued behind its governor would only add load
+    assert router.select_hedge("complete", a) is None
+    trip(b)
+    assert router.select_hedge("complete", a) is c
+
+def test_hedge_falls_back_to_the_primary_when_it_is_the_only_backend_up(router):
+    a, b, c = router.backends
+    trip(b)
+    trip(c)
+    assert router.select_hedge("complete", a) is a
+    a.governor.waiting = 1
+    assert router.select_hedge("complete", a) is None
@@ -0,0 +1,76 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from services.metrics import MetricsRegistry
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served", ("route", "status"))
+    requests.labels("/api/generate", 200).inc()
+    requests.labels("/api/generate", "200").inc(2)
+    registry.gauge("queue_depth", "Jobs waiting").set(3)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests served\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/api/generate",status="200"} 3.0\n'
+        "# HELP queue_depth Jobs waiting\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 3.0\n"
+    )
+
+def test_histogram_buckets_are_cumulative_and_end_in_inf():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Call latency", ("backend",), buckets=(1.0, 0.1))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        latency.labels("openai").observe(seconds)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{backend="openai",le="0.1"} 2',
+        'latency_seconds_bucket{backend="openai",le="1.0"} 3',
+        'latency_seconds_bucket{backend="openai",le="+Inf"} 4',
+        'latency_seconds_sum{backend="openai"} 2.65',
+        'latency_seconds_count{backend="openai"} 4'
+    ]
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", ("message",)).labels('bad "quote"\\path\nnext').inc()
+    assert 'errors_total{message="bad \\"quote\\"\\\\path\\nnext"} 1.0' in registry.render()
+
+def test_collectors_refresh_gauges_at_scrape_time():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("in_flight", "Calls in flight")
+    state = {"in_flight": 1}
+    registry.add_collector(lambda: gauge.set(state["in_flight"]))
+    state["in_flight"] = 4
+    assert "in_flight 4.0" in registry.render()
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("jobs_total", "Jobs")
+    assert registry.counter("jobs_total", "Jobs") is first
+    with pytest.raises(ValueError):
+        registry.counter("labelled_total", "Labelled", ("a", "b")).labels("only one")
+
+def test_pool_monitor_counts_from_many_threads():
+    import database
+    monitor = database.PoolMonitor()
+    event = SimpleNamespace(reason=None)
+
+    def checkouts():
+        for _ in range(2000):
+            monitor.connection_check_out_started(event)
+            monitor.connection_checked_out(event)
+            monitor.connection_checked_in(event)
+
+    threads = [threading.Thread(target=checkouts) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = monitor.get_stats()
+    assert (stats["checkouts"], stats["in_use"]) == (16000, 0)
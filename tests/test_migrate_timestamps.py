@@ -0,0 +1,59 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import database
+import migrate_timestamps
+
+CONVERTED = datetime(2025, 3, 1, 9, 30, tzinfo=timezone.utc)
+
+@pytest.fixture
+def generations():
+    """Legacy documents with ISO-string timestamps next to already converted ones"""
+    database.bind_client(mongomock_motor.AsyncMongoMockClient(tz_aware=True))
+    collection = database.generations_collection
+    asyncio.run(collection.insert_many([
+        {"job_id": "aware", "created_at": "2025-01-01T10:00:00+02:00", "updated_at": "2025-01-01T10:05:00+02:00"},
+        # Naive strings were written as UTC
+        {"job_id": "naive", "created_at": "2025-01-02T08:00:00.123456", "updated_at": CONVERTED},
+        {"job_id": "converted", "created_at": CONVERTED, "updated_at": CONVERTED},
+        {"job_id": "garbage", "created_at": "yesterday"}
+    ]))
+    yield collection
+    database.close_db()
+
+def snapshot(collection) -> dict:
+    async def run():
+        return {doc["job_id"]: doc async for doc in collection.find({}, {"_id": 0})}
+    return asyncio.run(run())
+
+def migrate(*args: str, monkeypatch) -> None:
+    monkeypatch.setattr(sys, "argv", ["migrate_timestamps.py", *args])
+    migrate_timestamps.main()
+
+def test_string_timestamps_become_utc_dates(generations, monkeypatch):
+    migrate("--batch-size", "1", monkeypatch=monkeypatch)
+    docs = snapshot(generations)
+
+    assert docs["aware"]["created_at"] == datetime(2025, 1, 1, 8, 0, tzinfo=timezone.utc)
+    assert docs["aware"]["updated_at"] == datetime(2025, 1, 1, 8, 5, tzinfo=timezone.utc)
+    assert docs["naive"]["created_at"] == datetime(2025, 1, 2, 8, 0, 0, 123000, tzinfo=timezone.utc)
+    assert docs["naive"]["updated_at"] == CONVERTED
+    assert docs["converted"] == {"job_id": "converted", "created_at": CONVERTED, "updated_at": CONVERTED}
+    # Left for a human to look at
+    assert docs["garbage"]["created_at"] == "yesterday"
+
+def test_dry_run_writes_nothing(generations, monkeypatch):
+    before = snapshot(generations)
+    migrate("--dry-run", monkeypatch=monkeypatch)
+    assert snapshot(generations) == before
+
+def test_second_run_changes_nothing(generations, monkeypatch):
+    assert asyncio.run(migrate_timestamps.migrate(100, dry_run=False)) == 2
+    after_first = snapshot(generations)
+    assert asyncio.run(migrate_timestamps.migrate(100, dry_run=False)) == 0
+    assert snapshot(generations) == after_first
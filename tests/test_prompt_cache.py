@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import prompt_cache as prompt_cache_module
+from services.prompt_cache import PromptCache, make_cache_key
+
+RESULT = {"code": "export default () => <div/>", "explanation": "card"}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(prompt_cache_module, "time", fake)
+    return fake
+
+@pytest.fixture
+def prompts():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]["prompts"]
+
+def make_cache(monkeypatch, collection=None, **options) -> PromptCache:
+    monkeypatch.setenv("PROMPT_CACHE_ENABLED", "true")
+    cache = PromptCache(**options)
+    if collection is not None:
+        asyncio.run(cache.connect(collection))
+    return cache
+
+def test_key_ignores_case_and_whitespace_but_not_settings():
+    key = make_cache_key("A  pricing card\n", "gpt-4o", 0.7, "system")
+    assert key == make_cache_key("a pricing CARD", "gpt-4o", 0.7, "system")
+    assert key != make_cache_key("a pricing card", "gpt-4o-mini", 0.7, "system")
+    assert key != make_cache_key("a pricing card", "gpt-4o", 0.2, "system")
+    assert key != make_cache_key("a pricing card", "gpt-4o", 0.7, "other system")
+
+def test_memory_tier_evicts_the_least_recently_used(monkeypatch, clock):
+    cache = make_cache(monkeypatch, max_entries=2)
+
+    async def run():
+        await cache.set("a", RESULT)
+        await cache.set("b", RESULT)
+        # Reading a makes b the oldest entry
+        await cache.get("a")
+        await cache.set("c", RESULT)
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [RESULT, None, RESULT]
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.get_stats()["entries"] == 2
+
+def test_memory_entries_expire_after_the_ttl(monkeypatch, clock):
+    cache = make_cache(monkeypatch, ttl_seconds=60)
+
+    async def run():
+        await cache.set("key", RESULT)
+        clock.now += 59
+        hit = await cache.get("key")
+        clock.now += 2
+        return hit, await cache.get("key")
+
+    assert asyncio.run(run()) == (RESULT, None)
+    assert "key" not in cache.entries
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+def test_mongo_hit_is_promoted_into_memory(monkeypatch, clock, prompts):
+    writer = make_cache(monkeypatch, prompts, ttl_seconds=600)
+    asyncio.run(writer.set("key", RESULT))
+    # Another worker, or this one after a restart
+    reader = make_cache(monkeypatch, prompts, ttl_seconds=600)
+
+    async def run():
+        first = await reader.get("key")
+        second = await reader.get("key")
+        return first, second
+
+    assert asyncio.run(run()) == (RESULT, RESULT)
+    assert (reader.mongo_hits, reader.memory_hits, reader.misses) == (1, 1, 0)
+    # The promoted entry lives only as long as the stored one
+    expires_at, _ = reader.entries["key"]
+    assert 599 <= expires_at - clock.now <= 600
+
+def test_expired_mongo_documents_are_misses(monkeypatch, clock, prompts):
+    cache = make_cache(monkeypatch, prompts)
+    now = datetime.now(timezone.utc)
+    asyncio.run(prompts.insert_one({
+        "cache_key": "key", **RESULT, "created_at": now - timedelta(days=2), "expires_at": now - timedelta(days=1)
+    }))
+
+    assert asyncio.run(cache.get("key")) is None
+    assert (cache.mongo_hits, cache.misses) == (0, 1)
+
+def test_set_overwrites_the_stored_result(monkeypatch, clock, prompts):
+    cache = make_cache(monkeypatch, prompts, ttl_seconds=60)
+
+    async def run():
+        await cache.set("key", RESULT)
+        await cache.set("key", {"code": "new", "explanation": ""})
+        return await prompts.find({}, {"_id": 0, "cache_key": 1, "code": 1, "expires_at": 1}).to_list(10)
+
+    (doc,) = asyncio.run(run())
+    assert doc["code"] == "new"
+    assert doc["expires_at"] - datetime.now(timezone.utc) <= timedelta(seconds=60)
+
+def test_mongo_errors_degrade_to_the_memory_tier(monkeypatch, clock):
+    class BrokenCollection:
+        async def find_one(self, *args, **kwargs):
+            raise RuntimeError("no primary")
+
+        async def update_one(self, *args, **kwargs):
+            raise RuntimeError("no primary")
+
+    cache = make_cache(monkeypatch, BrokenCollection())
+
+    async def run():
+        miss = await cache.get("key")
+        await cache.set("key", RESULT)
+        return miss, await cache.get("key")
+
+    assert asyncio.run(run()) == (None, RESULT)
+
+def test_disabled_cache_stores_nothing(monkeypatch, clock):
+    monkeypatch.setenv("PROMPT_CACHE_ENABLED", "false")
+    cache = PromptCache()
+
+    async def run():
+        await cache.set("key", RESULT)
+        return await cache.get("key")
+
+    assert asyncio.run(run()) is None
+    assert cache.entries == {}
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from services.rate_limiter import GCRABackend, RateLimitBackend, RateLimiter, RedisBackend
+
+def test_backend_must_implement_hit():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+def test_redis_backend_enforces_limit_per_identifier(redis_server):
+    async def run():
+        backend = RedisBackend("redis://fake")
+        await backend.connect()
+        try:
+            results = [await backend.hit("user", 3, 60) for _ in range(4)]
+            other = await backend.hit("other", 3, 60)
+        finally:
+            await backend.close()
+        return results, other
+
+    results, other = asyncio.run(run())
+    assert results == [(True, 2), (True, 1), (True, 0), (False, 0)]
+    assert other == (True, 2)
+
+def test_redis_window_is_shared_between_limiters(redis_server, monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+
+    async def run():
+        first, second = RateLimiter(), RateLimiter()
+        await first.connect()
+        await second.connect()
+        try:
+            return [
+                await first.check_rate_limit("user", max_requests=2),
+                await second.check_rate_limit("user", max_requests=2),
+                await first.check_rate_limit("user", max_requests=2),
+                first.mode
+            ]
+        finally:
+            await first.close()
+            await second.close()
+
+    assert asyncio.run(run()) == [(True, 1), (True, 0), (False, 0), "redis"]
+
+def test_falls_back_to_local_limiting_when_redis_fails(redis_server, monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    monkeypatch.setenv("REDIS_RETRY_SECONDS", "0.2")
+
+    async def run():
+        limiter = RateLimiter()
+        await limiter.connect()
+        try:
+            redis_server.connected = False
+            during_outage = await limiter.check_rate_limit("user", max_requests=2)
+            mode_during_outage = limiter.mode
+            redis_server.connected = True
+            await asyncio.sleep(0.25)
+            after_retry = await limiter.check_rate_limit("user", max_requests=2)
+            return during_outage, mode_during_outage, after_retry, limiter.mode, limiter.fallback_count
+        finally:
+            await limiter.close()
+
+    during_outage, mode_during_outage, after_retry, mode_after_retry, fallbacks = asyncio.run(run())
+    assert during_outage == (True, 1)
+    assert mode_during_outage == "gcra"
+    assert after_retry == (True, 1)
+    assert mode_after_retry == "redis"
+    assert fallbacks == 1
+
+def test_unreachable_redis_at_startup_uses_local_limiting(redis_server, monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    redis_server.connected = False
+
+    async def run():
+        limiter = RateLimiter()
+        await limiter.connect()
+        try:
+            return await limiter.check_rate_limit("user", max_requests=1), limiter.mode
+        finally:
+            await limiter.close()
+
+    assert asyncio.run(run()) == ((True, 0), "gcra")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    from services import rate_limiter as rate_limiter_module
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter_module, "time", fake)
+    return fake
+
+def test_gcra_allows_a_burst_then_refills_at_the_steady_rate(clock):
+    backend = GCRABackend()
+
+    async def hits(count):
+        return [await backend.hit("user", 3, 60) for _ in range(count)]
+
+    assert asyncio.run(hits(4)) == [(True, 2), (True, 1), (True, 0), (False, 0)]
+    # One request's worth of allowance comes back every window / max_requests seconds
+    clock.now += 19.9
+    assert asyncio.run(hits(1)) == [(False, 0)]
+    clock.now += 0.1
+    assert asyncio.run(hits(2)) == [(True, 0), (False, 0)]
+
+def test_gcra_rejections_do_not_consume_allowance(clock):
+    backend = GCRABackend()
+    asyncio.run(backend.hit("user", 1, 10))
+    for _ in range(5):
+        assert asyncio.run(backend.hit("user", 1, 10)) == (False, 0)
+    clock.now += 10
+    assert asyncio.run(backend.hit("user", 1, 10)) == (True, 0)
+
+def test_gcra_sweep_evicts_only_fully_replenished_identifiers(clock):
+    backend = GCRABackend()
+    asyncio.run(backend.hit("idle", 2, 60))
+    clock.now += 20
+    asyncio.run(backend.hit("busy", 2, 60))
+    clock.now += 15
+
+    assert backend.sweep() == 1
+    assert set(backend.states) == {"busy"}
+    assert backend.evicted_count == 1
+    # An evicted identifier starts again with a full allowance
+    assert asyncio.run(backend.hit("idle", 2, 60)) == (True, 1)
@@ -0,0 +1,219 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import openai
+import pytest
+
+import server
+from services import llm_service as llm_service_module
+from services.llm_router import LLMRouter
+from services.llm_service import CircuitBreakerOpenError, LLMConfigurationError, LLMServiceError
+from services.retry_policy import DeadlineExceededError, RetryPolicy, classify, retry_after_from_headers
+
+from .llm_fakes import fake_backend
+
+ERROR_CLASSES = {
+    400: openai.BadRequestError,
+    401: openai.AuthenticationError,
+    429: openai.RateLimitError,
+    500: openai.InternalServerError
+}
+
+def api_error(status: int, headers: dict | None = None, body: dict | None = None) -> openai.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "https://api.test"))
+    return ERROR_CLASSES.get(status, openai.APIStatusError)("error", response=response, body=body)
+
+def wrapped(error: BaseException) -> LLMServiceError:
+    """The error as LLMService raises it, chained to the OpenAI error"""
+    try:
+        try:
+            raise error
+        except Exception as inner:
+            raise LLMServiceError("LLM call failed") from inner
+    except LLMServiceError as outer:
+        return outer
+
+@pytest.mark.parametrize("status, retryable", [
+    (400, False), (401, False), (404, False), (422, False),
+    (408, True), (409, True), (500, True), (503, True)
+])
+def test_status_codes(status, retryable):
+    decision = classify(wrapped(api_error(status)))
+    assert decision.retryable is retryable
+    assert decision.reason == f"http_{status}"
+
+def test_rate_limit_is_retried_after_the_server_requested_wait():
+    decision = classify(wrapped(api_error(429, {"retry-after": "3"})))
+    assert decision == (True, "rate_limited", 3.0)
+
+def test_exhausted_quota_is_not_retried():
+    decision = classify(wrapped(api_error(429, body={"code": "insufficient_quota"})))
+    assert decision == (False, "insufficient_quota", None)
+
+def test_errors_decide_for_themselves():
+    assert classify(CircuitBreakerOpenError("open")).retryable is False
+    assert classify(wrapped(LLMConfigurationError("no key"))).retryable is False
+
+def test_connection_errors_timeouts_and_unknown_errors_are_retried():
+    connection_error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.test"))
+    assert classify(wrapped(connection_error)) == (True, "APIConnectionError", None)
+    assert classify(asyncio.TimeoutError()).retryable is True
+    assert classify(wrapped(KeyError("choices"))) == (True, "unknown", None)
+
+def test_retry_after_ms_wins_over_retry_after():
+    assert retry_after_from_headers(httpx.Headers({"retry-after-ms": "250", "retry-after": "3"})) == 0.25
+
+def test_retry_after_as_http_date():
+    at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = retry_after_from_headers(httpx.Headers({"retry-after": format_datetime(at, usegmt=True)}))
+    assert 28 <= seconds <= 30
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert retry_after_from_headers(httpx.Headers({"retry-after": format_datetime(past, usegmt=True)})) == 0.0
+
+def test_reset_of_the_exhausted_limit_is_used():
+    headers = httpx.Headers({
+        "x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "1s",
+        "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "6m0s"
+    })
+    assert retry_after_from_headers(headers) == 360.0
+    assert retry_after_from_headers(httpx.Headers({"x-ratelimit-reset": "20ms"})) == pytest.approx(0.02)
+
+@pytest.mark.parametrize("headers", [
+    None, {}, {"retry-after": "soon"},
+    # The reset of a limit that is not used up says nothing about when to retry
+    {"x-ratelimit-remaining-tokens": "1200", "x-ratelimit-reset-tokens": "1s"}
+])
+def test_no_usable_wait(headers):
+    assert retry_after_from_headers(httpx.Headers(headers) if headers is not None else None) is None
+
+def test_run_stops_at_the_first_non_retryable_error():
+    policy = RetryPolicy(max_attempts=3, base_delay_seconds=0.001)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise wrapped(api_error(400))
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(policy.run(call, "req"))
+    assert len(calls) == 1
+    assert policy.not_retryable_count == 1
+
+def test_run_retries_transient_errors_until_success():
+    policy = RetryPolicy(max_attempts=3, base_delay_seconds=0.001)
+    outcomes = [wrapped(api_error(503)), wrapped(api_error(429, {"retry-after-ms": "1"})), "ok"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert asyncio.run(policy.run(call, "req")) == "ok"
+    assert policy.retried_count == 2
+
+def test_run_does_not_wait_past_the_job_deadline():
+    policy = RetryPolicy(max_attempts=3)
+    policy.job_deadline_seconds = 5
+
+    async def run():
+        token = policy.start_deadline()
+        try:
+            async def call():
+                raise wrapped(api_error(429, {"retry-after": "10"}))
+            return await policy.run(call, "req")
+        finally:
+            policy.reset_deadline(token)
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(run())
+    assert policy.over_budget_count == 1
+
+def test_run_cuts_off_an_attempt_at_the_job_deadline():
+    policy = RetryPolicy(max_attempts=3)
+    policy.job_deadline_seconds = 0.05
+
+    async def run():
+        token = policy.start_deadline()
+        try:
+            return await policy.run(lambda: asyncio.sleep(5), "req")
+        finally:
+            policy.reset_deadline(token)
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run())
+    assert policy.deadline_count == 1
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Two fake backends behind the LLM service, tried in order"""
+    first, second = fake_backend("first", 0), fake_backend("second", 0)
+    router = LLMRouter([first, second])
+    router.explore_ratio = 0
+    monkeypatch.setattr(llm_service_module, "llm_router", router)
+    monkeypatch.setattr(llm_service_module.llm_hedger, "enabled", False)
+    return llm_service_module.LLMService(), first, second
+
+@pytest.mark.parametrize("first_status, second_status", [(500, 400), (400, 500)])
+@pytest.mark.parametrize("mode", ["complete", "stream"])
+def test_a_pass_over_the_backends_keeps_a_transient_error(backends, mode, first_status, second_status):
+    llm, first, second = backends
+    first.client.chat.completions.error = api_error(first_status)
+    second.client.chat.completions.error = api_error(second_status)
+
+    async def run():
+        if mode == "complete":
+            return await llm._generate_once("a card", "req")
+        return [chunk async for chunk in llm.stream_ui_code("a card", "req")]
+
+    with pytest.raises(LLMServiceError) as raised:
+        asyncio.run(run())
+    assert classify(raised.value) == (True, "http_500", None)
+
+def failing_stream(error: Exception):
+    async def stream(prompt, request_id):
+        raise error
+        yield
+    return stream
+
+def test_stream_fallback_waits_for_retry_after(monkeypatch):
+    calls = []
+
+    async def generate(prompt, request_id):
+        calls.append(asyncio.get_running_loop().time())
+        return {"code": "code", "explanation": ""}
+
+    monkeypatch.setattr(server.llm_service, "stream_ui_code", failing_stream(wrapped(api_error(429, {"retry-after-ms": "200"}))))
+    monkeypatch.setattr(server.llm_service, "generate_ui_code", generate)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        result = await server.stream_generation("job", "a card", {})
+        return result, calls[0] - started
+
+    result, waited = asyncio.run(run())
+    assert result["code"] == "code"
+    assert waited >= 0.2
+
+def test_stream_fallback_is_skipped_when_the_wait_exceeds_the_deadline(monkeypatch):
+    calls = []
+
+    async def generate(prompt, request_id):
+        calls.append(1)
+
+    monkeypatch.setattr(server.llm_service, "stream_ui_code", failing_stream(wrapped(api_error(429, {"retry-after": "10"}))))
+    monkeypatch.setattr(server.llm_service, "generate_ui_code", generate)
+    monkeypatch.setattr(server.retry_policy, "job_deadline_seconds", 5)
+
+    async def run():
+        token = server.retry_policy.start_deadline()
+        try:
+            await server.stream_generation("job", "a card", {})
+        finally:
+            server.retry_policy.reset_deadline(token)
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(run())
+    assert calls == []
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.semantic_cache import HashingEmbedder, SemanticCache
+
+PROMPT = "Create a pricing card with 3 tiers"
+RESULT = {"code": "export default () => <div/>", "explanation": "pricing"}
+
+def make_cache(monkeypatch, threshold: float) -> SemanticCache:
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+    return SemanticCache(threshold=threshold, max_entries=8, embedder=HashingEmbedder())
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=256)
+    first = embedder.embed(PROMPT)
+    assert first.shape == (256,)
+    assert np.array_equal(first, HashingEmbedder(dim=256).embed(PROMPT))
+    assert np.linalg.norm(first) == pytest.approx(1.0)
+
+def test_hashing_embedder_ignores_case_and_punctuation():
+    embedder = HashingEmbedder()
+    assert float(embedder.embed(PROMPT) @ embedder.embed("create a PRICING card with 3 tiers!")) == pytest.approx(1.0)
+
+def test_near_duplicate_hits_and_unrelated_prompt_misses(monkeypatch):
+    cache = make_cache(monkeypatch, threshold=0.8)
+
+    async def run():
+        await cache.add(PROMPT, "ns", RESULT)
+        return (
+            await cache.lookup("Create a pricing card with 3 tiers and a toggle", "ns"),
+            await cache.lookup("Build a contact form with name and email", "ns")
+        )
+
+    hit, miss = asyncio.run(run())
+    assert hit == RESULT
+    assert miss is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_threshold_decides_between_hit_and_miss(monkeypatch):
+    embedder = HashingEmbedder()
+    similar = "Create a pricing card with three tiers"
+    score = float(embedder.embed(PROMPT) @ embedder.embed(similar))
+
+    for threshold, expected in ((score - 0.01, RESULT), (score + 0.01, None)):
+        cache = make_cache(monkeypatch, threshold)
+
+        async def run():
+            await cache.add(PROMPT, "ns", RESULT)
+            return await cache.lookup(similar, "ns")
+
+        assert asyncio.run(run()) == expected
+        assert cache.recent_scores[-1] == pytest.approx(score)
+
+def test_entries_are_isolated_by_namespace(monkeypatch):
+    cache = make_cache(monkeypatch, threshold=0.9)
+
+    async def run():
+        await cache.add(PROMPT, "gpt-4o", RESULT)
+        return await cache.lookup(PROMPT, "other-model")
+
+    assert asyncio.run(run()) is None
+
+def test_full_index_overwrites_oldest_entry(monkeypatch):
+    cache = make_cache(monkeypatch, threshold=0.99)
+    prompts = [f"component number {i} with unique words {i * 7919}" for i in range(9)]
+
+    async def run():
+        for i, prompt in enumerate(prompts):
+            await cache.add(prompt, "ns", {"code": str(i), "explanation": ""})
+        return await cache.lookup(prompts[0], "ns"), await cache.lookup(prompts[-1], "ns")
+
+    oldest, newest = asyncio.run(run())
+    assert oldest is None
+    assert newest["code"] == "8"
+    assert cache.get_stats()["entries"] == 8
+
+def test_disabled_cache_stores_nothing(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "false")
+    cache = SemanticCache(embedder=HashingEmbedder())
+
+    async def run():
+        await cache.add(PROMPT, "ns", RESULT)
+        return await cache.lookup(PROMPT, "ns")
+
+    assert asyncio.run(run()) is None
+    assert cache.indexes == {}
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"code": "shared"}
+
+    async def run():
+        return await asyncio.gather(*(group.run("key", work) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert (group.leader_count, group.coalesced_count) == (1, 9)
+    assert group.inflight == {}
+
+def test_every_caller_gets_the_leaders_exception():
+    group = SingleFlight()
+    error = RuntimeError("backend down")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def run():
+        return await asyncio.gather(*(group.run("key", work) for _ in range(5)), return_exceptions=True)
+
+    assert all(result is error for result in asyncio.run(run()))
+    assert group.inflight == {}
+
+def test_the_next_call_after_a_failure_runs_again():
+    group = SingleFlight()
+    outcomes = [RuntimeError("first"), "second"]
+
+    async def work():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await group.run("key", work)
+        return await group.run("key", work)
+
+    assert asyncio.run(run()) == "second"
+    assert group.leader_count == 2
+
+def test_different_keys_run_separately():
+    group = SingleFlight()
+
+    async def run():
+        return await asyncio.gather(
+            group.run("a", lambda: asyncio.sleep(0.01, "a")),
+            group.run("b", lambda: asyncio.sleep(0.01, "b"))
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert (group.leader_count, group.coalesced_count) == (2, 0)
+
+def test_cancelled_follower_leaves_the_shared_call_running():
+    group = SingleFlight()
+
+    async def run():
+        leader = asyncio.ensure_future(group.run("key", lambda: asyncio.sleep(0.02, "done")))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.run("key", lambda: asyncio.sleep(0.02, "other")))
+        await asyncio.sleep(0)
+        follower.cancel()
+        await asyncio.gather(follower, return_exceptions=True)
+        return await leader
+
+    assert asyncio.run(run()) == "done"
+    assert group.inflight == {}
+
+def test_cancelled_leader_cancels_its_followers():
+    group = SingleFlight()
+
+    async def run():
+        leader = asyncio.ensure_future(group.run("key", lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.run("key", lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in asyncio.run(run()))
+    assert group.inflight == {}
@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, AutoReconnect
+
+from services.write_buffer import WriteBuffer
+
+class FakeCollection:
+    """Records bulk writes; fail_with is raised by the next call, write_errors are reported as a BulkWriteError"""
+
+    def __init__(self):
+        self.batches: list[list] = []
+        self.fail_with = None
+        self.write_errors: list[dict] = []
+
+    async def bulk_write(self, ops, ordered=True):
+        assert ordered is False
+        if self.fail_with is not None:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        self.batches.append(ops)
+        if self.write_errors:
+            errors, self.write_errors = self.write_errors, []
+            raise BulkWriteError({"writeErrors": errors})
+
+def make_buffer() -> tuple[WriteBuffer, FakeCollection]:
+    buffer = WriteBuffer(flush_seconds=60, max_batch=100)
+    buffer.collection = FakeCollection()
+    return buffer, buffer.collection
+
+def test_updates_to_one_job_are_coalesced():
+    buffer, collection = make_buffer()
+    buffer.update("job", {"status": "running", "attempt": 1})
+    buffer.update("job", {"status": "success"}, {"error": ""})
+    buffer.update("other", {"status": "running"})
+
+    asyncio.run(buffer.flush())
+
+    assert collection.batches == [[
+        UpdateOne({"job_id": "job"}, {"$set": {"status": "success", "attempt": 1}, "$unset": {"error": ""}}),
+        UpdateOne({"job_id": "other"}, {"$set": {"status": "running"}})
+    ]]
+    assert buffer.coalesced_count == 1
+
+def test_later_writes_win_between_set_and_unset():
+    buffer, _ = make_buffer()
+    buffer.update("job", {"error": "boom", "status": "failed"})
+    buffer.update("job", {}, {"error": ""})
+    assert buffer._updates["job"] == ({"status": "failed"}, {"error": ""})
+
+    buffer.update("job", {"error": "again"})
+    assert buffer._updates["job"] == ({"status": "failed", "error": "again"}, {})
+
+def test_inserts_wait_for_their_batch():
+    buffer, collection = make_buffer()
+    buffer.flush_seconds = 0.01
+
+    async def run():
+        await buffer.start(collection)
+        try:
+            await asyncio.wait_for(asyncio.gather(buffer.insert({"job_id": "a"}), buffer.insert({"job_id": "b"})), 1)
+        finally:
+            await buffer.stop()
+
+    asyncio.run(run())
+    assert collection.batches == [[InsertOne({"job_id": "a"}), InsertOne({"job_id": "b"})]]
+    assert buffer.get_stats()["flush_count"] == 1
+
+def test_failed_flush_fails_inserts_and_keeps_updates_for_the_next_flush():
+    buffer, collection = make_buffer()
+    collection.fail_with = AutoReconnect("primary stepped down")
+
+    async def run():
+        insert = asyncio.ensure_future(buffer.insert({"job_id": "new"}))
+        buffer.update("job", {"status": "running", "attempt": 1})
+        await asyncio.sleep(0)
+        with pytest.raises(AutoReconnect):
+            await buffer.flush()
+        with pytest.raises(AutoReconnect):
+            await insert
+        # The retried update is merged with newer writes, which win
+        buffer.update("job", {"status": "success"})
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert collection.batches == [[UpdateOne({"job_id": "job"}, {"$set": {"status": "success", "attempt": 1}})]]
+    assert buffer.error_count == 1
+    assert not buffer.has_pending()
+
+def test_bulk_write_errors_fail_only_the_affected_operations():
+    buffer, collection = make_buffer()
+    collection.write_errors = [
+        {"index": 1, "errmsg": "E11000 duplicate key"},
+        {"index": 2, "errmsg": "update rejected"}
+    ]
+
+    async def run():
+        results = asyncio.gather(
+            buffer.insert({"job_id": "a"}), buffer.insert({"job_id": "a"}), return_exceptions=True
+        )
+        buffer.update("job", {"status": "running"})
+        await asyncio.sleep(0)
+        await buffer.flush()
+        return await results
+
+    ok, duplicate = asyncio.run(run())
+    assert ok is None
+    assert isinstance(duplicate, RuntimeError) and "duplicate key" in str(duplicate)
+    assert buffer.ops_written == 1
+    assert buffer.error_count == 1
+
+def test_flush_job_only_flushes_when_the_job_has_pending_writes():
+    buffer, collection = make_buffer()
+    buffer.update("job", {"status": "running"})
+
+    asyncio.run(buffer.flush_job("other"))
+    assert collection.batches == []
+    asyncio.run(buffer.flush_job("job"))
+    assert len(collection.batches) == 1
+    assert not buffer.has_pending("job")
+
+def test_written_waits_for_the_flush_that_stores_the_update():
+    buffer, collection = make_buffer()
+
+    async def run():
+        assert await buffer.written("job") is None
+        buffer.update("job", {"status": "success"})
+        waiter = asyncio.ensure_future(buffer.written("job"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await buffer.flush()
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(run())
+    assert len(collection.batches) == 1
+
+def test_written_covers_an_update_already_being_flushed():
+    buffer, collection = make_buffer()
+    release = asyncio.Event()
+
+    async def slow_bulk_write(ops, ordered=True):
+        await release.wait()
+        collection.batches.append(ops)
+
+    collection.bulk_write = slow_bulk_write
+
+    async def run():
+        buffer.update("job", {"status": "success"})
+        flush = asyncio.ensure_future(buffer.flush())
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(buffer.written("job"))
+        await asyncio.sleep(0)
+        release.set()
+        await flush
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(run())
+
+def test_written_raises_when_the_update_could_not_be_written():
+    buffer, collection = make_buffer()
+    collection.fail_with = AutoReconnect("primary stepped down")
+
+    async def run():
+        buffer.update("job", {"status": "success"})
+        waiter = asyncio.ensure_future(buffer.written("job"))
+        await asyncio.sleep(0)
+        with pytest.raises(AutoReconnect):
+            await buffer.flush()
+        with pytest.raises(AutoReconnect):
+            await waiter
+        # Still buffered for the next flush
+        return buffer.has_pending("job")
+
+    assert asyncio.run(run()) is True
+
+def test_written_raises_on_a_rejected_update():
+    buffer, collection = make_buffer()
+    collection.write_errors = [{"index": 0, "errmsg": "document failed validation"}]
+
+    async def run():
+        buffer.update("job", {"status": "success"})
+        waiter = asyncio.ensure_future(buffer.written("job"))
+        await asyncio.sleep(0)
+        await buffer.flush()
+        with pytest.raises(RuntimeError, match="failed validation"):
+            await waiter
+
+    asyncio.run(run())